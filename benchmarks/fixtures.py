@@ -0,0 +1,115 @@
+"""
+Synthetic flake definitions for the benchmarks.
+Definitions are generated as python primitives (the from_list format), then written as xml, json or yaml
+files. Generation is seeded, so the same parameters always produce the same definitions.
+"""
+import json
+import os
+import random
+import xml.etree.ElementTree as ElementTree
+from dataclasses import dataclass
+from typing import List
+
+import yaml
+
+from protoflake.constants import XML_BOOL
+from protoflake.constants import XML_FLOAT
+from protoflake.constants import XML_INT
+from protoflake.constants import XML_LIST
+from protoflake.constants import XML_NESTED_FLAKE
+from protoflake.constants import XML_REF
+from protoflake.constants import XML_ROOT
+from protoflake.constants import YAML_ROOT
+
+
+PROTO = 'benchmarks.protos.Node'
+FORMATS = ('xml', 'json', 'yaml')
+
+
+@dataclass
+class FixtureSpec(object):
+    """
+    :param count: number of root flakes
+    :param depth: how many levels of nested flakes each root flake has
+    :param width: number of items in each flake's list attribute
+    :param ref_density: probability for each flake to reference an earlier root flake
+    :param files: number of files the root flakes are spread over
+    """
+    count: int = 1000
+    depth: int = 1
+    width: int = 4
+    ref_density: float = 0.3
+    files: int = 10
+    seed: int = 0
+
+
+def generate_flake(flake_id: str, depth: int, spec: FixtureSpec, rand: random.Random, index: int) -> dict:
+    flake = {
+        'proto': PROTO,
+        'id': flake_id,
+        'weight': rand.randint(0, 100),
+        'ratio': rand.random(),
+        'enabled': rand.random() < 0.5,
+        'label': 'label-%d' % rand.randint(0, 20),
+        'items': [rand.randint(0, 10) for _ in range(spec.width)],
+    }
+    if index > 0 and rand.random() < spec.ref_density:
+        # only referencing earlier flakes keeps the graph acyclic
+        flake['peer'] = {'id': 'flake-%d' % rand.randrange(index), 'is_flake_ref': True}
+    if depth > 0:
+        flake['child'] = generate_flake(flake_id + '-child', depth - 1, spec, rand, index)
+    return flake
+
+
+def generate_definitions(spec: FixtureSpec) -> List[dict]:
+    rand = random.Random(spec.seed)
+    return [generate_flake('flake-%d' % index, spec.depth, spec, rand, index) for index in range(spec.count)]
+
+
+def to_xml_element(flake: dict) -> ElementTree.Element:
+    element = ElementTree.Element(flake['proto'])
+    for key, value in flake.items():
+        if key == 'proto':
+            continue
+        if isinstance(value, dict) and value.get('is_flake_ref'):
+            ElementTree.SubElement(element, XML_REF + key, id=value['id'])
+        elif isinstance(value, dict):
+            ElementTree.SubElement(element, XML_NESTED_FLAKE + key).append(to_xml_element(value))
+        elif isinstance(value, list):
+            list_element = ElementTree.SubElement(element, XML_LIST + key)
+            for item_index, item in enumerate(value):
+                ElementTree.SubElement(list_element, '%s%d' % (XML_INT, item_index)).text = str(item)
+        elif isinstance(value, bool):
+            element.set(XML_BOOL + key, str(value))
+        elif isinstance(value, int):
+            element.set(XML_INT + key, str(value))
+        elif isinstance(value, float):
+            element.set(XML_FLOAT + key, repr(value))
+        else:
+            element.set(key, value)
+    return element
+
+
+def write_definitions(definitions: List[dict], file_format: str, path: str):
+    if file_format == 'json':
+        with open(path, 'w') as file:
+            json.dump(definitions, file)
+    elif file_format == 'yaml':
+        with open(path, 'w') as file:
+            yaml.safe_dump({YAML_ROOT: definitions}, file)
+    else:
+        root = ElementTree.Element(XML_ROOT)
+        root.extend(to_xml_element(flake) for flake in definitions)
+        ElementTree.ElementTree(root).write(path)
+
+
+def write_fixture_files(spec: FixtureSpec, file_format: str, directory: str) -> List[str]:
+    """Generates the definitions described by spec, spreads them over spec.files files and returns their paths"""
+    definitions = generate_definitions(spec)
+    per_file = max(1, -(-len(definitions) // spec.files))
+    paths = []
+    for file_index, start in enumerate(range(0, len(definitions), per_file)):
+        path = os.path.join(directory, 'flakes-%d.%s' % (file_index, file_format))
+        write_definitions(definitions[start:start + per_file], file_format, path)
+        paths.append(path)
+    return paths
@@ -0,0 +1,7 @@
+"""
+Protos instantiated by the benchmarks
+"""
+
+
+class Node(object):
+    pass
@@ -0,0 +1,100 @@
+"""
+Startup benchmarks: discovery from files and from lists, single gets on a cold container and full graph builds.
+Each phase runs on a fresh container, its wall time and peak traced memory are reported.
+
+    python -m benchmarks.run --count 2000 --depth 2 --formats xml yaml
+"""
+import argparse
+import gc
+import tempfile
+import tracemalloc
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Callable
+from typing import List
+
+from benchmarks.fixtures import FORMATS
+from benchmarks.fixtures import FixtureSpec
+from benchmarks.fixtures import generate_definitions
+from benchmarks.fixtures import write_fixture_files
+from protoflake import FlakeContainer
+
+
+@dataclass
+class BenchmarkResult(object):
+    name: str
+    seconds: float
+    peak_bytes: int
+
+
+def measure(name: str, setup: Callable[[], FlakeContainer], action: Callable[[FlakeContainer], object],
+            repeat: int) -> BenchmarkResult:
+    """Runs action on a new container repeat times, keeping the best time and the largest peak memory.
+    Memory tracing slows python down, so time and memory are measured in separate runs.
+    """
+    best = float('inf')
+    peak = 0
+    for _ in range(repeat):
+        container = setup()
+        gc.collect()
+        started = perf_counter()
+        action(container)
+        best = min(best, perf_counter() - started)
+        container = setup()
+        gc.collect()
+        tracemalloc.start()
+        action(container)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return BenchmarkResult(name, best, peak)
+
+
+def discovered(file_paths: List[str]) -> Callable[[], FlakeContainer]:
+    def setup():
+        container = FlakeContainer()
+        container.from_files(file_paths)
+        return container
+    return setup
+
+
+def run(spec: FixtureSpec, formats: List[str], repeat: int, gets: int) -> List[BenchmarkResult]:
+    results = []
+    definitions = generate_definitions(spec)
+    results.append(measure('from_list', FlakeContainer, lambda container: container.from_list(definitions), repeat))
+    with tempfile.TemporaryDirectory() as directory:
+        for file_format in formats:
+            file_paths = write_fixture_files(spec, file_format, directory)
+            results.append(measure('from_files[%s]' % file_format, FlakeContainer,
+                                   lambda container: container.from_files(file_paths), repeat))
+        # building does not depend on the source format
+        setup = discovered(write_fixture_files(spec, formats[0], directory))
+        flake_ids = ['flake-%d' % index for index in range(0, spec.count, max(1, spec.count // gets))]
+        results.append(measure('get[x%d]' % len(flake_ids), setup,
+                               lambda container: [container.get(flake_id) for flake_id in flake_ids], repeat))
+        results.append(measure('build_all', setup, lambda container: container.build_all(), repeat))
+    return results
+
+
+def main():
+    defaults = FixtureSpec()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--count', type=int, default=defaults.count)
+    parser.add_argument('--depth', type=int, default=defaults.depth)
+    parser.add_argument('--width', type=int, default=defaults.width)
+    parser.add_argument('--ref-density', type=float, default=defaults.ref_density)
+    parser.add_argument('--files', type=int, default=defaults.files)
+    parser.add_argument('--seed', type=int, default=defaults.seed)
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=list(FORMATS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--gets', type=int, default=100, help='number of flakes fetched by the get benchmark')
+    args = parser.parse_args()
+    spec = FixtureSpec(args.count, args.depth, args.width, args.ref_density, args.files, args.seed)
+    print('%d flakes, depth %d, width %d, ref density %.2f, %d files'
+          % (spec.count, spec.depth, spec.width, spec.ref_density, spec.files))
+    print('%-20s %12s %12s' % ('benchmark', 'time (ms)', 'peak (KiB)'))
+    for result in run(spec, args.formats, args.repeat, args.gets):
+        print('%-20s %12.2f %12d' % (result.name, result.seconds * 1000, result.peak_bytes // 1024))
+
+
+if __name__ == '__main__':
+    main()
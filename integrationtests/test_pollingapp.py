@@ -1,6 +1,18 @@
+import gc
+import os
+import shutil
+import tempfile
 import unittest
+from threading import Event
 
 from protoflake import FlakeContainer
+from protoflake import UnknownPreloadMode
+from protoflake.constants import PRELOAD_NOW
+from protoflake.definitionbundle import compile_bundle
+from protoflake.instrumentation import PHASE_BUILD
+from protoflake.instrumentation import PHASE_PARSE
+from protoflake.instrumentation import PhaseCollector
+from protoflake.protoschema import InvalidDefinitions
 
 
 class PollService(object):
@@ -36,3 +48,177 @@ class IntegrationTestPollingApp(unittest.TestCase):
         poll_service = self.container.get('poll_service')
         ui_service = self.container.get('ui_service')
         self.assertEqual(ui_service.poll_service, poll_service)
+
+    def test_referenced_flakes_are_built_on_demand(self):
+        ui_service = self.container.get('ui_service')
+        self.assertIsInstance(ui_service.poll_service, PollService)
+        self.assertEqual(self.container.get('poll_service'), ui_service.poll_service)
+
+    def test_build_all_builds_every_flake(self):
+        self.container.build_all()
+        self.assertTrue(self.container.builder.has('poll_service'))
+        self.assertTrue(self.container.builder.has('ui_service'))
+
+    def test_build_all_reports_each_built_flake(self):
+        report = self.container.build_all(['ui_service'])
+        self.assertEqual(['poll_service', 'ui_service'], [timing.flake_id for timing in report.timings])
+        self.assertEqual(0, self.container.build_all().built_count)
+
+
+class IntegrationTestPollingAppReload(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.resources = os.path.join(self.temp_dir, 'resources.xml')
+        shutil.copy('integrationtests/test_data/polling/resources.xml', self.resources)
+        self.container = FlakeContainer()
+        self.container.from_files([self.resources])
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def edit_resources(self):
+        with open(self.resources) as file:
+            text = file.read()
+        with open(self.resources, 'w') as file:
+            file.write(text.replace('id="poll_service" />', 'id="poll_service" int-max_questions="3" />', 1))
+        stat = os.stat(self.resources)
+        os.utime(self.resources, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+    def test_reload_rebuilds_changed_flakes_and_their_dependents(self):
+        ui_service = self.container.get('ui_service')
+        self.edit_resources()
+        self.assertEqual({'poll_service', 'ui_service'}, self.container.reload())
+        reloaded = self.container.get('ui_service')
+        self.assertIsNot(ui_service, reloaded)
+        self.assertEqual(3, reloaded.poll_service.max_questions)
+
+    def test_watcher_reloads_in_the_background(self):
+        self.container.get('ui_service')
+        reloaded = Event()
+        watcher = self.container.watch(interval=0.01, on_reload=lambda stale_ids: reloaded.set())
+        try:
+            self.edit_resources()
+            self.assertTrue(reloaded.wait(5))
+        finally:
+            watcher.stop()
+        self.assertEqual(3, self.container.get('poll_service').max_questions)
+
+
+class IntegrationTestPollingAppPreload(unittest.TestCase):
+
+    def test_protos_can_be_preloaded_at_discovery(self):
+        container = FlakeContainer()
+        container.from_files(['integrationtests/test_data/polling/resources.xml'], preload=PRELOAD_NOW)
+        self.assertEqual(['integrationtests.test_pollingapp'], list(container.proto_registry.import_times))
+
+    def test_protos_can_be_preloaded_in_background(self):
+        container = FlakeContainer()
+        container.from_files(['integrationtests/test_data/polling/resources.xml'])
+        container.preload_protos(background=True).join()
+        self.assertIn('integrationtests.test_pollingapp', container.proto_registry.module_registry)
+
+    def test_unknown_preload_mode(self):
+        with self.assertRaises(UnknownPreloadMode):
+            FlakeContainer().from_files(['integrationtests/test_data/polling/resources.xml'], preload='later')
+
+
+class IntegrationTestPollingAppCompact(IntegrationTestPollingApp):
+
+    def setUp(self) -> None:
+        self.container = FlakeContainer(compact=True)
+        self.container.from_files(['integrationtests/test_data/polling/resources.xml'])
+
+
+class IntegrationTestPollingAppInstrumented(unittest.TestCase):
+
+    def test_phases_are_collected(self):
+        container = FlakeContainer()
+        collector = container.instrument(PhaseCollector())
+        container.from_files(['integrationtests/test_data/polling/resources.xml'])
+        container.build_all()
+        self.assertEqual({'integrationtests/test_data/polling/resources.xml': 2}, collector.file_descriptor_counts)
+        self.assertEqual(1, collector.phase_counts[PHASE_PARSE])
+        self.assertEqual(2, collector.phase_counts[PHASE_BUILD])
+        self.assertEqual({'integrationtests.test_pollingapp.PollService', 'integrationtests.test_pollingapp.UiService'},
+                         set(collector.by_proto()))
+
+    def test_uninstrumented_containers_stop_reporting(self):
+        container = FlakeContainer()
+        collector = container.instrument(PhaseCollector())
+        container.uninstrument()
+        container.from_files(['integrationtests/test_data/polling/resources.xml'])
+        container.build_all()
+        self.assertEqual({}, collector.by_phase())
+
+
+class IntegrationTestPollingAppBundle(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.bundle_path = os.path.join(self.temp_dir, 'resources.pfb')
+        compile_bundle(['integrationtests/test_data/polling/resources.xml'], self.bundle_path)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def test_flakes_are_built_from_a_bundle(self):
+        container = FlakeContainer()
+        container.from_bundle(self.bundle_path)
+        ui_service = container.get('ui_service')
+        self.assertIs(container.get('poll_service'), ui_service.poll_service)
+
+
+class IntegrationTestPollingAppFrozen(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.container = FlakeContainer()
+        self.container.from_files(['integrationtests/test_data/polling/resources.xml'])
+
+    def tearDown(self) -> None:
+        gc.unfreeze()
+
+    def test_frozen_containers_build_flakes(self):
+        self.container.freeze(gc_freeze=False)
+        ui_service = self.container.get('ui_service')
+        self.assertIs(self.container.get('poll_service'), ui_service.poll_service)
+
+    def test_freezing_freezes_the_garbage_collector(self):
+        self.container.freeze()
+        self.assertGreater(gc.get_freeze_count(), 0)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs fork')
+    def test_forked_workers_build_from_the_frozen_definitions(self):
+        self.container.freeze()
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                ui_service = self.container.get('ui_service')
+                os.write(write_end, type(ui_service.poll_service).__name__.encode())
+            finally:
+                os._exit(0)
+        os.close(write_end)
+        os.waitpid(pid, 0)
+        self.assertEqual(b'PollService', os.read(read_end, 100))
+        os.close(read_end)
+        self.assertFalse(self.container.flake_registry.has('ui_service'))
+
+
+class IntegrationTestPollingAppValidated(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.container = FlakeContainer()
+
+    def test_valid_files_load(self):
+        self.container.from_files(['integrationtests/test_data/polling/resources.xml'], validate=True)
+        self.assertIsInstance(self.container.get('ui_service').poll_service, PollService)
+
+    def test_invalid_definitions_fail_at_load_time(self):
+        with self.assertRaises(InvalidDefinitions) as raised:
+            self.container.from_list([
+                {'proto': 'integrationtests.test_pollingapp.UiService', 'id': 'ui_service',
+                 'poll_service': {'is_flake_ref': True, 'id': 'poll_service'}},
+                {'proto': 'integrationtests.test_pollingapp.Missing', 'id': 'missing'},
+            ], validate=True)
+        self.assertEqual({'ui_service', 'missing'}, {error.flake_id for error in raised.exception.errors})
@@ -3,37 +3,225 @@ The flake container is the main interface to the proto flake service.
 It acts as a facade between the outer world and the internals of proto flake.
 Please note you can have as many FlakeContainer as you wish inside your application.
 """
+import gc
+from threading import Thread
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+
+from .asyncflakeservice import AsyncFlakeService
+from .constants import PRELOAD_BACKGROUND
+from .constants import PRELOAD_NOW
+from .constants import SCOPE_PROTOTYPE
+from .containersnapshot import ContainerSnapshot
+from .descriptorcache import DescriptorCache
 from .discoveryservice import DiscoveryService
 from .filediscoverer import FileDiscoverer
+from .filewatcher import FileWatcher
 from .flakebuilder import FlakeBuilder
+from .flakecontext import FlakeContext
 from .flakefactory import FlakeFactory
+from .flakepool import FlakeNotPoolable
+from .flakepool import FlakePool
 from .flakeregistry import FlakeRegistry
 from .flakeservice import FlakeService
+from .instrumentation import Instrumentation
+from .instrumentation import InstrumentationListener
 from .listdiscoverer import ListDiscoverer
 from .protoregistry import ProtoRegistry
+from .protoschema import DefinitionValidator
+
+
+class UnknownPreloadMode(ValueError):
+    def __init__(self, preload, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.msg = 'Unknown preload mode %s, expected %s or %s' % (preload, PRELOAD_NOW, PRELOAD_BACKGROUND)
 
 
 class FlakeContainer(object):
 
-    def __init__(self):
+    def __init__(self, descriptor_cache: DescriptorCache = None, lazy: bool = False, compact: bool = False):
         self.proto_registry = ProtoRegistry()
         self.flake_registry = FlakeRegistry()
         self.flake_factory = FlakeFactory()
+        self.file_discoverer_class = FileDiscoverer
+        self.list_discoverer_class = ListDiscoverer
+        self.discovery_service = DiscoveryService(
+            self.file_discoverer_class,
+            self.list_discoverer_class,
+            descriptor_cache,
+            compact
+        )
         self.builder = FlakeBuilder(
             self.flake_factory,
             self.flake_registry,
-            self.proto_registry
+            self.proto_registry,
+            self.discovery_service,
+            lazy
         )
-        self.file_discoverer_class = FileDiscoverer
-        self.list_discoverer_class = ListDiscoverer
-        self.discovery_service = DiscoveryService(self.file_discoverer_class, self.list_discoverer_class)
         self.flake_service = FlakeService(self.discovery_service, self.builder)
+        self.validator = DefinitionValidator(self.proto_registry)
+        self.async_flake_service = AsyncFlakeService(self.flake_service, self.discovery_service)
+        # flake id -> pool of prototype scoped flakes
+        self.pools: Dict[str, FlakePool] = {}
+
+    def from_list(self, *args, preload: str = None, validate: bool = False, **kwargs):
+        """:param preload: PRELOAD_NOW or PRELOAD_BACKGROUND to import the protos right after, see preload_protos
+        :param validate: validate every definition discovered so far right after, see validate
+        """
+        self.discovery_service.from_list(*args, **kwargs)
+        self.after_discovery(preload, validate)
+
+    def from_files(self, *args, preload: str = None, validate: bool = False, **kwargs):
+        """:param preload: PRELOAD_NOW or PRELOAD_BACKGROUND to import the protos right after, see preload_protos
+        :param validate: validate every definition discovered so far right after, see validate
+        """
+        self.discovery_service.from_files(*args, **kwargs)
+        self.after_discovery(preload, validate)
+
+    def from_bundle(self, bundle_path: str, preload: str = None, validate: bool = False):
+        """Discovers the definitions of a bundle compiled by compile_bundle, see DiscoveryService.from_bundle.
+        Preloading protos or validating decodes every definition of the bundle.
+        """
+        self.discovery_service.from_bundle(bundle_path)
+        self.after_discovery(preload, validate)
+
+    def freeze(self, gc_freeze: bool = True):
+        """Prepares the container to be shared with forked processes, the workers of a pre-fork server for
+        instance: call it from the parent once discovery is done, right before forking.
+        Definitions move to shared memory and are decoded by each worker as it needs them, see
+        DiscoveryService.freeze. Flakes are still built by each worker, the ones built before are inherited.
+        :param gc_freeze: also move every object tracked by the garbage collector to its permanent generation,
+        see gc.freeze, so that collections in the workers do not write to the pages they inherited
+        """
+        self.discovery_service.freeze()
+        if gc_freeze:
+            gc.collect()
+            gc.freeze()
+
+    def preload_protos(self, background: bool = False) -> Optional[Thread]:
+        """Imports the modules of every proto discovered so far, instead of importing each one the first time
+        one of its flakes is built. Import times are then available from proto_registry.slowest_imports.
+        :param background: import from a daemon thread, which is returned
+        """
+        return self.proto_registry.preload(self.discovery_service.get_proto_modules(), background)
+
+    def validate(self):
+        """Checks every definition discovered so far against its proto, see DefinitionValidator.
+        References are checked too, so validate once all the files a container needs have been discovered.
+        :raises InvalidDefinitions: listing every error found, grouped by the file holding the definition
+        """
+        self.validator.validate(self.discovery_service.definitions)
 
-    def from_list(self, *args, **kwargs):
-        return self.discovery_service.from_list(*args, **kwargs)
+    def after_discovery(self, preload: str = None, validate: bool = False):
+        if validate:
+            self.validate()
+        self.preload_protos_after_discovery(preload)
 
-    def from_files(self, *args, **kwargs):
-        return self.discovery_service.from_files(*args, **kwargs)
+    def preload_protos_after_discovery(self, preload: str = None):
+        if preload is None:
+            return
+        if preload not in (PRELOAD_NOW, PRELOAD_BACKGROUND):
+            raise UnknownPreloadMode(preload)
+        self.preload_protos(preload == PRELOAD_BACKGROUND)
+
+    def instrument(self, listener: InstrumentationListener) -> InstrumentationListener:
+        """Reports the container's lifecycle events to listener from now on, see Instrumentation.
+        Typically given a PhaseCollector, to get a breakdown of the time spent parsing, importing and building.
+        :return: listener
+        """
+        instrumentation = self.discovery_service.instrumentation
+        if instrumentation is None:
+            instrumentation = Instrumentation()
+            self.set_instrumentation(instrumentation)
+        return instrumentation.add_listener(listener)
+
+    def uninstrument(self):
+        """Stops reporting to every listener, the container goes back to not timing anything"""
+        self.set_instrumentation(None)
+
+    def set_instrumentation(self, instrumentation: Optional[Instrumentation]):
+        self.discovery_service.instrumentation = instrumentation
+        self.proto_registry.instrumentation = instrumentation
+        self.builder.instrumentation = instrumentation
 
     def get(self, *args, **kwargs):
         return self.flake_service.get(*args, **kwargs)
+
+    def build_all(self, *args, **kwargs):
+        return self.flake_service.build_all(*args, **kwargs)
+
+    def context(self) -> FlakeContext:
+        """A new context, to get context scoped flakes from. Use it in a with block to close it once done."""
+        return FlakeContext(self.discovery_service, self.builder)
+
+    def pool(self, flake_id: str, max_size: int = 8) -> FlakePool:
+        """The pool recycling the flakes of a prototype scoped definition, created on first call
+        :raises FlakeNotPoolable: when the definition is not prototype scoped
+        """
+        pool = self.pools.get(flake_id)
+        if pool is None:
+            scope = self.discovery_service.get_definition(flake_id).scope
+            if scope != SCOPE_PROTOTYPE:
+                raise FlakeNotPoolable(flake_id, scope)
+            pool = self.pools.setdefault(flake_id, FlakePool(flake_id, lambda: self.get(flake_id), max_size))
+        return pool
+
+    def reload(self) -> Set[str]:
+        """Parses again the files which changed since they were discovered, and drops the flakes built from
+        the definitions they changed, along with the flakes depending on those. They are built again on next get.
+        Idle pooled flakes of those definitions are dropped as well.
+        Flakes already handed out are left as they are, it is up to the caller to get them again.
+        :return: the ids of the flakes which were invalidated
+        """
+        stale_ids = self.discovery_service.reload()
+        for flake_id in stale_ids:
+            self.flake_registry.remove(flake_id)
+            pool = self.pools.get(flake_id)
+            if pool is not None:
+                pool.clear()
+        self.builder.forget_plans(stale_ids)
+        self.async_flake_service.forget(stale_ids)
+        return stale_ids
+
+    def watch(self, interval: float = 1.0, on_reload: Callable[[Set[str]], None] = None) -> FileWatcher:
+        """Starts polling the discovered files in a background thread, reloading whenever some of them change.
+        Call stop on the returned watcher to stop it.
+        """
+        return FileWatcher(self.reload, interval, on_reload).start()
+
+    async def afrom_files(self, *args, **kwargs):
+        """from_files reading and parsing the files in an executor, off the event loop"""
+        return await self.async_flake_service.from_files(*args, **kwargs)
+
+    async def aget(self, *args, **kwargs):
+        """get building the flake in an executor, then awaiting the async init hooks, see AsyncFlakeService"""
+        return await self.async_flake_service.get(*args, **kwargs)
+
+    def snapshot(self, path: str):
+        """Saves the definitions and the flakes built so far, see ContainerSnapshot"""
+        ContainerSnapshot.take(self.discovery_service, self.flake_registry, self.builder.lazy).save(path)
+
+    def restore(self, path: str, file_paths: List[str] = None) -> bool:
+        """Loads a snapshot if it is still up to date (and was taken from file_paths, when given)
+        :return: whether the snapshot was restored
+        """
+        snapshot = ContainerSnapshot.load(path)
+        if snapshot is None or not snapshot.is_valid(file_paths):
+            return False
+        snapshot.restore_into(self.discovery_service, self.flake_registry)
+        return True
+
+    def from_snapshot(self, path: str, file_paths: List[str]) -> bool:
+        """Restores the snapshot at path if it is up to date with file_paths. Otherwise loads the files,
+        builds every flake and saves a new snapshot for next time.
+        :return: whether the snapshot was restored
+        """
+        if self.restore(path, file_paths):
+            return True
+        self.from_files(file_paths)
+        self.build_all()
+        self.snapshot(path)
+        return False
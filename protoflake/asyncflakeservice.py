@@ -0,0 +1,159 @@
+"""
+Asyncio facade over the flake and discovery services.
+File reads, parsing and flake construction are blocking, so they run in an executor instead of the event loop.
+Concurrent requests for the same flake share a single build.
+Once built, flakes defining the ASYNC_INIT_HOOK coroutine method get it awaited, exactly once per flake.
+Flakes built along the way (references and nested flakes) are initialized first, dependencies before dependents.
+They are found by walking the definitions reachable from the flake, off the event loop.
+In lazy mode, only the flakes actually built by the time a get returns are initialized.
+Prototypes are never registered, so each get builds one in the executor and awaits the hook of that instance.
+"""
+import asyncio
+import inspect
+from concurrent.futures import Executor
+from functools import partial
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+from protoflake.constants import ASYNC_INIT_HOOK
+from protoflake.dependencygraph import iter_nested
+from protoflake.dependencygraph import iter_references
+from protoflake.discoveryservice import DiscoveryService
+from protoflake.flakeservice import FlakeService
+
+
+class AsyncFlakeService(object):
+
+    def __init__(self,
+                 flake_service: FlakeService,
+                 discovery_service: DiscoveryService,
+                 executor: Executor = None):
+        self.flake_service = flake_service
+        self.discovery = discovery_service
+        # None means the loop's default executor
+        self.executor = executor
+        # flake id -> task building it, shared by every concurrent get for that id
+        self.pending: Dict[str, asyncio.Future] = {}
+        # flake id -> task running its init hook
+        self.initialized: Dict[str, asyncio.Future] = {}
+        # flakes returned by get, built and initialized along with their dependencies. Never holds prototypes
+        self.ready = set()
+
+    def forget(self, flake_ids: Iterable[str]):
+        """Called once flakes were invalidated, so that they are built and initialized again on the next get"""
+        for flake_id in flake_ids:
+            self.ready.discard(flake_id)
+            self.initialized.pop(flake_id, None)
+
+    async def run_blocking(self, func, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    async def from_files(self, file_paths: List[str], **kwargs):
+        """Same as DiscoveryService.from_files, without blocking the event loop"""
+        await self.run_blocking(self.discovery.from_files, file_paths, **kwargs)
+
+    async def get(self, flake_id: str) -> Any:
+        if flake_id in self.ready:
+            return self.flake_service.get(flake_id)
+        if not self.is_shared(flake_id):
+            return await self.build(flake_id)
+        task = self.pending.get(flake_id)
+        if task is None:
+            task = self.pending[flake_id] = asyncio.ensure_future(self.build(flake_id))
+            task.add_done_callback(lambda _: self.pending.pop(flake_id, None))
+        # one caller being cancelled must not cancel the build the other callers are waiting for
+        return await asyncio.shield(task)
+
+    def is_shared(self, flake_id: str) -> bool:
+        """Whether every get of flake_id returns the same flake, prototypes are built anew each time"""
+        builder = self.flake_service.builder
+        if builder.has(flake_id):
+            return True
+        definition = self.discovery.definitions.get(flake_id)
+        return definition is None or builder.can_register(definition.scope)
+
+    async def build(self, flake_id: str) -> Any:
+        flake = await self.run_blocking(self.flake_service.get, flake_id)
+        built_ids = await self.run_blocking(list, self.iter_built_ids(flake_id))
+        for built_id in built_ids:
+            await self.initialize(built_id)
+        if not self.flake_service.builder.has(flake_id):
+            # not registered, this instance is only handed out once
+            await self.run_hook(flake)
+            return flake
+        self.ready.add(flake_id)
+        return flake
+
+    def resolve(self, reference: str) -> Optional[str]:
+        """Root flake id building the referenced flake, None for undefined ones"""
+        if reference in self.discovery.definitions:
+            return reference
+        return self.discovery.get_owner_id(reference)
+
+    def iter_dependencies(self, root_id: str) -> Iterator[str]:
+        definition = self.discovery.definitions.get(root_id)
+        if definition is None:
+            return
+        for reference in iter_references(definition):
+            owner_id = self.resolve(reference)
+            # references between flakes nested in the same root are built along with it
+            if owner_id is not None and (owner_id != root_id or reference == root_id):
+                yield owner_id
+
+    def iter_built_ids(self, flake_id: str) -> Iterator[str]:
+        """Ids of the flakes built by getting flake_id, in the order they were built.
+        Only the definitions reachable from flake_id are read, bundles are not decoded as a whole.
+        """
+        root_id = self.resolve(flake_id)
+        if root_id is None:
+            return
+        visited = {root_id}
+        stack = [(root_id, self.iter_dependencies(root_id))]
+        while stack:
+            current_id, dependencies = stack[-1]
+            dependency = next(dependencies, None)
+            if dependency is None:
+                stack.pop()
+                yield from self.iter_registered(current_id)
+            elif dependency not in visited:
+                visited.add(dependency)
+                stack.append((dependency, self.iter_dependencies(dependency)))
+
+    def iter_registered(self, root_id: str) -> Iterator[str]:
+        """The root flake and the flakes nested in it which were registered, nested ones first"""
+        builder = self.flake_service.builder
+        definition = self.discovery.definitions.get(root_id)
+        if definition is not None:
+            for nested in iter_nested(definition):
+                if builder.has(nested.id):
+                    yield nested.id
+        if builder.has(root_id):
+            yield root_id
+
+    async def initialize(self, flake_id: str):
+        task = self.initialized.get(flake_id)
+        if task is None:
+            task = self.initialized[flake_id] = asyncio.ensure_future(self.run_init_hook(flake_id))
+        try:
+            await task
+        except Exception:
+            # let the next get try again
+            if self.initialized.get(flake_id) is task:
+                del self.initialized[flake_id]
+            raise
+
+    async def run_init_hook(self, flake_id: str):
+        await self.run_hook(self.flake_service.builder.get_ref(flake_id))
+
+    @staticmethod
+    async def run_hook(flake: Any):
+        hook = getattr(flake, ASYNC_INIT_HOOK, None)
+        if hook is None:
+            return
+        result = hook()
+        if inspect.isawaitable(result):
+            await result
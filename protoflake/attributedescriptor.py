@@ -6,6 +6,7 @@ from protoflake.flakeprovider import FlakeProvider
 
 class AttributeDescriptor(ABC):
     """Attributes used to create a flake"""
+    __slots__ = ()
     name: str
 
     @abstractmethod
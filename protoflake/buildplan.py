@@ -0,0 +1,158 @@
+"""
+A build plan is a flake descriptor compiled once into a flat list of instructions, which the builder runs
+each time it builds a flake from that descriptor, instead of walking the descriptor tree again.
+Primitives are resolved ahead of time into a template of the flake's data, the instructions only compute
+the other attributes. The reserved scope attribute is left out.
+Each instruction is an (opcode, operand, name) tuple: the value it produces is stored under name in the data
+of the flake being built, or pushed on a stack when name is None, for the list instruction which follows
+to collect.
+Nested flakes are either requested from the builder's provider, which registers them under their own id
+like any other build, or, with fresh_nested, built in place on each run from the same instruction list,
+between a BEGIN instruction and the MAKE instruction which turns their data into a flake.
+"""
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from protoflake.attributedescriptor import AttributeDescriptor
+from protoflake.constants import SCOPE_ATTRIBUTE
+from protoflake.descriptors import ListAttributeDescriptor
+from protoflake.descriptors import NestedFlakeDescriptor
+from protoflake.descriptors import PrimitiveAttributeDescriptor
+from protoflake.descriptors import ReferenceAttributeDescriptor
+from protoflake.flakedescriptor import FlakeDescriptor
+from protoflake.protoregistry import ProtoRegistry
+
+# operand: flake id, gets the referenced flake from the provider
+OP_REF = 0
+# operand: tuple of primitives, makes a new list of them
+OP_COPY = 1
+# operand: any value, used as is
+OP_CONST = 2
+# operand: nested flake descriptor, gets the nested flake from the provider
+OP_NEW = 3
+# operand: item count, pops that many values into a new list
+OP_LIST = 4
+# operand: (flake id, template), starts the data of a nested flake built in place
+OP_BEGIN = 5
+# operand: (flake id, proto name, proto), turns the data started by the matching OP_BEGIN into a flake
+OP_MAKE = 6
+
+Instruction = Tuple[int, Any, Any]
+
+
+class BuildPlan(object):
+
+    def __init__(self,
+                 flake_id: str,
+                 proto_name: str,
+                 proto,
+                 template: Dict[str, Any],
+                 instructions: List[Instruction]):
+        self.flake_id = flake_id
+        self.proto_name = proto_name
+        self.proto = proto
+        # every attribute in descriptor order, the ones computed by instructions are None until then
+        self.template = template
+        self.instructions = instructions
+
+    @classmethod
+    def compile(cls,
+                descriptor: FlakeDescriptor,
+                proto_registry: ProtoRegistry,
+                fresh_nested: bool = False) -> 'BuildPlan':
+        """:param fresh_nested: build nested flakes in place on each run rather than through the provider"""
+        instructions = []
+        template = cls.compile_flake(descriptor, instructions, proto_registry, fresh_nested)
+        proto = proto_registry.get(descriptor.proto_module, descriptor.proto_class)
+        return cls(descriptor.id, descriptor.proto_name, proto, template, instructions)
+
+    @classmethod
+    def compile_flake(cls, descriptor: FlakeDescriptor, instructions: List[Instruction],
+                      proto_registry: ProtoRegistry, fresh_nested: bool) -> Dict[str, Any]:
+        """Appends the instructions computing the descriptor's attributes, returns its template"""
+        template = {}
+        for attr_name, attr_descriptor in descriptor.attrs.items():
+            # the scope is read by the builder, it is not an attribute of the flake
+            if attr_name == SCOPE_ATTRIBUTE:
+                continue
+            if type(attr_descriptor) is PrimitiveAttributeDescriptor:
+                template[attr_name] = attr_descriptor.value
+            else:
+                template[attr_name] = None
+                cls.compile_attr(attr_descriptor, attr_name, instructions, proto_registry, fresh_nested)
+        return template
+
+    @classmethod
+    def compile_attr(cls, attr_descriptor: AttributeDescriptor, name, instructions: List[Instruction],
+                     proto_registry: ProtoRegistry, fresh_nested: bool):
+        # exact type checks, isinstance goes through the ABC machinery of AttributeDescriptor
+        attr_type = type(attr_descriptor)
+        if attr_type is PrimitiveAttributeDescriptor:
+            instructions.append((OP_CONST, attr_descriptor.value, name))
+        elif attr_type is ReferenceAttributeDescriptor:
+            instructions.append((OP_REF, attr_descriptor.reference_flake_id, name))
+        elif attr_type is NestedFlakeDescriptor:
+            nested = attr_descriptor.nested_descriptor
+            if not fresh_nested:
+                instructions.append((OP_NEW, nested, name))
+                return
+            begin = len(instructions)
+            instructions.append(None)
+            template = cls.compile_flake(nested, instructions, proto_registry, fresh_nested)
+            instructions[begin] = (OP_BEGIN, (nested.id, template), None)
+            proto = proto_registry.get(nested.proto_module, nested.proto_class)
+            instructions.append((OP_MAKE, (nested.id, nested.proto_name, proto), name))
+        elif attr_type is ListAttributeDescriptor:
+            items = attr_descriptor.value
+            if all(type(item) is PrimitiveAttributeDescriptor for item in items):
+                instructions.append((OP_COPY, tuple(item.value for item in items), name))
+                return
+            for item in items:
+                cls.compile_attr(item, None, instructions, proto_registry, fresh_nested)
+            instructions.append((OP_LIST, len(items), name))
+        else:
+            raise TypeError('Cannot compile attribute descriptor %r' % (attr_descriptor,))
+
+    def run(self, builder) -> Dict[str, Any]:
+        """Computes the data of a new flake. References and nested flakes come from the builder's provider,
+        nested flakes built in place go through its create method and its building stack.
+        The caller is responsible for pushing the plan's own flake id on that stack.
+        """
+        provider = builder.attribute_provider
+        building = builder.building
+        data = self.template.copy()
+        # data of the flakes enclosing the nested flake being built in place
+        frames = []
+        stack = []
+        for opcode, operand, name in self.instructions:
+            if opcode == OP_REF:
+                value = provider.get_ref(operand)
+            elif opcode == OP_COPY:
+                value = list(operand)
+            elif opcode == OP_CONST:
+                value = operand
+            elif opcode == OP_NEW:
+                value = provider.get_new(operand)
+            elif opcode == OP_LIST:
+                if operand:
+                    value = stack[-operand:]
+                    del stack[-operand:]
+                else:
+                    value = []
+            elif opcode == OP_BEGIN:
+                frames.append(data)
+                building.append(operand[0])
+                data = operand[1].copy()
+                continue
+            else:
+                flake_id, proto_name, proto = operand
+                value = builder.create(flake_id, proto_name, proto, data)
+                building.pop()
+                data = frames.pop()
+            if name is None:
+                stack.append(value)
+            else:
+                data[name] = value
+        return data
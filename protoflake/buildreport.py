@@ -0,0 +1,40 @@
+"""
+The build report tells how long each flake took to build during a bulk build.
+Flakes are built after their dependencies, so a flake's time mostly covers its own construction
+and the flakes nested in it, not the flakes it references.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Dict
+from typing import List
+
+
+@dataclass
+class FlakeTiming(object):
+    flake_id: str
+    proto_name: str
+    duration: float
+
+
+@dataclass
+class BuildReport(object):
+    timings: List[FlakeTiming] = field(default_factory=list)
+    total: float = 0.0
+
+    def add(self, flake_id: str, proto_name: str, duration: float):
+        self.timings.append(FlakeTiming(flake_id, proto_name, duration))
+
+    @property
+    def built_count(self) -> int:
+        return len(self.timings)
+
+    def slowest(self, count: int = 10) -> List[FlakeTiming]:
+        return sorted(self.timings, key=lambda timing: timing.duration, reverse=True)[:count]
+
+    def by_proto(self) -> Dict[str, float]:
+        """Total build time per proto, slowest proto first"""
+        durations = defaultdict(float)
+        for timing in self.timings:
+            durations[timing.proto_name] += timing.duration
+        return dict(sorted(durations.items(), key=lambda item: item[1], reverse=True))
@@ -0,0 +1,23 @@
+"""
+Implements the FlakeDiscoverer over a definition bundle compiled by compile_bundle.
+The DiscoveryService does not call discover on it, it opens the bundle instead and reads definitions
+from it as they are requested, see DefinitionBundle.
+"""
+from typing import List
+
+from protoflake.definitionbundle import DefinitionBundle
+from protoflake.flakedescriptor import FlakeDescriptor
+from protoflake.flakediscoverer import FlakeDiscoverer
+
+
+class BundleDiscoverer(FlakeDiscoverer):
+
+    def __init__(self, bundle_path: str):
+        self.bundle_path = bundle_path
+
+    def open(self) -> DefinitionBundle:
+        return DefinitionBundle.open(self.bundle_path)
+
+    def discover(self) -> List[FlakeDescriptor]:
+        """Decodes every definition of the bundle at once"""
+        return list(self.open().values())
@@ -0,0 +1,140 @@
+"""
+Compact storage for flake definitions, meant for definition sets too large to keep as plain FlakeDescriptors.
+Each definition is packed into a slotted PackedFlake:
+    - proto names, attribute key tuples and sources are stored once and shared by every flake using them
+    - references and primitives shared by the DescriptorInterner keep pointing to the shared descriptors
+    - other primitives (ids, unique values) are kept as raw python values, their descriptor is only created
+      when reading
+    - lists become tuples and nested flakes are packed the same way as root ones
+CompactDefinitions behaves like the id -> FlakeDescriptor dict the discovery service uses otherwise.
+Descriptors are unpacked lazily, every read creates a new FlakeDescriptor.
+"""
+from collections.abc import MutableMapping
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import Optional
+from typing import Tuple
+
+from protoflake.attributedescriptor import AttributeDescriptor
+from protoflake.descriptors import ListAttributeDescriptor
+from protoflake.descriptors import NestedFlakeDescriptor
+from protoflake.descriptors import PrimitiveAttributeDescriptor
+from protoflake.descriptors import ReferenceAttributeDescriptor
+from protoflake.descriptorinterner import DescriptorInterner
+from protoflake.descriptorinterner import default_interner
+from protoflake.flakedescriptor import FlakeDescriptor
+from protoflake.sourcedescriptor import SourceDescriptor
+
+
+RAW_PRIMITIVE_TYPES = {str: 'str', int: 'int', float: 'float', bool: 'bool'}
+SHARED_DESCRIPTOR_TYPES = frozenset((PrimitiveAttributeDescriptor, ReferenceAttributeDescriptor))
+
+
+class PackedFlake(object):
+    __slots__ = ('id', 'proto_name', 'keys', 'source', 'values')
+
+    def __init__(self, flake_id: str, proto_name: str, keys: Tuple[str, ...], source: SourceDescriptor,
+                 values: Tuple[Any, ...]):
+        self.id = flake_id
+        self.proto_name = proto_name
+        self.keys = keys
+        self.source = source
+        self.values = values
+
+
+class CompactDefinitions(MutableMapping):
+
+    def __init__(self, interner: DescriptorInterner = default_interner):
+        self.interner = interner
+        self.packed: Dict[str, PackedFlake] = {}
+        self.proto_names: Dict[str, str] = {}
+        self.key_tuples: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+        # (source class, path or hint) -> source, sources are mutable dataclasses so they cannot be hashed
+        # themselves. Keyed by what they point to, so that reloading a file does not add an entry
+        self.sources: Dict[Tuple[type, str], SourceDescriptor] = {}
+
+    def share(self, table: dict, value):
+        shared = table.get(value)
+        if shared is None:
+            shared = table.setdefault(value, value)
+        return shared
+
+    def get_source_key(self, source: SourceDescriptor) -> Optional[Tuple[type, str]]:
+        """None for sources pointing to neither a file nor a hint, they are not shared"""
+        location = getattr(source, 'full_path', None) or getattr(source, 'hint', None)
+        return None if location is None else (type(source), location)
+
+    def share_source(self, source: SourceDescriptor) -> SourceDescriptor:
+        key = self.get_source_key(source)
+        if key is None:
+            return source
+        shared = self.sources.get(key)
+        if shared is None:
+            shared = self.sources.setdefault(key, source)
+        return shared
+
+    def pack(self, descriptor: FlakeDescriptor) -> PackedFlake:
+        return PackedFlake(
+            descriptor.id,
+            self.share(self.proto_names, descriptor.proto_name),
+            self.share(self.key_tuples, tuple(descriptor.attrs)),
+            None if descriptor.source is None else self.share_source(descriptor.source),
+            tuple(self.pack_attr(attr) for attr in descriptor.attrs.values()),
+        )
+
+    def pack_attr(self, attr: AttributeDescriptor) -> Any:
+        attr_type = type(attr)
+        if attr_type is PrimitiveAttributeDescriptor:
+            if RAW_PRIMITIVE_TYPES.get(type(attr.value)) != attr.type:
+                return attr
+            # a shared descriptor costs a pointer just like a raw value would, and is cheaper to read back
+            if self.interner.primitives.get((attr.type, attr.value)) is attr:
+                return attr
+            return attr.value
+        elif attr_type is ListAttributeDescriptor:
+            return tuple(self.pack_attr(item) for item in attr.value)
+        elif attr_type is NestedFlakeDescriptor:
+            return self.pack(attr.nested_descriptor)
+        return attr
+
+    def unpack(self, packed: PackedFlake) -> FlakeDescriptor:
+        attrs = dict(zip(packed.keys, map(self.unpack_attr, packed.values)))
+        return FlakeDescriptor(packed.proto_name, packed.id, attrs, packed.source)
+
+    def unpack_attr(self, value: Any) -> AttributeDescriptor:
+        value_type = type(value)
+        if value_type in SHARED_DESCRIPTOR_TYPES:
+            return value
+        type_name = RAW_PRIMITIVE_TYPES.get(value_type)
+        if type_name is not None:
+            return PrimitiveAttributeDescriptor(type_name, value)
+        elif value_type is tuple:
+            return ListAttributeDescriptor([self.unpack_attr(item) for item in value])
+        elif value_type is PackedFlake:
+            return NestedFlakeDescriptor(self.unpack(value))
+        return value
+
+    def get_packed(self, flake_id: str) -> PackedFlake:
+        return self.packed[flake_id]
+
+    def __getitem__(self, flake_id: str) -> FlakeDescriptor:
+        return self.unpack(self.packed[flake_id])
+
+    def __setitem__(self, flake_id: str, descriptor):
+        """Accepts FlakeDescriptors, or flakes already packed by this instance"""
+        if type(descriptor) is not PackedFlake:
+            descriptor = self.pack(descriptor)
+        self.packed[flake_id] = descriptor
+
+    def __delitem__(self, flake_id: str):
+        del self.packed[flake_id]
+
+    def __contains__(self, flake_id) -> bool:
+        return flake_id in self.packed
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.packed)
+
+    def __len__(self) -> int:
+        return len(self.packed)
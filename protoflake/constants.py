@@ -11,3 +11,21 @@ XML_INT = 'int-'
 XML_NESTED_FLAKE = 'flake-'
 XML_REF = 'ref-'
 YAML_ROOT = 'flakes'
+PARALLEL_THREADS = 'threads'
+PARALLEL_PROCESSES = 'processes'
+PRELOAD_NOW = 'now'
+PRELOAD_BACKGROUND = 'background'
+# coroutine method awaited once on every flake built through the async interface
+ASYNC_INIT_HOOK = '__flake_async_init__'
+# reserved flake attribute telling how long instances built from a definition live, dunder named like the hooks
+# so that it cannot collide with an attribute of the protos
+SCOPE_ATTRIBUTE = '__scope__'
+# built once per container, the default
+SCOPE_SINGLETON = 'singleton'
+# built anew each time it is requested or referenced
+SCOPE_PROTOTYPE = 'prototype'
+# built once per FlakeContext
+SCOPE_CONTEXT = 'context'
+SCOPES = (SCOPE_SINGLETON, SCOPE_PROTOTYPE, SCOPE_CONTEXT)
+# method called on pooled flakes when they are given back to their FlakePool
+POOL_RESET_HOOK = '__flake_reset__'
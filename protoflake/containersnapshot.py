@@ -0,0 +1,105 @@
+"""
+A container snapshot saves everything a FlakeContainer knows to a file: the discovered definitions,
+every flake built so far and fingerprints of the files the definitions came from.
+Restoring a snapshot whose fingerprints still match skips discovery, proto imports and building altogether.
+Flakes are pickled together so that flakes referencing the same flake still share it once restored,
+which requires flakes and their protos to be picklable. Pickling the proxies of lazy containers builds the
+flakes behind them, so those are resolved before the flakes are gathered.
+"""
+import os
+import pickle
+from dataclasses import dataclass
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+
+from protoflake.discoveryservice import DiscoveryService
+from protoflake.fingerprint import FileFingerprint
+from protoflake.flakedescriptor import FlakeDescriptor
+from protoflake.flakeregistry import FlakeRegistry
+
+
+# bump whenever the snapshot content changes shape
+SNAPSHOT_VERSION = 4
+
+
+class SnapshotError(Exception):
+    def __init__(self, path, reason, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.msg = 'Unable to snapshot the container to %s: %s' % (path, reason)
+
+
+def resolve_flakes(flake_registry: FlakeRegistry) -> Dict[str, Any]:
+    """The registry's flakes, once resolving the proxies they hold does not build any more flakes.
+    Flakes built while pickling would be missing from the snapshot's flakes, and restored apart from
+    the registered flake of the same id.
+    """
+    flakes = dict(flake_registry.registry)
+    while True:
+        try:
+            pickle.dumps(flakes, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            # reported by save
+            return flakes
+        if len(flake_registry.registry) == len(flakes):
+            return flakes
+        flakes = dict(flake_registry.registry)
+
+
+@dataclass
+class ContainerSnapshot(object):
+    fingerprints: List[FileFingerprint]
+    definitions: Dict[str, FlakeDescriptor]
+    flakes: Dict[str, Any]
+    version: int = SNAPSHOT_VERSION
+
+    @staticmethod
+    def take(discovery_service: DiscoveryService, flake_registry: FlakeRegistry,
+             lazy: bool = False) -> 'ContainerSnapshot':
+        """:param lazy: whether the flakes may hold proxies, see resolve_flakes"""
+        return ContainerSnapshot(
+            # as the files were when parsed, a file edited since must not match the definitions snapshotted
+            discovery_service.source_fingerprints,
+            dict(discovery_service.definitions),
+            resolve_flakes(flake_registry) if lazy else dict(flake_registry.registry),
+        )
+
+    def save(self, path: str):
+        temp_path = '%s.%d.tmp' % (path, os.getpid())
+        try:
+            with open(temp_path, 'wb') as file:
+                pickle.dump(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as error:
+            os.remove(temp_path)
+            raise SnapshotError(path, error)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def load(path: str) -> Optional['ContainerSnapshot']:
+        """Returns the snapshot saved at path, or None if there is none or it cannot be read anymore"""
+        try:
+            with open(path, 'rb') as file:
+                snapshot = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, TypeError):
+            return None
+        if not isinstance(snapshot, ContainerSnapshot) or snapshot.version != SNAPSHOT_VERSION:
+            return None
+        return snapshot
+
+    def is_valid(self, file_paths: Iterable[str] = None) -> bool:
+        """Tells whether every snapshot file is unchanged and, when given, whether the snapshot was taken
+        from exactly these files, in this order.
+        """
+        if file_paths is not None:
+            snapshot_paths = [fingerprint.path for fingerprint in self.fingerprints]
+            if snapshot_paths != [os.path.abspath(file_path) for file_path in file_paths]:
+                return False
+        return all(fingerprint.matches() for fingerprint in self.fingerprints)
+
+    def restore_into(self, discovery_service: DiscoveryService, flake_registry: FlakeRegistry):
+        discovery_service.add_definitions(self.definitions.values())
+        discovery_service.track_restored_files(self.fingerprints)
+        for flake_id, flake in self.flakes.items():
+            flake_registry.set(flake_id, flake)
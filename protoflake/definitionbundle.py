@@ -0,0 +1,337 @@
+"""
+A definition bundle is a binary file holding the flake definitions of many flake files, compiled ahead of time
+so that starting a container does not parse anything.
+The file is memory mapped and only read where needed: a hash table at the end of the file maps each flake id
+to the record of its definition, and a definition is decoded the first time it is asked for. Opening a bundle
+only reads its header, whatever its size, and processes mapping the same bundle share its pages.
+
+Layout, little endian:
+ - header, see BUNDLE_HEADER
+ - one record per root flake, in discovery order, each one a marshalled tuple
+ - the table: marshalled (source paths, root flake ids in discovery order)
+ - the index: slot_count slots of BUNDLE_SLOT, open addressing with linear probing on the crc32 of the id.
+   Nested flake ids point to the record of the root flake owning them.
+Records are marshalled, the bundle is only readable by interpreters using the same marshal version,
+other bundles are rejected as invalid and must be compiled again.
+
+    python -m protoflake.definitionbundle definitions.pfb resources/*.xml
+"""
+import argparse
+import marshal
+import mmap
+import os
+import struct
+import zlib
+from collections.abc import Mapping
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import Mapping as MappingType
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from protoflake.dependencygraph import iter_nested
+from protoflake.descriptorinterner import DescriptorInterner
+from protoflake.descriptorinterner import default_interner
+from protoflake.descriptors import FileSourceDescriptor
+from protoflake.descriptors import ListAttributeDescriptor
+from protoflake.descriptors import NestedFlakeDescriptor
+from protoflake.descriptors import PrimitiveAttributeDescriptor
+from protoflake.descriptors import ReferenceAttributeDescriptor
+from protoflake.filediscoverer import FileDiscoverer
+from protoflake.flakedescriptor import FlakeDescriptor
+from protoflake.parserfactory import ParserFactory
+
+BUNDLE_MAGIC = b'PFBN'
+BUNDLE_VERSION = 1
+BUNDLE_EXTENSION = '.pfb'
+# magic, version, marshal version, root count, slot count, table offset, table size, index offset
+BUNDLE_HEADER = struct.Struct('<4sHHIIQQQ')
+# crc32 of the id, kind, record offset, record size
+BUNDLE_SLOT = struct.Struct('<IBQI')
+SLOT_EMPTY = 0
+SLOT_ROOT = 1
+SLOT_NESTED = 2
+
+# attribute encodings other than primitives whose type is named after their python type, which are stored raw
+TAG_REF = 0
+TAG_LIST = 1
+TAG_NESTED = 2
+TAG_PRIMITIVE = 3
+RAW_TYPES = {'str': str, 'int': int, 'float': float, 'bool': bool}
+
+
+class InvalidBundle(Exception):
+    def __init__(self, path, reason, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.msg = 'Cannot read definition bundle %s: %s' % (path, reason)
+
+
+def hash_id(flake_id) -> int:
+    # marshal output depends on whether the string is interned, it cannot be hashed
+    if type(flake_id) is str:
+        return zlib.crc32(flake_id.encode('utf-8', 'surrogatepass'))
+    return zlib.crc32(repr(flake_id).encode('utf-8'))
+
+
+def encode_attr(attr) -> Any:
+    attr_type = type(attr)
+    if attr_type is PrimitiveAttributeDescriptor:
+        if type(attr.value) is RAW_TYPES.get(attr.type):
+            return attr.value
+        return TAG_PRIMITIVE, attr.type, attr.value
+    if attr_type is ReferenceAttributeDescriptor:
+        return TAG_REF, attr.reference_flake_id
+    if attr_type is ListAttributeDescriptor:
+        return TAG_LIST, tuple(encode_attr(item) for item in attr.value)
+    if attr_type is NestedFlakeDescriptor:
+        return TAG_NESTED, encode_flake(attr.nested_descriptor)
+    raise TypeError('Cannot encode attribute descriptor %r' % (attr,))
+
+
+def encode_flake(descriptor: FlakeDescriptor) -> Tuple:
+    return (descriptor.id, descriptor.proto_name,
+            tuple((key, encode_attr(attr)) for key, attr in descriptor.attrs.items()))
+
+
+def compile_bundle(file_paths: List[str], bundle_path: str, parser_factory=ParserFactory, **discoverer_kwargs) -> int:
+    """Parses the flake files and writes their definitions to a bundle.
+    As with DiscoveryService.from_files, the last file defining an id wins.
+    :param discoverer_kwargs: given to the FileDiscoverer, to parse in parallel or use a descriptor cache
+    :return: how many root flakes the bundle holds
+    """
+    discoverer = FileDiscoverer(parser_factory, file_paths, **discoverer_kwargs)
+    definitions: Dict[Any, FlakeDescriptor] = {}
+    for descriptor in discoverer.discover():
+        definitions[descriptor.id] = descriptor
+    default_interner.clear()
+    temp_path = '%s.%d.tmp' % (bundle_path, os.getpid())
+    with open(temp_path, 'wb') as bundle:
+        bundle.write(encode_bundle(definitions))
+    os.replace(temp_path, bundle_path)
+    return len(definitions)
+
+
+def encode_bundle(definitions: MappingType[Any, FlakeDescriptor]) -> bytes:
+    """The content of a bundle holding these root flake definitions, in the mapping's order"""
+    sources = {}
+    records = []
+    owners = {}
+    for descriptor in definitions.values():
+        source_path = getattr(descriptor.source, 'full_path', None)
+        source_index = sources.setdefault(source_path, len(sources))
+        records.append(marshal.dumps((source_index,) + encode_flake(descriptor)))
+        for nested in iter_nested(descriptor):
+            owners[nested.id] = len(records) - 1
+    table = marshal.dumps((tuple(sources), tuple(definitions)))
+
+    slot_count = 1
+    while slot_count < 2 * (len(records) + len(owners)):
+        slot_count *= 2
+    offsets = []
+    offset = BUNDLE_HEADER.size
+    for record in records:
+        offsets.append(offset)
+        offset += len(record)
+    table_offset = offset
+    index_offset = table_offset + len(table)
+    slots: List[Optional[Tuple[int, int, int, int]]] = [None] * slot_count
+    entries = [(flake_id, SLOT_ROOT, index) for index, flake_id in enumerate(definitions)]
+    entries.extend((flake_id, SLOT_NESTED, index) for flake_id, index in owners.items() if flake_id not in definitions)
+    for flake_id, kind, index in entries:
+        flake_hash = hash_id(flake_id)
+        slot = flake_hash & (slot_count - 1)
+        while slots[slot] is not None:
+            slot = (slot + 1) & (slot_count - 1)
+        slots[slot] = (flake_hash, kind, offsets[index], len(records[index]))
+
+    header = BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, marshal.version, len(records), slot_count,
+                                table_offset, len(table), index_offset)
+    empty = BUNDLE_SLOT.pack(0, SLOT_EMPTY, 0, 0)
+    index = b''.join(empty if slot is None else BUNDLE_SLOT.pack(*slot) for slot in slots)
+    return b''.join([header, *records, table, index])
+
+
+class DefinitionBundle(Mapping):
+    """Read only mapping of root flake id to FlakeDescriptor, over a memory mapped bundle.
+    Descriptors are decoded on first access then kept, checking whether an id is in the bundle decodes it,
+    since it is usually fetched right after. Iterating only loads the list of ids.
+    Bundles are opened from a file, or from bytes copied to anonymous shared memory which forked processes
+    inherit without copying it.
+    """
+
+    def __init__(self, buffer: mmap.mmap, path: str, interner: DescriptorInterner = None):
+        """:param path: where the content comes from, only used in error messages
+        :param interner: shares the descriptors decoded, the bundle's own one by default, which lives as long as it
+        """
+        self.buffer = buffer
+        self.path = path
+        self.interner = DescriptorInterner() if interner is None else interner
+        if len(self.buffer) < BUNDLE_HEADER.size:
+            raise InvalidBundle(path, 'truncated header')
+        magic, version, marshal_version, self.root_count, self.slot_count, self.table_offset, self.table_size, \
+            self.index_offset = BUNDLE_HEADER.unpack_from(self.buffer)
+        if magic != BUNDLE_MAGIC:
+            raise InvalidBundle(path, 'not a definition bundle')
+        if version != BUNDLE_VERSION or marshal_version != marshal.version:
+            raise InvalidBundle(path, 'compiled by another version, it must be compiled again')
+        if len(self.buffer) != self.index_offset + self.slot_count * BUNDLE_SLOT.size:
+            raise InvalidBundle(path, 'truncated index')
+        self.decoded: Dict[Any, FlakeDescriptor] = {}
+        self.table: Optional[Tuple[Tuple[str, ...], Tuple[Any, ...]]] = None
+        # source index -> descriptor, shared by every flake coming from that file
+        self.sources: Dict[int, Optional[FileSourceDescriptor]] = {}
+        # (python type, value) -> primitive descriptor from the interner
+        self.primitives: Dict[Tuple[type, Any], PrimitiveAttributeDescriptor] = {}
+
+    @classmethod
+    def open(cls, path: str, interner: DescriptorInterner = None) -> 'DefinitionBundle':
+        with open(path, 'rb') as bundle:
+            try:
+                buffer = mmap.mmap(bundle.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise InvalidBundle(path, 'empty file')
+        return cls(buffer, path, interner)
+
+    @classmethod
+    def from_bytes(cls, content: bytes, interner: DescriptorInterner = None) -> 'DefinitionBundle':
+        buffer = mmap.mmap(-1, len(content))
+        buffer.write(content)
+        return cls(buffer, '<memory>', interner)
+
+    def close(self):
+        self.buffer.close()
+
+    def iter_slots(self, flake_id) -> Iterator[Tuple[int, int, int]]:
+        """(kind, record offset, record size) of the slots which may hold flake_id.
+        Slots only store a hash, callers must check the id of the record they decode.
+        """
+        flake_hash = hash_id(flake_id)
+        mask = self.slot_count - 1
+        slot = flake_hash & mask
+        for _ in range(self.slot_count):
+            slot_hash, kind, offset, size = BUNDLE_SLOT.unpack_from(
+                self.buffer, self.index_offset + slot * BUNDLE_SLOT.size)
+            if kind == SLOT_EMPTY:
+                return
+            if slot_hash == flake_hash:
+                yield kind, offset, size
+            slot = (slot + 1) & mask
+
+    def load_record(self, offset: int, size: int) -> Tuple:
+        return marshal.loads(self.buffer[offset:offset + size])
+
+    def get_table(self) -> Tuple[Tuple[str, ...], Tuple[Any, ...]]:
+        if self.table is None:
+            self.table = marshal.loads(self.buffer[self.table_offset:self.table_offset + self.table_size])
+        return self.table
+
+    def get_source(self, source_index: int) -> Optional[FileSourceDescriptor]:
+        if source_index not in self.sources:
+            source_path = self.get_table()[0][source_index]
+            self.sources[source_index] = None if source_path is None else FileSourceDescriptor(source_path)
+        return self.sources[source_index]
+
+    def find_root(self, flake_id) -> Optional[Tuple]:
+        for kind, offset, size in self.iter_slots(flake_id):
+            if kind == SLOT_ROOT:
+                record = self.load_record(offset, size)
+                if record[1] == flake_id:
+                    return record
+        return None
+
+    def get_owner_id(self, flake_id) -> Optional[Any]:
+        """Id of the root flake a nested flake is defined in, None when the bundle has no such nested flake"""
+        for kind, offset, size in self.iter_slots(flake_id):
+            if kind == SLOT_NESTED:
+                record = self.load_record(offset, size)
+                descriptor = self.decode_record(record)
+                if any(nested.id == flake_id for nested in iter_nested(descriptor)):
+                    return descriptor.id
+        return None
+
+    def decode_record(self, record: Tuple) -> FlakeDescriptor:
+        flake_id = record[1]
+        descriptor = self.decoded.get(flake_id)
+        if descriptor is None:
+            source_index, _, proto_name, attrs = record
+            descriptor = self.decode_flake(flake_id, proto_name, attrs, self.get_source(source_index))
+            descriptor = self.decoded.setdefault(flake_id, descriptor)
+        return descriptor
+
+    def decode_flake(self, flake_id, proto_name: str, attrs: Tuple, source) -> FlakeDescriptor:
+        return FlakeDescriptor(proto_name, flake_id, self.decode_attrs(attrs, source), source)
+
+    def decode_attrs(self, attrs: Tuple, source) -> Dict[str, Any]:
+        decoded = {}
+        primitive = self.decode_primitive
+        for key, value in attrs:
+            if type(value) is tuple:
+                decoded[key] = self.decode_attr(value, source)
+            elif key == 'id':
+                # ids are unique, they are not interned
+                decoded[key] = PrimitiveAttributeDescriptor(type(value).__name__, value)
+            else:
+                decoded[key] = primitive(value)
+        return decoded
+
+    def decode_primitive(self, value) -> PrimitiveAttributeDescriptor:
+        """Goes through the interner once per distinct value, then through a cache keyed by the raw value"""
+        value_type = type(value)
+        descriptor = self.primitives.get((value_type, value))
+        if descriptor is None:
+            descriptor = self.interner.primitive(value_type.__name__, value)
+            if value_type is not float or (value and value == value):
+                # 0.0, -0.0 and nan are not interned, see DescriptorInterner.primitive
+                self.primitives[value_type, value] = descriptor
+        return descriptor
+
+    def decode_attr(self, value, source):
+        if type(value) is not tuple:
+            return self.decode_primitive(value)
+        tag = value[0]
+        if tag == TAG_REF:
+            return self.interner.reference(value[1])
+        if tag == TAG_LIST:
+            return ListAttributeDescriptor([self.decode_attr(item, source) for item in value[1]])
+        if tag == TAG_NESTED:
+            nested_id, proto_name, attrs = value[1]
+            return NestedFlakeDescriptor(self.decode_flake(nested_id, proto_name, attrs, source))
+        return self.interner.primitive(value[1], value[2])
+
+    def __getitem__(self, flake_id) -> FlakeDescriptor:
+        descriptor = self.decoded.get(flake_id)
+        if descriptor is not None:
+            return descriptor
+        record = self.find_root(flake_id)
+        if record is None:
+            raise KeyError(flake_id)
+        return self.decode_record(record)
+
+    def __contains__(self, flake_id) -> bool:
+        # whoever checks an id is about to get it, the record is decoded right away
+        try:
+            self[flake_id]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self) -> Iterator:
+        return iter(self.get_table()[1])
+
+    def __len__(self) -> int:
+        return self.root_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compiles flake files into a definition bundle')
+    parser.add_argument('bundle_path')
+    parser.add_argument('file_paths', nargs='+')
+    args = parser.parse_args()
+    count = compile_bundle(args.file_paths, args.bundle_path)
+    print('%d flakes written to %s' % (count, args.bundle_path))
+
+
+if __name__ == '__main__':
+    main()
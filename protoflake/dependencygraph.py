@@ -0,0 +1,235 @@
+"""
+The dependency graph links root flake definitions to the root flakes they reference, and back.
+References found anywhere inside a definition count, including inside lists and nested flakes.
+A reference to a nested flake is a dependency on the root flake owning it, since that is the one building it.
+It is used to build flakes in an order where every reference is already available, and to detect cycles.
+"""
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Set
+
+from protoflake.attributedescriptor import AttributeDescriptor
+from protoflake.descriptors import ListAttributeDescriptor
+from protoflake.descriptors import NestedFlakeDescriptor
+from protoflake.descriptors import ReferenceAttributeDescriptor
+from protoflake.flakedescriptor import FlakeDescriptor
+
+
+class DependencyCycle(Exception):
+    def __init__(self, cycle: List[str], *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cycle = cycle
+        self.msg = 'Flakes are referencing each other in a cycle: %s' % ' -> '.join(cycle)
+
+
+class UndefinedFlake(KeyError):
+    def __init__(self, flake_id: str, referrer_id: Optional[str] = None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.flake_id = flake_id
+        # root flake referencing the undefined one, None when it was requested directly
+        self.referrer_id = referrer_id
+        if referrer_id is None:
+            self.msg = 'No flake is defined with id %s' % flake_id
+        else:
+            self.msg = 'Flake %s references %s, which is not defined' % (referrer_id, flake_id)
+
+
+def iter_attr_references(attr: AttributeDescriptor) -> Iterator[str]:
+    if isinstance(attr, ReferenceAttributeDescriptor):
+        yield attr.reference_flake_id
+    elif isinstance(attr, ListAttributeDescriptor):
+        for item in attr.value:
+            yield from iter_attr_references(item)
+    elif isinstance(attr, NestedFlakeDescriptor):
+        yield from iter_references(attr.nested_descriptor)
+
+
+def iter_references(descriptor: FlakeDescriptor) -> Iterator[str]:
+    """Yields the ids referenced by this descriptor and by all the flakes nested in it"""
+    for attr in descriptor.attrs.values():
+        yield from iter_attr_references(attr)
+
+
+def iter_attr_nested(attr: AttributeDescriptor) -> Iterator[FlakeDescriptor]:
+    if isinstance(attr, NestedFlakeDescriptor):
+        yield attr.nested_descriptor
+        yield from iter_nested(attr.nested_descriptor)
+    elif isinstance(attr, ListAttributeDescriptor):
+        for item in attr.value:
+            yield from iter_attr_nested(item)
+
+
+def iter_nested(descriptor: FlakeDescriptor) -> Iterator[FlakeDescriptor]:
+    """Yields every flake descriptor nested in this one, at any depth"""
+    for attr in descriptor.attrs.values():
+        yield from iter_attr_nested(attr)
+
+
+def collect_links(attrs: Iterable[AttributeDescriptor], references: Dict[str, None], nested_ids: List[str]):
+    """Single pass equivalent of iter_references and iter_nested, used when indexing large definition sets"""
+    for attr in attrs:
+        attr_type = type(attr)
+        if attr_type is ReferenceAttributeDescriptor:
+            references[attr.reference_flake_id] = None
+        elif attr_type is NestedFlakeDescriptor:
+            nested = attr.nested_descriptor
+            nested_ids.append(nested.id)
+            collect_links(nested.attrs.values(), references, nested_ids)
+        elif attr_type is ListAttributeDescriptor:
+            collect_links(attr.value, references, nested_ids)
+
+
+class DependencyGraph(object):
+    """Forward and reverse indexes over the references between flake definitions, kept up to date as
+    definitions are added or removed instead of being rebuilt.
+    References are stored as written and resolved to root flakes when queried, so a reference to a flake
+    which is only defined later starts counting as soon as that flake is added.
+    """
+
+    def __init__(self, definitions: Dict[str, FlakeDescriptor] = None):
+        # root id -> ids referenced anywhere in its definition, in order (dict used as an ordered set)
+        self.references: Dict[str, Dict[str, None]] = {}
+        # referenced id -> root ids referencing it
+        self.referrers: Dict[str, Set[str]] = {}
+        # root id -> ids of the flakes nested in it
+        self.nested: Dict[str, List[str]] = {}
+        # nested id -> root id
+        self.owners: Dict[str, str] = {}
+        if definitions is not None:
+            for descriptor in definitions.values():
+                self.add(descriptor)
+
+    def add(self, descriptor: FlakeDescriptor):
+        """Indexes a root definition, replacing the previous definition with that id if any"""
+        flake_id = descriptor.id
+        if flake_id in self.references:
+            self.remove(flake_id)
+        references = {}
+        nested_ids = []
+        collect_links(descriptor.attrs.values(), references, nested_ids)
+        self.references[flake_id] = references
+        for reference in references:
+            self.referrers.setdefault(reference, set()).add(flake_id)
+        self.nested[flake_id] = nested_ids
+        for nested_id in nested_ids:
+            self.owners[nested_id] = flake_id
+
+    def remove(self, flake_id: str):
+        """Forgets a root definition. References to it from other flakes are kept, unresolved until it comes back"""
+        references = self.references.pop(flake_id, None)
+        if references is None:
+            return
+        for reference in references:
+            referrers = self.referrers.get(reference)
+            if referrers is not None:
+                referrers.discard(flake_id)
+                if not referrers:
+                    del self.referrers[reference]
+        for nested_id in self.nested.pop(flake_id):
+            if self.owners.get(nested_id) == flake_id:
+                del self.owners[nested_id]
+
+    def __contains__(self, flake_id: str) -> bool:
+        return flake_id in self.references
+
+    def resolve(self, reference: str) -> Optional[str]:
+        """Root flake id building the referenced flake, None for unknown ids"""
+        return reference if reference in self.references else self.owners.get(reference)
+
+    def get_dependencies(self, flake_id: str) -> List[str]:
+        """Root flakes referenced by this root flake, unknown ids are ignored.
+        References between flakes nested in this one are built along with it, they are not dependencies.
+        """
+        resolved = []
+        for reference in self.references[flake_id]:
+            owner = self.resolve(reference)
+            if owner == flake_id and reference != flake_id:
+                continue
+            if owner is not None and owner not in resolved:
+                resolved.append(owner)
+        return resolved
+
+    def get_dependents(self, flake_id: str) -> Set[str]:
+        """Root flakes referencing this root flake or one of the flakes nested in it"""
+        dependents = set(self.referrers.get(flake_id, ()))
+        for nested_id in self.nested.get(flake_id, ()):
+            dependents.update(self.referrers.get(nested_id, ()))
+        return dependents
+
+    def get_dependencies_closure(self, flake_ids: Iterable[str]) -> Set[str]:
+        """Returns the given root flake ids along with every root flake they reference, directly or not"""
+        return self.get_closure(flake_ids, self.get_dependencies)
+
+    def get_dependents_closure(self, flake_ids: Iterable[str]) -> Set[str]:
+        """Returns the given root flake ids along with every root flake referencing them, directly or not"""
+        return self.get_closure(flake_ids, self.get_dependents)
+
+    @staticmethod
+    def get_closure(flake_ids: Iterable[str], get_neighbours) -> Set[str]:
+        closure = set(flake_ids)
+        pending = list(closure)
+        while pending:
+            for neighbour in get_neighbours(pending.pop()):
+                if neighbour not in closure:
+                    closure.add(neighbour)
+                    pending.append(neighbour)
+        return closure
+
+    def get_build_dependencies(self, flake_id: str, allow_undefined: bool) -> List[str]:
+        """get_dependencies, raising on references to undefined flakes unless they are allowed
+        :raises UndefinedFlake: naming the reference and flake_id as its referrer
+        """
+        if not allow_undefined:
+            for reference in self.references[flake_id]:
+                if self.resolve(reference) is None:
+                    raise UndefinedFlake(reference, flake_id)
+        return self.get_dependencies(flake_id)
+
+    def build_order(self, flake_ids: Iterable[str] = None, allow_cycles: bool = False,
+                    allow_undefined: bool = False) -> List[str]:
+        """Returns the given root flake ids (all of them by default) along with their dependencies,
+        sorted so that every flake comes after the ones it references.
+        :param allow_cycles: break cycles at the reference closing them instead of raising, meant for lazy
+        containers, where flakes referencing each other are allowed
+        :param allow_undefined: ignore references to undefined flakes instead of raising, for flakes which were
+        already built, lazy ones only failing once such a reference is used
+        :raises DependencyCycle: if flakes reference each other in a cycle
+        :raises UndefinedFlake: if a given id, or a reference of the flakes to order, is not defined
+        """
+        if flake_ids is None:
+            flake_ids = list(self.references)
+        order = []
+        done = set()
+        for flake_id in flake_ids:
+            root_id = self.resolve(flake_id)
+            if root_id is None:
+                raise UndefinedFlake(flake_id)
+            if root_id not in done:
+                self.visit(root_id, order, done, allow_cycles, allow_undefined)
+        return order
+
+    def visit(self, start_id: str, order: List[str], done: set, allow_cycles: bool = False,
+              allow_undefined: bool = False):
+        """Iterative depth first search, so that long reference chains do not hit the recursion limit"""
+        path = [start_id]
+        on_path = {start_id}
+        stack = [iter(self.get_build_dependencies(start_id, allow_undefined))]
+        while stack:
+            dependency = next(stack[-1], None)
+            if dependency is None:
+                stack.pop()
+                flake_id = path.pop()
+                on_path.discard(flake_id)
+                done.add(flake_id)
+                order.append(flake_id)
+            elif dependency in on_path:
+                if allow_cycles:
+                    continue
+                raise DependencyCycle(path[path.index(dependency):] + [dependency])
+            elif dependency not in done:
+                path.append(dependency)
+                on_path.add(dependency)
+                stack.append(iter(self.get_build_dependencies(dependency, allow_undefined)))
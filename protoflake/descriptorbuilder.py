@@ -1,5 +1,6 @@
 """
 Given a dict of python primitives, builds a FlakeDescriptor
+The builder keeps no state between calls, so a single one can be shared by every parser.
 """
 from typing import Any
 from typing import Tuple
@@ -10,53 +11,60 @@ from protoflake.attributedescriptor import AttributeDescriptor
 from protoflake.flakedescriptor import FlakeDescriptor
 from protoflake.descriptors import ListAttributeDescriptor
 from protoflake.descriptors import NestedFlakeDescriptor
-from protoflake.descriptors import PrimitiveAttributeDescriptor
-from protoflake.descriptors import ReferenceAttributeDescriptor
+from protoflake.descriptorinterner import DescriptorInterner
+from protoflake.descriptorinterner import default_interner
+from protoflake.parsererrors import MissingFlakeId
+from protoflake.parsererrors import MissingFlakeProto
+from protoflake.sourcedescriptor import SourceDescriptor
 
 
 class DescriptorBuilder(object):
 
-    def __init__(self):
-        self.source = None
+    def __init__(self, interner: DescriptorInterner = default_interner):
+        self.interner = interner
 
-    def set_source(self, source):
-        self.source = source
+    def build_flake_descriptor(self, data, source: SourceDescriptor = None):
+        return self.process_flake_node(data, source)
 
-    def build_flake_descriptor(self, data):
-        return self.process_flake_node(data)
+    def process_flake_node(self, node, source: SourceDescriptor = None) -> FlakeDescriptor:
+        attrs = cast(Any, dict(self.process_attr(key_value, source) for key_value in node.items()))
+        proto = attrs.get('proto')
+        flake_id = attrs.get('id')
+        if proto is None or not proto.value:
+            raise MissingFlakeProto(None if flake_id is None else flake_id.value, source)
+        proto_name = proto.value
+        if flake_id is None:
+            raise MissingFlakeId(proto_name, source)
+        return FlakeDescriptor(proto_name, flake_id.value, attrs, source)
 
-    def process_flake_node(self, node) -> FlakeDescriptor:
-        attrs = cast(Any, dict(list(map(self.process_attr, node.items()))))
-        return FlakeDescriptor(attrs.get('proto').value, attrs.get('id').value, attrs, self.source)
-
-    @staticmethod
-    def process_ref(value: Any) -> AttributeDescriptor:
+    def process_ref(self, value: Any) -> AttributeDescriptor:
         flake_id = value.get('id')
-        return ReferenceAttributeDescriptor(flake_id)
+        return self.interner.reference(flake_id)
 
-    def process_node(self, node, root=False) -> Union[FlakeDescriptor, AttributeDescriptor]:
+    def process_node(self, node, root=False, source: SourceDescriptor = None) \
+            -> Union[FlakeDescriptor, AttributeDescriptor]:
         if node.get('proto'):
             if root:
-                return self.process_flake_node(node)
+                return self.process_flake_node(node, source)
             else:
-                return NestedFlakeDescriptor(self.process_flake_node(node))
+                return NestedFlakeDescriptor(self.process_flake_node(node, source))
+        if root:
+            raise MissingFlakeProto(node.get('id'), source)
 
-    def process_attr(self, key_value: Any) -> Tuple[str, AttributeDescriptor]:
+    def process_attr(self, key_value: Any, source: SourceDescriptor = None) -> Tuple[str, AttributeDescriptor]:
         key, value = key_value
         if isinstance(value, dict):
             if value.get('is_flake_ref'):
                 return key, self.process_ref(value)
             else:
-                return key, self.process_node(value)
+                return key, self.process_node(value, source=source)
         elif isinstance(value, list):
-            return key, ListAttributeDescriptor(list(map(
-                lambda k_v: k_v[1],
-                map(lambda a: self.process_attr(('', a)), value))))
+            return key, ListAttributeDescriptor([self.process_attr(('', item), source)[1] for item in value])
         elif isinstance(value, bool):
-            return key, PrimitiveAttributeDescriptor('bool', value)
+            return self.interner.primitive_attr(key, 'bool', value)
         elif isinstance(value, int):
-            return key, PrimitiveAttributeDescriptor('int', value)
+            return self.interner.primitive_attr(key, 'int', value)
         elif isinstance(value, float):
-            return key, PrimitiveAttributeDescriptor('float', value)
+            return self.interner.primitive_attr(key, 'float', value)
         elif isinstance(value, str):
-            return key, PrimitiveAttributeDescriptor('str', value)
\ No newline at end of file
+            return self.interner.primitive_attr(key, 'str', value)
\ No newline at end of file
@@ -0,0 +1,96 @@
+"""
+On-disk cache of parsed FlakeDescriptors, one entry per source file.
+Each entry is stamped with the size, mtime and content hash of the file it was parsed from,
+followed by the pickled descriptors. When the stamp still matches the file, loading the entry
+replaces running the parser altogether.
+"""
+import hashlib
+import os
+import pickle
+import struct
+from dataclasses import dataclass
+from typing import List
+from typing import Optional
+
+from protoflake.fingerprint import FileFingerprint
+from protoflake.flakedescriptor import FlakeDescriptor
+
+
+CACHE_MAGIC = b'PFDC'
+# bump whenever the pickled descriptor classes change shape
+CACHE_VERSION = 5
+CACHE_EXTENSION = '.pfc'
+# magic, version, source mtime (ns), source size, sha1 of the source content
+CACHE_HEADER = struct.Struct('<4sHqq20s')
+
+
+@dataclass
+class CacheStats(object):
+    """Counters describing how useful the cache has been so far"""
+    hits: int = 0
+    misses: int = 0
+    writes: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class DescriptorCache(object):
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.stats = CacheStats()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_entry_path(self, file_path: str) -> str:
+        key = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key + CACHE_EXTENSION)
+
+    def get(self, file_path: str) -> Optional[List[FlakeDescriptor]]:
+        """Returns the cached descriptors of file_path, or None when there is no up to date entry for it"""
+        descriptors = self.load(file_path)
+        if descriptors is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return descriptors
+
+    def set(self, file_path: str, descriptors: List[FlakeDescriptor], fingerprint: FileFingerprint = None):
+        """Stores the descriptors parsed from file_path
+        :param fingerprint: the file's, taken before it was parsed so that an edit made while parsing is not
+        stamped as if it had been parsed. Defaults to the file's current state.
+        """
+        if fingerprint is None:
+            fingerprint = FileFingerprint.of(file_path)
+        header = CACHE_HEADER.pack(
+            CACHE_MAGIC, CACHE_VERSION, fingerprint.mtime_ns, fingerprint.size, fingerprint.digest)
+        entry_path = self.get_entry_path(file_path)
+        temp_path = '%s.%d.tmp' % (entry_path, os.getpid())
+        with open(temp_path, 'wb') as entry:
+            entry.write(header)
+            pickle.dump(descriptors, entry, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, entry_path)
+        self.stats.writes += 1
+
+    def load(self, file_path: str) -> Optional[List[FlakeDescriptor]]:
+        """Reads the entry for file_path if its stamp still matches the file, see FileFingerprint.matches"""
+        try:
+            with open(self.get_entry_path(file_path), 'rb') as entry:
+                header = entry.read(CACHE_HEADER.size)
+                if len(header) != CACHE_HEADER.size:
+                    return None
+                magic, version, mtime_ns, size, digest = CACHE_HEADER.unpack(header)
+                if magic != CACHE_MAGIC or version != CACHE_VERSION:
+                    return None
+                if not FileFingerprint(file_path, mtime_ns, size, digest).matches():
+                    return None
+                return pickle.load(entry)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def clear(self):
+        for entry_name in os.listdir(self.cache_dir):
+            if entry_name.endswith(CACHE_EXTENSION):
+                os.remove(os.path.join(self.cache_dir, entry_name))
@@ -0,0 +1,52 @@
+"""
+The descriptor interner shares equal primitive and reference descriptors, which are immutable.
+Large definition sets repeat the same values over and over (booleans, small ints, enum-like strings,
+references to the same service), sharing them keeps a single descriptor alive for each distinct value.
+Flake ids are unique by construction, parsers do not intern them.
+Parsers share the default interner, which the DiscoveryService clears once each discovery is done: values are
+shared within the files discovered together, the interner does not keep them alive afterwards.
+"""
+from typing import Tuple
+
+from protoflake.descriptors import PrimitiveAttributeDescriptor
+from protoflake.descriptors import ReferenceAttributeDescriptor
+
+
+class DescriptorInterner(object):
+
+    def __init__(self):
+        self.primitives = {}
+        self.references = {}
+
+    def primitive(self, type_name: str, value) -> PrimitiveAttributeDescriptor:
+        if type_name == 'float' and (value == 0 or value != value):
+            # 0.0 and -0.0 are equal but not the same value, nan is not even equal to itself
+            return PrimitiveAttributeDescriptor(type_name, value)
+        key = (type_name, value)
+        descriptor = self.primitives.get(key)
+        if descriptor is None:
+            descriptor = self.primitives.setdefault(key, PrimitiveAttributeDescriptor(type_name, value))
+        return descriptor
+
+    def primitive_attr(self, key: str, type_name: str, value) -> Tuple[str, PrimitiveAttributeDescriptor]:
+        """Same as primitive, for the (name, descriptor) pairs produced by parsers, except ids are never interned"""
+        if key == 'id':
+            return key, PrimitiveAttributeDescriptor(type_name, value)
+        return key, self.primitive(type_name, value)
+
+    def reference(self, flake_id: str) -> ReferenceAttributeDescriptor:
+        descriptor = self.references.get(flake_id)
+        if descriptor is None:
+            descriptor = self.references.setdefault(flake_id, ReferenceAttributeDescriptor(flake_id))
+        return descriptor
+
+    def clear(self):
+        """Forgets every interned descriptor, the ones already handed out stay valid"""
+        self.primitives.clear()
+        self.references.clear()
+
+    def __len__(self):
+        return len(self.primitives) + len(self.references)
+
+
+default_interner = DescriptorInterner()
@@ -5,6 +5,9 @@ proto are classes / blueprints
 flakes are instances / data holder
 
 descriptors hold the data used to create a flake
+
+Attribute descriptors are slotted, primitive and reference ones are also frozen so that equal ones
+can be shared, see the DescriptorInterner.
 """
 from typing import List
 from typing import Any
@@ -44,9 +47,10 @@ class CodeSourceDescriptor(SourceDescriptor):
     hint: str
 
 
-@dataclass
+@dataclass(frozen=True)
 class PrimitiveAttributeDescriptor(AttributeDescriptor):
     """An attribute which is of primitive type, such as string, int, float, etc..."""
+    __slots__ = ('type', '_value')
 
     def get_primitive_value(self, flake_provider: FlakeProvider):
         return self.value
@@ -58,20 +62,29 @@ class PrimitiveAttributeDescriptor(AttributeDescriptor):
     def value(self):
         return self._value
 
+    def __reduce__(self):
+        # frozen slotted dataclasses cannot be restored through setattr
+        return self.__class__, (self.type, self._value)
 
-@dataclass
+
+@dataclass(frozen=True)
 class ReferenceAttributeDescriptor(AttributeDescriptor):
     """An attribute which is a reference to another flake."""
+    __slots__ = ('reference_flake_id',)
 
     def get_primitive_value(self, flake_provider: FlakeProvider):
         return flake_provider.get_ref(self.reference_flake_id)
 
     reference_flake_id: str
 
+    def __reduce__(self):
+        return self.__class__, (self.reference_flake_id,)
+
 
 @dataclass
 class ListAttributeDescriptor(AttributeDescriptor):
     """An attribute that holds a list of other attributes"""
+    __slots__ = ('value',)
 
     def get_primitive_value(self, flake_provider: FlakeProvider):
         return list(map(lambda descriptor: descriptor.get_primitive_value(flake_provider), self.value))
@@ -82,6 +95,7 @@ class ListAttributeDescriptor(AttributeDescriptor):
 @dataclass
 class NestedFlakeDescriptor(AttributeDescriptor):
     """An attribute which states we should create a new flake and use it as a reference in this object"""
+    __slots__ = ('nested_descriptor',)
 
     def get_primitive_value(self, flake_provider: FlakeProvider):
         return flake_provider.get_new(self.nested_descriptor)
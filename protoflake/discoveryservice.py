@@ -1,28 +1,146 @@
 """
 Service responsible for gathering and storing FlakeDescriptors
+It remembers which file each definition came from, along with a fingerprint of that file taken before parsing it,
+so that reload only parses again the files which changed since.
+Definitions can also come from definition bundles, which are read as definitions are requested rather than
+loaded up front. Bundles are not reloaded, they must be compiled again and discovered by a new service.
 """
+import os
+from collections import ChainMap
+from dataclasses import dataclass
+from typing import Any
+from typing import Dict
+from typing import Iterable
 from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+from typing import Union
 
+from protoflake.bundlediscoverer import BundleDiscoverer
+from protoflake.compactdefinitions import CompactDefinitions
+from protoflake.compactdefinitions import PackedFlake
+from protoflake.dependencygraph import DependencyGraph
+from protoflake.definitionbundle import DefinitionBundle
+from protoflake.definitionbundle import encode_bundle
+from protoflake.dependencygraph import iter_nested
+from protoflake.descriptorcache import DescriptorCache
+from protoflake.descriptorinterner import default_interner
 from protoflake.filediscoverer import FileDiscoverer
+from protoflake.fingerprint import FileFingerprint
+from protoflake.fingerprint import get_fingerprint
+from protoflake.fingerprint import stat_stamp
+from protoflake.flakedescriptor import FlakeDescriptor
+from protoflake.instrumentation import Instrumentation
 from protoflake.listdiscoverer import ListDiscoverer
 from protoflake.parserfactory import ParserFactory
+from protoflake.parserfactory import StreamingParserFactory
+
+
+@dataclass
+class SourceFile(object):
+    """A file definitions were discovered from, as it was when it was last parsed.
+    descriptors are stored the same way as the service's definitions, packed ones in compact mode.
+    """
+    path: str
+    # taken before parsing, so that an edit made meanwhile does not match the definitions parsed.
+    # None when the file is gone
+    fingerprint: Optional[FileFingerprint]
+    descriptors: List[Union[FlakeDescriptor, PackedFlake]]
+    parser_factory: Any
+    # when the file was last discovered, relative to the other discoveries of the service
+    order: int = 0
+
+    @property
+    def stamp(self) -> Optional[Tuple[int, int]]:
+        return None if self.fingerprint is None else self.fingerprint.stamp
 
 
 class DiscoveryService(object):
 
     def __init__(self,
                  file_discoverer_class: FileDiscoverer,
-                 list_discoverer_class: ListDiscoverer):
+                 list_discoverer_class: ListDiscoverer,
+                 descriptor_cache: DescriptorCache = None,
+                 compact: bool = False,
+                 bundle_discoverer_class=BundleDiscoverer):
+        """
+        :param compact: store definitions packed, see CompactDefinitions. Saves a lot of memory on large
+        definition sets, at the cost of unpacking a new descriptor each time a definition is read.
+        """
         self.file_discoverer_class = file_discoverer_class
         self.list_discoverer_class = list_discoverer_class
-        self.flake_definitions = {}
+        self.bundle_discoverer_class = bundle_discoverer_class
+        self.descriptor_cache = descriptor_cache
+        self.compact = compact
+        self.flake_definitions = CompactDefinitions() if compact else {}
+        # most recently discovered last
+        self.bundles: List[DefinitionBundle] = []
+        # the definitions of the bundles under the other ones, once there are bundles
+        self.all_definitions: Optional[ChainMap] = None
+        self.dependency_graph = None
+        # graph of the definitions which are not bundled, only used to find owners once there are bundles
+        self.memory_graph: Optional[DependencyGraph] = None
+        self.instrumentation: Optional[Instrumentation] = None
+        # absolute path -> file, in discovery order
+        self.files = {}
+        # how many discoveries were made, gives their order
+        self.discoveries = 0
+        # flake id -> discovery order, of the definitions which did not come from a file, from_list ones
+        self.listed: Dict[str, int] = {}
+        # order of each bundle, in the same order as bundles
+        self.bundle_orders: List[int] = []
 
     def get_definition(self, flake_id):
         return self.definitions[flake_id]
 
     @property
-    def definitions(self):
-        return self.flake_definitions
+    def definitions(self) -> Dict[str, FlakeDescriptor]:
+        if self.all_definitions is None:
+            return self.flake_definitions
+        return self.all_definitions
+
+    @property
+    def source_files(self) -> List[str]:
+        """Every file discovered so far, in discovery order"""
+        return [source_file.path for source_file in self.files.values()]
+
+    @property
+    def source_fingerprints(self) -> List[FileFingerprint]:
+        """Fingerprints of the files discovered so far as they were parsed, in discovery order.
+        Files which were gone when parsed are left out.
+        """
+        return [source_file.fingerprint for source_file in self.files.values() if source_file.fingerprint is not None]
+
+    def get_proto_modules(self) -> List[str]:
+        """Distinct modules of the protos used by the definitions, nested flakes included, in discovery order"""
+        modules = {}
+        for descriptor in self.definitions.values():
+            modules[descriptor.proto_module] = None
+            for nested in iter_nested(descriptor):
+                modules[nested.proto_module] = None
+        return list(modules)
+
+    def get_owner_id(self, flake_id: str) -> Optional[str]:
+        """Id of the root flake a nested flake is defined in, None for unknown ids and root flakes.
+        Bundles index their nested flakes, other definitions need a dependency graph. Building the whole graph
+        decodes every bundled definition, so unless it was already built only the other definitions are indexed.
+        """
+        for bundle in reversed(self.bundles):
+            owner_id = bundle.get_owner_id(flake_id)
+            if owner_id is not None:
+                return owner_id
+        if self.bundles and self.dependency_graph is None:
+            if self.memory_graph is None:
+                self.memory_graph = DependencyGraph(self.flake_definitions)
+            return self.memory_graph.owners.get(flake_id)
+        return self.get_dependency_graph().owners.get(flake_id)
+
+    def get_dependency_graph(self) -> DependencyGraph:
+        """The graph is built on first use, then updated as definitions are added or removed"""
+        if self.dependency_graph is None:
+            self.dependency_graph = DependencyGraph(self.definitions)
+        return self.dependency_graph
 
     @staticmethod
     def get_discoverer(klass, *args, **kwargs):
@@ -35,23 +153,224 @@ class DiscoveryService(object):
         """
         return klass(*args, **kwargs)
 
+    def next_discovery(self) -> int:
+        self.discoveries += 1
+        return self.discoveries
+
     def discover(self, klass, *args, **kwargs):
         discoverer = self.get_discoverer(klass, *args, **kwargs)
-        flake_descriptors = discoverer.discover()
+        self.add_definitions(discoverer.discover(), self.next_discovery())
+        default_interner.clear()
+
+    def add_definitions(self, flake_descriptors: Iterable[FlakeDescriptor], listed_order: int = None):
+        """:param listed_order: order of the discovery when the definitions do not come from files, so that
+        reloading a file defining the same ids does not take them back
+        """
+        graph = self.dependency_graph
+        memory_graph = self.memory_graph
+        listed = self.listed
         for flake_descriptor in flake_descriptors:
-            self.definitions[flake_descriptor.id] = flake_descriptor
+            flake_id = flake_descriptor.id
+            self.definitions[flake_id] = flake_descriptor
+            if listed_order is not None:
+                listed[flake_id] = listed_order
+            elif listed:
+                listed.pop(flake_id, None)
+            if graph is not None:
+                graph.add(self.definitions[flake_id] if self.compact else flake_descriptor)
+            if memory_graph is not None:
+                memory_graph.add(self.definitions[flake_id] if self.compact else flake_descriptor)
 
-    def from_files(self, file_paths: List[str]):
+    def store(self, flake_descriptors: Iterable[FlakeDescriptor]) -> List[Union[FlakeDescriptor, PackedFlake]]:
+        """Turns descriptors into the form definitions are stored in, so that files can share them"""
+        if self.compact:
+            return [self.definitions.pack(descriptor) for descriptor in flake_descriptors]
+        return list(flake_descriptors)
+
+    def get_stored(self, flake_id: str) -> Union[FlakeDescriptor, PackedFlake, None]:
+        if self.compact:
+            return self.definitions.packed.get(flake_id)
+        return self.definitions.get(flake_id)
+
+    def remove_definition(self, flake_id: str):
+        del self.definitions[flake_id]
+        self.listed.pop(flake_id, None)
+        if self.dependency_graph is not None:
+            self.dependency_graph.remove(flake_id)
+        if self.memory_graph is not None:
+            self.memory_graph.remove(flake_id)
+
+    def from_files(self,
+                   file_paths: List[str],
+                   parallel: str = None,
+                   max_workers: int = None,
+                   streaming: bool = False):
         """
         Given a list of paths, load each one of them as a flake file.
         Path can be relative, but then resolves to the current working directory.
         Files MUST have an extension.
         Supported extensions are .json, .yml, .yaml, .xml
         Refer to the appropriate parser for the expected syntax
+        If a descriptor cache was given to this service, unchanged files are loaded from it instead of being parsed.
         :param file_paths: list of file paths to load (in the same order they are specified)
+        :param parallel: None to parse files one after the other, PARALLEL_THREADS or PARALLEL_PROCESSES to spread
+        them over a pool. Definitions are merged in file order whichever mode is used.
+        :param max_workers: size of the pool, defaults to the number of cpus
+        :param streaming: parse xml files incrementally, keeping memory flat for very large files
         :return: Nothing, but stores the discovered flake descriptors internally.
         """
-        self.discover(self.file_discoverer_class, ParserFactory, file_paths)
+        parser_factory = StreamingParserFactory if streaming else ParserFactory
+        # fingerprinted before parsing, so that files modified meanwhile are picked up by the next reload
+        fingerprints = [get_fingerprint(file_path) for file_path in file_paths]
+        discoverer = self.get_discoverer(
+            self.file_discoverer_class, parser_factory, file_paths, self.descriptor_cache, parallel, max_workers,
+            self.instrumentation)
+        per_file = discoverer.discover_files()
+        source_files = [
+            SourceFile(file_path, fingerprint, self.store(file_descriptors), parser_factory)
+            for fingerprint, (file_path, file_descriptors) in zip(fingerprints, per_file)
+        ]
+        # stored first, compact definitions tell interned descriptors apart
+        default_interner.clear()
+        for source_file in source_files:
+            self.track_file(source_file)
+        self.add_definitions(descriptor for source_file in source_files for descriptor in source_file.descriptors)
+
+    def track_file(self, source_file: SourceFile):
+        key = os.path.abspath(source_file.path)
+        # discovering a file again moves it last, its definitions now win over the other files'
+        self.files.pop(key, None)
+        self.files[key] = source_file
+        source_file.order = self.next_discovery()
+
+    def track_restored_files(self, fingerprints: Iterable[FileFingerprint], parser_factory=ParserFactory):
+        """Tracks files whose definitions were added without parsing them, grouping definitions by their source.
+        Each file is tracked as it was fingerprinted when its definitions were parsed.
+        """
+        per_path = {}
+        for flake_id in self.definitions:
+            descriptor = self.get_stored(flake_id)
+            full_path = getattr(descriptor.source, 'full_path', None)
+            if full_path is not None:
+                per_path.setdefault(os.path.abspath(full_path), []).append(descriptor)
+        for fingerprint in fingerprints:
+            descriptors = per_path.get(os.path.abspath(fingerprint.path), [])
+            self.track_file(SourceFile(fingerprint.path, fingerprint, descriptors, parser_factory))
+
+    def get_changed_files(self) -> List[SourceFile]:
+        """Files modified or deleted since they were last parsed, only relies on stat"""
+        return [source_file for source_file in self.files.values() if stat_stamp(source_file.path) != source_file.stamp]
+
+    def reload(self) -> Set[str]:
+        """Parses again the files which changed, and updates the definitions they hold.
+        Files which were deleted lose their definitions, unless another file also defines them.
+        Changed files keep their place in the discovery order, so the last file defining an id still wins,
+        and definitions discovered after it by from_list or from a bundle are kept.
+        :return: the ids of the flakes which should be built again: flakes whose definition changed,
+        flakes referencing them directly or not, and every flake nested in those
+        """
+        changed = self.get_changed_files()
+        if not changed:
+            return set()
+        # parse everything first, so that a parsing error leaves the definitions untouched
+        reparsed = []
+        for source_file in changed:
+            fingerprint = get_fingerprint(source_file.path)
+            descriptors = []
+            if fingerprint is not None:
+                discoverer = self.get_discoverer(
+                    self.file_discoverer_class, source_file.parser_factory, [source_file.path], self.descriptor_cache,
+                    instrumentation=self.instrumentation)
+                descriptors = self.store(discoverer.discover())
+            reparsed.append((source_file, fingerprint, descriptors))
+        default_interner.clear()
+
+        changed_ids = set()
+        previous_descriptors = set()
+        for source_file, fingerprint, descriptors in reparsed:
+            changed_ids.update(descriptor.id for descriptor in source_file.descriptors)
+            changed_ids.update(descriptor.id for descriptor in descriptors)
+            previous_descriptors.update(map(id, source_file.descriptors))
+        stale_ids = self.get_stale_ids(changed_ids)
+
+        for source_file, fingerprint, descriptors in reparsed:
+            if fingerprint is None:
+                del self.files[os.path.abspath(source_file.path)]
+            else:
+                source_file.fingerprint = fingerprint
+                source_file.descriptors = descriptors
+        winners = {}
+        for source_file in self.files.values():
+            for descriptor in source_file.descriptors:
+                if descriptor.id in changed_ids:
+                    winners[descriptor.id] = (source_file.order, descriptor)
+        for flake_id in changed_ids:
+            winner = winners.get(flake_id)
+            listed_order = self.get_listed_order(flake_id)
+            if listed_order is not None and (winner is None or listed_order > winner[0]):
+                # defined again after the files, by from_list or a bundle, which still wins
+                winners.pop(flake_id, None)
+            elif winner is not None:
+                self.add_definitions([winner[1]])
+            elif id(self.get_stored(flake_id)) in previous_descriptors:
+                self.remove_definition(flake_id)
+        graph = self.get_dependency_graph()
+        for flake_id in winners:
+            stale_ids.update(graph.nested[flake_id])
+        return stale_ids
+
+    def get_listed_order(self, flake_id: str) -> Optional[int]:
+        """Discovery order of the definition of flake_id, when it did not come from a file"""
+        listed_order = self.listed.get(flake_id)
+        if listed_order is not None:
+            return listed_order
+        if flake_id in self.flake_definitions:
+            return None
+        for bundle, order in zip(reversed(self.bundles), reversed(self.bundle_orders)):
+            if flake_id in bundle:
+                return order
+        return None
+
+    def get_stale_ids(self, changed_ids: Set[str]) -> Set[str]:
+        """Changed ids, the root flakes depending on them and the ids nested in those, per the current definitions"""
+        graph = self.get_dependency_graph()
+        stale_ids = graph.get_dependents_closure(changed_ids)
+        for flake_id in list(stale_ids):
+            stale_ids.update(graph.nested.get(flake_id, ()))
+        return stale_ids
+
+    def from_bundle(self, bundle_path: str):
+        """Adds the definitions of a bundle compiled by compile_bundle, without reading them.
+        They are decoded one at a time, the first time each one is requested.
+        Like any discovery, the bundle's definitions win over the ones discovered before it.
+        """
+        discoverer = self.get_discoverer(self.bundle_discoverer_class, bundle_path)
+        self.add_bundle(discoverer.open())
+
+    def add_bundle(self, bundle: DefinitionBundle):
+        for flake_id in [flake_id for flake_id in self.flake_definitions if flake_id in bundle]:
+            self.remove_definition(flake_id)
+        self.bundles.append(bundle)
+        self.bundle_orders.append(self.next_discovery())
+        self.all_definitions = ChainMap(self.flake_definitions, *reversed(self.bundles))
+        # indexing the bundle means decoding all of it, the graph is built again when needed instead
+        self.dependency_graph = None
+
+    def freeze(self):
+        """Moves every definition to a bundle in anonymous shared memory, see DefinitionBundle.from_bytes.
+        Processes forked afterwards share it instead of each one holding (and touching) its own copy of the
+        descriptors. The files discovered so far are forgotten, reload does nothing on a frozen service.
+        """
+        bundle = DefinitionBundle.from_bytes(encode_bundle(self.definitions))
+        for previous in self.bundles:
+            previous.close()
+        self.flake_definitions = CompactDefinitions() if self.compact else {}
+        self.memory_graph = None
+        self.bundles = []
+        self.bundle_orders = []
+        self.files = {}
+        self.listed = {}
+        self.add_bundle(bundle)
 
     def from_list(self, definitions):
         """
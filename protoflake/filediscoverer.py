@@ -1,28 +1,174 @@
 """
 Implements the FlakeDiscoverer by parsing xml, json or yaml files.
 Infer the right parser to use based on file extension and an injected factory.
+When given a DescriptorCache, files which did not change since they were cached are not parsed again.
+Files can optionally be parsed across a thread or process pool, results are always merged back in
+the order the files were given, so the last definition of a flake id still wins.
+When given an Instrumentation, every file is reported along with its descriptor count and how long it took.
 """
+import os
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from time import perf_counter
 from typing import List
+from typing import Optional
+from typing import Tuple
 
+from protoflake.constants import PARALLEL_PROCESSES
+from protoflake.constants import PARALLEL_THREADS
+from protoflake.descriptorcache import DescriptorCache
 from protoflake.descriptors import FileSourceDescriptor
 from protoflake.flakedescriptor import FlakeDescriptor
 from protoflake.flakediscoverer import FlakeDiscoverer
+from protoflake.fingerprint import FileFingerprint
+from protoflake.instrumentation import Instrumentation
 from protoflake.parsers import FlakeParser
 
 
+class UnknownParallelMode(ValueError):
+    def __init__(self, parallel, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.msg = 'Unknown parallel mode %s, expected %s or %s' % (parallel, PARALLEL_THREADS, PARALLEL_PROCESSES)
+
+
+def parse_file(parser_factory, file_path: str) -> List[FlakeDescriptor]:
+    """Parses a single file, without going through any cache.
+    Module level so that it can be shipped to a process pool.
+    """
+    source = FileSourceDescriptor(file_path)
+    parser: FlakeParser = parser_factory.get_parser(source)
+    return parser.from_file(file_path)
+
+
+def parse_file_timed(parser_factory, file_path: str) -> Tuple[List[FlakeDescriptor], float]:
+    """parse_file, also returning how long it took, so that workers of a pool can time their own files"""
+    started = perf_counter()
+    flake_descriptors = parse_file(parser_factory, file_path)
+    return flake_descriptors, perf_counter() - started
+
+
 class FileDiscoverer(FlakeDiscoverer):
 
-    def __init__(self, parser_factory, file_paths):
+    def __init__(self,
+                 parser_factory,
+                 file_paths,
+                 descriptor_cache: DescriptorCache = None,
+                 parallel: str = None,
+                 max_workers: int = None,
+                 instrumentation: Instrumentation = None):
         self.file_paths = file_paths
         self.parser_factory = parser_factory
+        self.descriptor_cache = descriptor_cache
+        self.parallel = parallel
+        self.max_workers = max_workers
+        self.instrumentation = instrumentation
+        if parallel is not None and parallel not in (PARALLEL_THREADS, PARALLEL_PROCESSES):
+            raise UnknownParallelMode(parallel)
 
     def discover(self) -> List[FlakeDescriptor]:
         flake_descriptors = []
-        for file_path in self.file_paths:
-            flake_descriptors.extend(self.parse_file(file_path))
+        for _, file_descriptors in self.discover_files():
+            flake_descriptors.extend(file_descriptors)
         return flake_descriptors
 
+    def discover_files(self) -> List[Tuple[str, List[FlakeDescriptor]]]:
+        """Same as discover, but keeps the descriptors of each file apart: (file path, descriptors) in file order"""
+        if self.parallel is None:
+            per_file = map(self.parse_file, self.file_paths)
+        else:
+            per_file = self.parse_files_in_parallel()
+        return list(zip(self.file_paths, per_file))
+
     def parse_file(self, file_path: str) -> List[FlakeDescriptor]:
-        source = FileSourceDescriptor(file_path)
-        parser: FlakeParser = self.parser_factory.get_parser(source)
-        return parser.from_file(file_path)
+        instrumentation = self.instrumentation
+        if instrumentation is not None:
+            instrumentation.parse_started(file_path)
+            started = perf_counter()
+        flake_descriptors = self.load_cached(file_path)
+        cached = flake_descriptors is not None
+        if not cached:
+            fingerprint = self.get_fingerprint(file_path)
+            flake_descriptors = parse_file(self.parser_factory, file_path)
+            self.store_cached(file_path, flake_descriptors, fingerprint)
+        if instrumentation is not None:
+            instrumentation.parse_finished(file_path, len(flake_descriptors), perf_counter() - started, cached)
+        return flake_descriptors
+
+    def parse_files_in_parallel(self) -> List[List[FlakeDescriptor]]:
+        """Parses every file which is not cached on a pool, while cache lookups and writes stay in the
+        calling thread. Returns the descriptors of each file, in the same order as file_paths.
+        """
+        per_file = [self.load_cached(file_path) for file_path in self.file_paths]
+        missing = [index for index, file_descriptors in enumerate(per_file) if file_descriptors is None]
+        missing_paths = [self.file_paths[index] for index in missing]
+        fingerprints = [self.get_fingerprint(file_path) for file_path in missing_paths]
+        parse = parse_file if self.instrumentation is None else parse_file_timed
+        if len(missing) < 2:
+            parsed = [parse(self.parser_factory, file_path) for file_path in missing_paths]
+        else:
+            workers = self.get_worker_count(len(missing))
+            with self.get_executor(workers) as executor:
+                parsed = list(executor.map(parse, repeat(self.parser_factory), missing_paths,
+                                           chunksize=self.get_chunksize(len(missing), workers)))
+        if self.instrumentation is not None:
+            parsed = self.report_parsed_in_parallel(per_file, missing, parsed)
+        return self.merge_parsed(per_file, missing, parsed, fingerprints)
+
+    def report_parsed_in_parallel(self, per_file, missing, parsed) -> List[List[FlakeDescriptor]]:
+        """Reports every file once the pool is done, in file order. Parsed files come with the time
+        their worker took, cached ones were looked up beforehand and are reported with no duration.
+        :param parsed: (descriptors, duration) of each missing file
+        :return: the descriptors of each missing file
+        """
+        timed = dict(zip(missing, parsed))
+        for index, file_path in enumerate(self.file_paths):
+            if index in timed:
+                file_descriptors, duration = timed[index]
+            else:
+                file_descriptors, duration = per_file[index], 0.0
+            self.instrumentation.parse_started(file_path)
+            self.instrumentation.parse_finished(file_path, len(file_descriptors), duration, index not in timed)
+        return [file_descriptors for file_descriptors, _ in parsed]
+
+    def merge_parsed(self, per_file, missing, parsed, fingerprints) -> List[List[FlakeDescriptor]]:
+        for index, file_descriptors, fingerprint in zip(missing, parsed, fingerprints):
+            per_file[index] = file_descriptors
+            self.store_cached(self.file_paths[index], file_descriptors, fingerprint)
+        return per_file
+
+    def get_worker_count(self, file_count: int) -> int:
+        return max(1, min(self.max_workers or os.cpu_count() or 1, file_count))
+
+    def get_executor(self, workers: int) -> Executor:
+        if self.parallel == PARALLEL_THREADS:
+            return ThreadPoolExecutor(workers)
+        return ProcessPoolExecutor(workers)
+
+    def get_chunksize(self, file_count: int, workers: int) -> int:
+        """Only used by process pools, batching several files per task amortizes the IPC round trips"""
+        if self.parallel != PARALLEL_PROCESSES:
+            return 1
+        return max(1, file_count // (workers * 4))
+
+    def load_cached(self, file_path: str) -> Optional[List[FlakeDescriptor]]:
+        if self.descriptor_cache is None:
+            return None
+        return self.descriptor_cache.get(file_path)
+
+    def get_fingerprint(self, file_path: str) -> Optional[FileFingerprint]:
+        """Fingerprint to store the descriptors under, taken before parsing. None when there is no cache,
+        or when the file cannot be read, parsing it fails then.
+        """
+        if self.descriptor_cache is None:
+            return None
+        try:
+            return FileFingerprint.of(file_path)
+        except OSError:
+            return None
+
+    def store_cached(self, file_path: str, flake_descriptors: List[FlakeDescriptor],
+                     fingerprint: FileFingerprint = None):
+        if self.descriptor_cache is not None and fingerprint is not None:
+            self.descriptor_cache.set(file_path, flake_descriptors, fingerprint)
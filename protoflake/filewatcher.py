@@ -0,0 +1,57 @@
+"""
+Polls the files of a container from a background thread and reloads the container when some of them change.
+Polling only stats the files, they are only read and parsed again once their mtime or size moved.
+"""
+import logging
+from threading import Event
+from threading import Thread
+from typing import Callable
+from typing import Set
+
+logger = logging.getLogger(__name__)
+
+
+class FileWatcher(object):
+
+    def __init__(self,
+                 reload: Callable[[], Set[str]],
+                 interval: float = 1.0,
+                 on_reload: Callable[[Set[str]], None] = None):
+        """
+        :param reload: reloads the changed files, returning the ids of the flakes it invalidated
+        :param interval: seconds between two polls
+        :param on_reload: called with the invalidated ids, whenever a poll invalidated some flakes
+        """
+        self.reload = reload
+        self.interval = interval
+        self.on_reload = on_reload
+        self.stopped = Event()
+        self.thread = None
+
+    def start(self) -> 'FileWatcher':
+        if self.thread is None:
+            self.stopped.clear()
+            self.thread = Thread(target=self.run, name='protoflake-file-watcher', daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.poll()
+
+    def poll(self) -> Set[str]:
+        try:
+            stale_ids = self.reload()
+        except Exception:
+            # a file saved halfway through should not stop the watcher, the next poll will try again
+            logger.exception('Reloading flake files failed')
+            return set()
+        if stale_ids and self.on_reload is not None:
+            self.on_reload(stale_ids)
+        return stale_ids
@@ -0,0 +1,64 @@
+"""
+Fingerprints identify the content of a file at some point in time: its size, mtime and content hash.
+Checking a fingerprint compares size and mtime first, the content is only hashed again when the mtime
+moved, so that files which were touched without being modified still match.
+"""
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Optional
+from typing import Tuple
+
+
+def hash_file(file_path: str) -> bytes:
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def stat_stamp(file_path: str) -> Optional[Tuple[int, int]]:
+    """Cheap stand-in for a fingerprint, only relying on stat: (mtime in ns, size), or None if the file is gone"""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_fingerprint(file_path: str) -> Optional['FileFingerprint']:
+    """FileFingerprint.of, or None if the file is gone"""
+    try:
+        return FileFingerprint.of(file_path)
+    except OSError:
+        return None
+
+
+@dataclass(frozen=True)
+class FileFingerprint(object):
+    path: str
+    mtime_ns: int
+    size: int
+    digest: bytes
+
+    @staticmethod
+    def of(file_path: str) -> 'FileFingerprint':
+        stat = os.stat(file_path)
+        return FileFingerprint(os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size, hash_file(file_path))
+
+    @property
+    def stamp(self) -> Tuple[int, int]:
+        """The stat_stamp of the file when it was fingerprinted"""
+        return self.mtime_ns, self.size
+
+    def matches(self, file_path: str = None) -> bool:
+        """Tells whether the file (this fingerprint's path by default) still has the fingerprinted content"""
+        file_path = file_path or self.path
+        try:
+            stat = os.stat(file_path)
+            if stat.st_size != self.size:
+                return False
+            return stat.st_mtime_ns == self.mtime_ns or hash_file(file_path) == self.digest
+        except OSError:
+            return False
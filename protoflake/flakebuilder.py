@@ -3,42 +3,222 @@ The flake builder is responsible for building nested flakes, retrieving refs and
 into primitive attributes. All this for building complex flakes.
 Once flake attributes have been transformed to primitive types, the flake builder will save the new
 flake instance inside the flake registry and return it.
+When given the discovery service, references to flakes which were not built yet are built on demand
+from their definitions, and references looping back to a flake still being built raise a DependencyCycle.
+Builds hold the registry's lock for the flake id, so concurrent threads asking for the same flake wait
+for a single build instead of racing. Cycles spanning several threads are detected by the locks, see BuildLock.
+Singletons outlive every context, so they may not reference context scoped flakes, even through the
+prototypes they hold: building one which does raises a ScopeLeak.
+When given an Instrumentation, the factory call and the registry write of each flake are timed and reported.
+Flakes are registered in the registry holding their scope, which may be a parent of the builder's own.
+Flakes which are not singletons are built many times from the same definition, so they are built from a
+BuildPlan compiled on first use rather than by walking their descriptor. Prototype scoped ones are never
+registered. Their nested flakes, and those of context scoped flakes, belong to them: they are built in place
+along with them instead of being registered under their own id, so they cannot be referenced: references to
+them raise NestedFlakeNotShared. Singletons are built once, walking their descriptor costs less than compiling it.
 """
+from threading import local
+from time import perf_counter
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from protoflake.buildplan import BuildPlan
+from protoflake.constants import SCOPE_ATTRIBUTE
+from protoflake.constants import SCOPE_CONTEXT
+from protoflake.constants import SCOPE_PROTOTYPE
+from protoflake.constants import SCOPE_SINGLETON
+from protoflake.dependencygraph import DependencyCycle
+from protoflake.dependencygraph import UndefinedFlake
+from protoflake.dependencygraph import iter_nested
+from protoflake.discoveryservice import DiscoveryService
 from protoflake.flakedescriptor import FlakeDescriptor
 from protoflake.flakefactory import FlakeFactory
 from protoflake.flakeregistry import FlakeRegistry
+from protoflake.flakeregistry import NestedFlakeNotShared
+from protoflake.flakeregistry import ScopeLeak
 from protoflake.flakeprovider import FlakeProvider
+from protoflake.instrumentation import Instrumentation
+from protoflake.lazyflakeprovider import LazyFlakeProvider
 from protoflake.protoregistry import ProtoRegistry
 
 
 class FlakeBuilder(FlakeProvider):
 
-    def __init__(self, factory: FlakeFactory, flake_registry: FlakeRegistry, proto_registry: ProtoRegistry):
+    def __init__(self,
+                 factory: FlakeFactory,
+                 flake_registry: FlakeRegistry,
+                 proto_registry: ProtoRegistry,
+                 discovery_service: DiscoveryService = None,
+                 lazy: bool = False):
         self.factory = factory
         self.flake_registry = flake_registry
         self.proto_registry = proto_registry
+        self.discovery_service = discovery_service
+        # provider used to turn attribute descriptors into values
+        self.attribute_provider = LazyFlakeProvider(self) if lazy else self
+        self.lazy = lazy
+        self.local = local()
+        self.instrumentation: Optional[Instrumentation] = None
+        # flake id -> plan, for flakes which are not singletons, shared with the builders of child registries
+        self.plans: Dict[str, BuildPlan] = {}
+
+    @property
+    def building(self) -> List[str]:
+        """Ids of the flakes the current thread is building, outermost first"""
+        building = getattr(self.local, 'building', None)
+        if building is None:
+            building = self.local.building = []
+        return building
+
+    @property
+    def holder(self) -> Optional[str]:
+        """Id of the innermost singleton the current thread is building, if any"""
+        return getattr(self.local, 'holder', None)
+
+    def check_scope(self, descriptor: FlakeDescriptor):
+        """:raises ScopeLeak: when the singleton being built would hold a context scoped flake"""
+        holder = self.holder
+        if holder is not None and descriptor.scope == SCOPE_CONTEXT:
+            raise ScopeLeak(holder, descriptor.id, descriptor.scope)
+
+    def check_ref_scope(self, flake_id):
+        if self.holder is None or self.discovery_service is None:
+            return
+        definitions = self.discovery_service.definitions
+        # nested flakes are checked through their owner, get_ref builds it first
+        if flake_id in definitions:
+            self.check_scope(definitions[flake_id])
 
     def get_new(self, flake_descriptor: FlakeDescriptor):
+        self.check_scope(flake_descriptor)
         return self.build_from_descriptor(flake_descriptor)
 
     def get_ref(self, flake_id):
+        self.check_ref_scope(flake_id)
+        if self.flake_registry.has(flake_id):
+            return self.flake_registry.get(flake_id)
+        if self.discovery_service is not None:
+            if flake_id in self.discovery_service.definitions:
+                if flake_id in self.building:
+                    raise DependencyCycle(self.building[self.building.index(flake_id):] + [flake_id])
+                return self.build_from_descriptor(self.discovery_service.get_definition(flake_id))
+            owner_id = self.discovery_service.get_owner_id(flake_id)
+            if owner_id is None:
+                building = self.building
+                raise UndefinedFlake(flake_id, building[-1] if building else None)
+            owner_scope = self.discovery_service.get_definition(owner_id).scope
+            if owner_scope != SCOPE_SINGLETON:
+                # they are built in place along with every instance of their owner, never registered
+                raise NestedFlakeNotShared(flake_id, owner_id, owner_scope)
+            # nested flakes only exist once the root flake defining them is built
+            self.get_ref(owner_id)
+            if self.lazy and not self.flake_registry.has(flake_id):
+                # lazy owners only hold a proxy for it, building it now makes that proxy resolve to it as well
+                return self.get_new(self.get_nested_definition(owner_id, flake_id))
         return self.flake_registry.get(flake_id)
 
+    def get_nested_definition(self, owner_id, flake_id) -> FlakeDescriptor:
+        for nested in iter_nested(self.discovery_service.get_definition(owner_id)):
+            if nested.id == flake_id:
+                return nested
+        raise UndefinedFlake(flake_id)
+
     def has(self, flake_id):
         return self.flake_registry.has(flake_id)
 
+    def lock_for(self, flake_id, scope: str = SCOPE_SINGLETON):
+        return self.flake_registry.get_owner(scope).lock_for(flake_id)
+
+    def can_register(self, scope: str) -> bool:
+        """Whether flakes of that scope are kept by this builder's registries, rather than built on each request"""
+        return scope != SCOPE_PROTOTYPE and self.flake_registry.owns(scope)
+
+    def create_child(self, flake_registry: FlakeRegistry) -> 'FlakeBuilder':
+        """Builder for a child registry of this builder's registry, sharing everything else with this one"""
+        builder = FlakeBuilder(
+            self.factory, flake_registry, self.proto_registry, self.discovery_service, self.lazy)
+        builder.instrumentation = self.instrumentation
+        builder.plans = self.plans
+        return builder
+
     def build_from_descriptor(self, descriptor: FlakeDescriptor):
+        """Builds the flake unless it exists already, callers are expected to have checked the registry first"""
+        if descriptor.scope == SCOPE_PROTOTYPE:
+            return self.build_from_plan(self.get_plan(descriptor))
         flake_id = descriptor.id
-        if self.flake_registry.has(flake_id):
-            return self.flake_registry.get(flake_id)
-        flake_data = self.collect_data_from_descriptor(descriptor)
-        proto = self.proto_registry.get(descriptor.proto_module, descriptor.proto_class)
+        registry = self.flake_registry.get_owner(descriptor.scope)
+        with registry.lock_for(flake_id):
+            # another thread may have built it while this one was waiting for the lock
+            if registry.has(flake_id):
+                return registry.get(flake_id)
+            return self.construct(descriptor, registry)
+
+    def construct(self, descriptor: FlakeDescriptor, registry: FlakeRegistry = None):
+        """Builds and registers the flake, the caller is responsible for checking it was not built already
+        :param registry: where to register it, defaults to the registry holding the flake's scope
+        """
+        flake_id = descriptor.id
+        if descriptor.scope != SCOPE_SINGLETON:
+            flake = self.build_from_plan(self.get_plan(descriptor))
+        else:
+            building = self.building
+            building.append(flake_id)
+            holder = self.holder
+            self.local.holder = flake_id
+            try:
+                flake_data = self.collect_data_from_descriptor(descriptor)
+            finally:
+                building.pop()
+                self.local.holder = holder
+            proto = self.proto_registry.get(descriptor.proto_module, descriptor.proto_class)
+            flake = self.create(flake_id, descriptor.proto_name, proto, flake_data)
+        if registry is None:
+            registry = self.flake_registry.get_owner(descriptor.scope)
+        if self.instrumentation is None:
+            registry.set(flake_id, flake)
+        else:
+            started = perf_counter()
+            registry.set(flake_id, flake)
+            self.instrumentation.flake_registered(flake_id, perf_counter() - started)
+        return flake
+
+    def create(self, flake_id: str, proto_name: str, proto, flake_data: dict):
+        if self.instrumentation is None:
+            return self.factory.build_flake(proto, flake_data)
+        started = perf_counter()
         flake = self.factory.build_flake(proto, flake_data)
-        self.flake_registry.set(flake_id, flake)
+        self.instrumentation.flake_built(flake_id, proto_name, perf_counter() - started)
         return flake
 
+    def get_plan(self, descriptor: FlakeDescriptor) -> BuildPlan:
+        plan = self.plans.get(descriptor.id)
+        if plan is None:
+            plan = self.plans[descriptor.id] = BuildPlan.compile(descriptor, self.proto_registry, fresh_nested=True)
+        return plan
+
+    def build_from_plan(self, plan: BuildPlan):
+        """Builds a new flake from the plan, without registering it"""
+        building = self.building
+        depth = len(building)
+        building.append(plan.flake_id)
+        try:
+            flake_data = plan.run(self)
+        finally:
+            # a failing plan may leave the ids of the nested flakes it was building behind
+            del building[depth:]
+        return self.create(plan.flake_id, plan.proto_name, plan.proto, flake_data)
+
+    def forget_plans(self, flake_ids):
+        """Drops the plans of definitions which changed, they are compiled again on next use"""
+        for flake_id in flake_ids:
+            self.plans.pop(flake_id, None)
+
     def collect_data_from_descriptor(self, flake_descriptor: FlakeDescriptor) -> dict:
         data = {}
         for attr_name, attr_descriptor in flake_descriptor.attrs.items():
-            data[attr_name] = attr_descriptor.get_primitive_value(self)
+            data[attr_name] = attr_descriptor.get_primitive_value(self.attribute_provider)
+        # the scope is read by the builder, it is not an attribute of the flake
+        if SCOPE_ATTRIBUTE in data:
+            del data[SCOPE_ATTRIBUTE]
         return data
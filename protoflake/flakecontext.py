@@ -0,0 +1,36 @@
+"""
+A flake context holds the context scoped flakes of one unit of work, a request for instance.
+Context scoped flakes are built once per context, singletons are still taken from (and built into) the
+container, prototype scoped flakes are built anew on each request as usual.
+Closing a context drops its flakes. Flakes invalidated by a reload of the container are not dropped from
+contexts which are already open, contexts are meant to be short lived.
+"""
+from protoflake.constants import SCOPE_CONTEXT
+from protoflake.discoveryservice import DiscoveryService
+from protoflake.flakebuilder import FlakeBuilder
+from protoflake.flakeregistry import FlakeRegistry
+from protoflake.flakeservice import FlakeService
+
+
+class FlakeContext(object):
+
+    def __init__(self, discovery_service: DiscoveryService, parent_builder: FlakeBuilder):
+        self.flake_registry: FlakeRegistry = parent_builder.flake_registry.create_child(SCOPE_CONTEXT)
+        self.builder = parent_builder.create_child(self.flake_registry)
+        self.discovery_service = discovery_service
+        self.flake_service = FlakeService(discovery_service, self.builder)
+
+    def get(self, *args, **kwargs):
+        return self.flake_service.get(*args, **kwargs)
+
+    def build_all(self, *args, **kwargs):
+        return self.flake_service.build_all(*args, **kwargs)
+
+    def close(self):
+        self.flake_registry.clear()
+
+    def __enter__(self) -> 'FlakeContext':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
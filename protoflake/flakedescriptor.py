@@ -1,22 +1,45 @@
 from dataclasses import dataclass
+from sys import intern
 from typing import Dict
 
+from protoflake.constants import SCOPE_ATTRIBUTE
+from protoflake.constants import SCOPE_SINGLETON
+from protoflake.constants import SCOPES
 from protoflake.sourcedescriptor import SourceDescriptor
 from protoflake.attributedescriptor import AttributeDescriptor
 
 
+class UnknownFlakeScope(ValueError):
+    def __init__(self, flake_id, scope, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.msg = 'Flake %s has an unknown scope %s, expected one of %s' % (flake_id, scope, ', '.join(SCOPES))
+
+
 @dataclass
 class FlakeDescriptor(object):
-    """Describes the data that should be used to create a flake"""
+    """Describes the data that should be used to create a flake
+    proto_name is split into its module and class once, when the descriptor is created. Both parts are
+    interned, since many descriptors share the same proto.
+    The scope is read from the reserved __scope__ attribute, flakes without one are singletons. The attribute stays
+    in attrs, so that every storage keeps it, builders leave it out of the flake.
+    """
+    # proto_module, proto_class and scope are derived from the fields, they are not dataclass fields
+    __slots__ = ('proto_name', 'id', 'attrs', 'source', 'proto_module', 'proto_class', 'scope')
+
     proto_name: str
     id: str
     attrs: Dict[str, AttributeDescriptor]
     source: SourceDescriptor
 
-    @property
-    def proto_class(self):
-        return self.proto_name.rsplit('.', 1)[1]
-
-    @property
-    def proto_module(self):
-        return self.proto_name.rsplit('.', 1)[0]
+    def __post_init__(self):
+        proto_module, _, proto_class = self.proto_name.rpartition('.')
+        self.proto_module = intern(proto_module)
+        self.proto_class = intern(proto_class)
+        scope = self.attrs.get(SCOPE_ATTRIBUTE)
+        if scope is None:
+            self.scope = SCOPE_SINGLETON
+        else:
+            scope = getattr(scope, 'value', scope)
+            if scope not in SCOPES:
+                raise UnknownFlakeScope(self.id, scope)
+            self.scope = SCOPES[SCOPES.index(scope)]
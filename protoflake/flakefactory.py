@@ -2,7 +2,26 @@
 The flake factory initialize flake instances by instantiating their classes
 then setting every attributes on them.
 It produces one single flake at a time and expects references to already have been resolved
+
+The first flake built for a given proto and set of attribute names goes through the generic path,
+checking that no attribute overwrites an existing one. That build compiles a constructor which
+later flakes of the same shape go through, writing attributes straight into the instance's __dict__
+or __slots__. Only the attributes the first instance already had before they were set, the ones its
+__init__ or its class define, are checked again, since a later instance may give them a truthy value.
+Compiled constructors belong to the factory, each container has its own.
+Protos whose __init__ has required parameters get the matching attributes as keyword arguments.
 """
+import inspect
+from types import MemberDescriptorType
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+
+# stands for attributes an instance does not have
+MISSING = object()
 
 
 class FlakeAttributeOverwriting(Exception):
@@ -12,13 +31,110 @@ class FlakeAttributeOverwriting(Exception):
                    (attr_name, attr_value, instance, getattr(instance, attr_name))
 
 
+def get_init_names(proto, attr_names) -> Tuple[str, ...]:
+    """Names of the attributes to give to __init__, only used when the proto cannot be built without arguments"""
+    try:
+        parameters = inspect.signature(proto).parameters.values()
+    except (TypeError, ValueError):
+        return ()
+    keyword_kinds = (inspect.Parameter.POSITIONAL_OR_KEYWORD, inspect.Parameter.KEYWORD_ONLY)
+    keywords = [parameter for parameter in parameters if parameter.kind in keyword_kinds]
+    if all(parameter.default is not inspect.Parameter.empty for parameter in keywords):
+        return ()
+    return tuple(parameter.name for parameter in keywords if parameter.name in attr_names)
+
+
+def get_class_attribute(klass, attr_name):
+    for base in klass.__mro__:
+        if attr_name in base.__dict__:
+            return base.__dict__[attr_name]
+    return None
+
+
+def compile_constructor(proto, instance, attr_names, init_names, preset_names=()) \
+        -> Callable[[Dict[str, Any]], Any]:
+    """Returns a function building flakes of this proto from attribute dicts with the given keys.
+    instance is a flake already built with these attributes, used to find out how each one is stored.
+    preset_names are the attributes instance already had before they were set, checked on every flake.
+    """
+    klass = type(instance)
+    # writing around an overridden __setattr__ would skip it for every flake but the first
+    default_setattr = klass.__setattr__ is object.__setattr__
+    plain_setattr = default_setattr and hasattr(instance, '__dict__')
+    dict_names = []
+    slot_setters = []
+    other_names = []
+    for attr_name in attr_names:
+        if attr_name in init_names:
+            continue
+        class_attribute = get_class_attribute(klass, attr_name)
+        if default_setattr and isinstance(class_attribute, MemberDescriptorType):
+            slot_setters.append((attr_name, class_attribute.__set__))
+        elif plain_setattr and not hasattr(class_attribute, '__set__'):
+            dict_names.append(attr_name)
+        else:
+            other_names.append(attr_name)
+    update_dict = len(dict_names) == len(attr_names)
+
+    def construct(flake_attrs):
+        if init_names:
+            flake = proto(**{name: flake_attrs[name] for name in init_names})
+        else:
+            flake = proto()
+        for name in preset_names:
+            if getattr(flake, name, None):
+                raise FlakeAttributeOverwriting(flake, name, flake_attrs[name])
+        if update_dict:
+            flake.__dict__.update(flake_attrs)
+            return flake
+        if dict_names:
+            flake_dict = flake.__dict__
+            for name in dict_names:
+                flake_dict[name] = flake_attrs[name]
+        for name, set_slot in slot_setters:
+            set_slot(flake, flake_attrs[name])
+        for name in other_names:
+            setattr(flake, name, flake_attrs[name])
+        return flake
+
+    return construct
+
+
 class FlakeFactory(object):
 
+    def __init__(self):
+        # proto -> attribute names -> compiled constructor
+        self.constructors = {}
+
+    def build_flake(self, proto, flake_attrs):
+        proto_constructors = self.constructors.get(proto)
+        if proto_constructors is None:
+            proto_constructors = self.constructors.setdefault(proto, {})
+        attr_names = tuple(flake_attrs)
+        constructor = proto_constructors.get(attr_names)
+        if constructor is not None:
+            return constructor(flake_attrs)
+        init_names = get_init_names(proto, flake_attrs)
+        preset_names = []
+        instance = self.build_flake_checked(proto, flake_attrs, init_names, preset_names)
+        proto_constructors[attr_names] = compile_constructor(
+            proto, instance, attr_names, init_names, tuple(preset_names))
+        return instance
+
     @staticmethod
-    def build_flake(proto, flake_attrs):
-        instance = proto()
+    def build_flake_checked(proto, flake_attrs, init_names=(), preset_names: List[str] = None):
+        """Generic path, refuses to overwrite attributes the instance already has
+        :param preset_names: filled with the names of the attributes the instance had, falsy ones included
+        """
+        instance = proto(**{name: flake_attrs[name] for name in init_names})
         for attr_name, attr_value in flake_attrs.items():
-            if getattr(instance, attr_name, None):
-                raise FlakeAttributeOverwriting(instance, attr_name, attr_value)
+            if attr_name in init_names:
+                continue
+            current = getattr(instance, attr_name, MISSING)
+            if current is not MISSING:
+                if current:
+                    raise FlakeAttributeOverwriting(instance, attr_name, attr_value)
+                if preset_names is not None:
+                    preset_names.append(attr_name)
             setattr(instance, attr_name, attr_value)
         return instance
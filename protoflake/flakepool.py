@@ -0,0 +1,65 @@
+"""
+Pool of prototype scoped flakes, for the ones which are expensive to build.
+Flakes are handed out by acquire and given back by release, which calls their POOL_RESET_HOOK method
+when they define one, so that the next user gets a clean flake.
+New flakes are only built when the pool is empty, at most max_size idle flakes are kept around.
+"""
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any
+from typing import Callable
+from typing import Iterator
+
+from protoflake.constants import POOL_RESET_HOOK
+
+
+class FlakeNotPoolable(ValueError):
+    def __init__(self, flake_id, scope, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.msg = 'Only prototype scoped flakes can be pooled, %s is %s scoped' % (flake_id, scope)
+
+
+class FlakePool(object):
+
+    def __init__(self, flake_id: str, build: Callable[[], Any], max_size: int = 8):
+        """
+        :param build: builds a new flake, typically fetching a prototype scoped flake from a container
+        :param max_size: maximum number of idle flakes kept, flakes released beyond that are dropped
+        """
+        self.flake_id = flake_id
+        self.build = build
+        self.max_size = max_size
+        self.idle = deque()
+        self.lock = Lock()
+
+    def acquire(self) -> Any:
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        return self.build()
+
+    def release(self, flake: Any):
+        reset = getattr(flake, POOL_RESET_HOOK, None)
+        if reset is not None:
+            reset()
+        with self.lock:
+            if len(self.idle) < self.max_size:
+                self.idle.append(flake)
+
+    @contextmanager
+    def lease(self) -> Iterator[Any]:
+        """Acquires a flake for the duration of a with block"""
+        flake = self.acquire()
+        try:
+            yield flake
+        finally:
+            self.release(flake)
+
+    def clear(self):
+        """Drops the idle flakes, after the definition they were built from changed for instance"""
+        with self.lock:
+            self.idle.clear()
+
+    def __len__(self):
+        return len(self.idle)
@@ -0,0 +1,111 @@
+"""
+A flake proxy stands in for a flake which was not built yet.
+The real flake is only built the first time the proxy is used, after which every operation on the proxy
+is forwarded to it. Proxies pretend to be instances of the flake's class, so isinstance keeps working.
+"""
+from typing import Any
+from typing import Callable
+
+
+_UNRESOLVED = object()
+
+
+def resolve_proxy(obj: Any) -> Any:
+    """Returns the flake behind a proxy, building it if needed. Anything else is returned as is."""
+    if type(obj) is not FlakeProxy:
+        return obj
+    target = object.__getattribute__(obj, '_target')
+    if target is _UNRESOLVED:
+        target = object.__getattribute__(obj, '_factory')()
+        object.__setattr__(obj, '_target', target)
+        object.__setattr__(obj, '_factory', None)
+    return target
+
+
+def is_resolved(proxy: 'FlakeProxy') -> bool:
+    return object.__getattribute__(proxy, '_target') is not _UNRESOLVED
+
+
+class FlakeProxy(object):
+    __slots__ = ('_factory', '_target')
+
+    def __init__(self, factory: Callable[[], Any]):
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_target', _UNRESOLVED)
+
+    def __getattr__(self, name):
+        return getattr(resolve_proxy(self), name)
+
+    @property
+    def __class__(self):
+        return resolve_proxy(self).__class__
+
+    def __setattr__(self, name, value):
+        setattr(resolve_proxy(self), name, value)
+
+    def __delattr__(self, name):
+        delattr(resolve_proxy(self), name)
+
+    def __dir__(self):
+        return dir(resolve_proxy(self))
+
+    def __repr__(self):
+        return repr(resolve_proxy(self))
+
+    def __str__(self):
+        return str(resolve_proxy(self))
+
+    def __bool__(self):
+        return bool(resolve_proxy(self))
+
+    def __hash__(self):
+        return hash(resolve_proxy(self))
+
+    def __eq__(self, other):
+        return resolve_proxy(self) == resolve_proxy(other)
+
+    def __ne__(self, other):
+        return resolve_proxy(self) != resolve_proxy(other)
+
+    def __lt__(self, other):
+        return resolve_proxy(self) < resolve_proxy(other)
+
+    def __le__(self, other):
+        return resolve_proxy(self) <= resolve_proxy(other)
+
+    def __gt__(self, other):
+        return resolve_proxy(self) > resolve_proxy(other)
+
+    def __ge__(self, other):
+        return resolve_proxy(self) >= resolve_proxy(other)
+
+    def __len__(self):
+        return len(resolve_proxy(self))
+
+    def __iter__(self):
+        return iter(resolve_proxy(self))
+
+    def __contains__(self, item):
+        return item in resolve_proxy(self)
+
+    def __getitem__(self, key):
+        return resolve_proxy(self)[key]
+
+    def __setitem__(self, key, value):
+        resolve_proxy(self)[key] = value
+
+    def __delitem__(self, key):
+        del resolve_proxy(self)[key]
+
+    def __call__(self, *args, **kwargs):
+        return resolve_proxy(self)(*args, **kwargs)
+
+    def __enter__(self):
+        return resolve_proxy(self).__enter__()
+
+    def __exit__(self, *exc_info):
+        return resolve_proxy(self).__exit__(*exc_info)
+
+    def __reduce_ex__(self, protocol):
+        # pickling a proxy pickles its flake, which keeps references to that flake shared
+        return resolve_proxy, (resolve_proxy(self),)
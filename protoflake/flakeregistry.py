@@ -1,7 +1,25 @@
 """
 The flake registry holds already built flake instances.
-Right now it is only a mapping.
+Reads are a plain mapping lookup and never lock. Builders take the per-id lock given by lock_for
+while building a flake, so that concurrent requests for the same id build it exactly once.
+Build locks know which thread holds them and which one each thread waits for: a thread about to wait for a
+flake built by a thread which (directly or not) waits for one of its own flakes raises a DependencyCycle
+instead, since flakes referencing each other from two threads would otherwise wait on each other forever.
+Registries form a hierarchy: each one holds the flakes of one scope, and looks up its parents for the ids
+it does not hold. The container's registry holds singletons, the registry of a FlakeContext holds the flakes
+scoped to that context and falls back to the container's.
 """
+from threading import Lock
+from threading import RLock
+from threading import get_ident
+from typing import Dict
+from typing import Optional
+
+from protoflake.constants import SCOPE_SINGLETON
+from protoflake.dependencygraph import DependencyCycle
+
+# flakes can be None, so None cannot tell that one is missing
+MISSING = object()
 
 
 class FlakeAlreadyExist(Exception):
@@ -10,19 +28,165 @@ class FlakeAlreadyExist(Exception):
         self.msg = 'Trying to register a flake with id %s which already exists' % flake_id
 
 
-class FlakeRegistry(object):
+class ScopeNotAvailable(Exception):
+    def __init__(self, scope, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.msg = 'No registry holds %s scoped flakes here, they must be requested from a FlakeContext' % scope
+
+
+class NestedFlakeNotShared(Exception):
+    def __init__(self, flake_id, owner_id, scope, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.msg = 'Flake %s cannot be referenced, it is nested in %s which is %s scoped: each instance of %s ' \
+                   'builds its own' % (flake_id, owner_id, scope, owner_id)
+
+
+class ScopeLeak(Exception):
+    def __init__(self, holder_id, flake_id, scope, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.msg = 'Singleton %s cannot reference %s, which is %s scoped and would outlive its scope in it' % (
+            holder_id, flake_id, scope)
+
+
+class BuildWaits(object):
+    """Which build lock each thread is waiting for, shared by a registry and its children"""
 
     def __init__(self):
+        self.lock = Lock()
+        # thread ident -> lock it waits for
+        self.waiting: Dict[int, 'BuildLock'] = {}
+
+    def start_waiting(self, thread_id: int, build_lock: 'BuildLock'):
+        """:raises DependencyCycle: when the thread holding build_lock waits, directly or not, for thread_id"""
+        with self.lock:
+            cycle = [build_lock.flake_id]
+            holder = build_lock.holder
+            while holder is not None and holder != thread_id:
+                awaited = self.waiting.get(holder)
+                if awaited is None:
+                    break
+                cycle.append(awaited.flake_id)
+                holder = awaited.holder
+            if holder == thread_id:
+                raise DependencyCycle(cycle + [build_lock.flake_id])
+            self.waiting[thread_id] = build_lock
+
+    def stop_waiting(self, thread_id: int):
+        with self.lock:
+            del self.waiting[thread_id]
+
+
+class BuildLock(object):
+    """Lock held while building a flake. It is reentrant, since building a flake may require
+    building the flakes it references from the same thread.
+    """
+
+    def __init__(self, flake_id, waits: BuildWaits):
+        self.flake_id = flake_id
+        self.waits = waits
+        self.lock = RLock()
+        # ident of the thread holding the lock, None when it is free
+        self.holder: Optional[int] = None
+        self.depth = 0
+
+    def acquire(self):
+        thread_id = get_ident()
+        if not self.lock.acquire(blocking=False):
+            self.waits.start_waiting(thread_id, self)
+            try:
+                self.lock.acquire()
+            finally:
+                self.waits.stop_waiting(thread_id)
+        self.holder = thread_id
+        self.depth += 1
+
+    def release(self):
+        self.depth -= 1
+        if not self.depth:
+            self.holder = None
+        self.lock.release()
+
+    def __enter__(self) -> 'BuildLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+class FlakeRegistry(object):
+
+    def __init__(self, parent: 'FlakeRegistry' = None, scope: str = SCOPE_SINGLETON):
         super().__init__()
+        self.parent: Optional[FlakeRegistry] = parent
+        self.scope = scope
         self.registry = {}
+        # flake id -> lock held while that flake is being built, dropped once it is registered
+        self.build_locks: Dict[str, BuildLock] = {}
+        self.build_locks_lock = Lock()
+        self.build_waits = BuildWaits() if parent is None else parent.build_waits
 
     def has(self, flake_id: str):
-        return flake_id in self.registry
+        if flake_id in self.registry:
+            return True
+        return self.parent is not None and self.parent.has(flake_id)
 
     def get(self, flake_id):
-        return self.registry[flake_id]
+        try:
+            return self.registry[flake_id]
+        except KeyError:
+            if self.parent is None:
+                raise
+        return self.parent.get(flake_id)
+
+    def get_owner(self, scope: str) -> 'FlakeRegistry':
+        """The closest registry holding the flakes of that scope, this one or one of its parents
+        :raises ScopeNotAvailable: when none does, context scoped flakes requested out of any context for instance
+        """
+        registry = self
+        while registry is not None:
+            if registry.scope == scope:
+                return registry
+            registry = registry.parent
+        raise ScopeNotAvailable(scope)
+
+    def owns(self, scope: str) -> bool:
+        """Whether this registry or one of its parents holds the flakes of that scope"""
+        registry = self
+        while registry is not None and registry.scope != scope:
+            registry = registry.parent
+        return registry is not None
+
+    def create_child(self, scope: str) -> 'FlakeRegistry':
+        return FlakeRegistry(self, scope)
 
     def set(self, flake_id, flake):
         if self.has(flake_id):
             raise FlakeAlreadyExist(flake_id)
         self.registry[flake_id] = flake
+        self.build_locks.pop(flake_id, None)
+
+    def remove(self, flake_id) -> bool:
+        """Forgets a built flake so that it is built again next time, returns whether it was built.
+        Waits for a build of that flake in progress, so that it is not registered right after being forgotten.
+        The build lock is kept, threads already waiting on it must not race with ones taking a new one.
+        """
+        with self.lock_for(flake_id):
+            return self.registry.pop(flake_id, MISSING) is not MISSING
+
+    def clear(self):
+        """Forgets every flake held by this registry, parents are left untouched"""
+        self.registry.clear()
+        self.build_locks.clear()
+
+    def lock_for(self, flake_id) -> BuildLock:
+        """Lock to hold while building flake_id, see BuildLock
+        :raises DependencyCycle: when acquiring it, if waiting for it would deadlock
+        """
+        lock = self.build_locks.get(flake_id)
+        if lock is None:
+            with self.build_locks_lock:
+                lock = self.build_locks.get(flake_id)
+                if lock is None:
+                    lock = self.build_locks[flake_id] = BuildLock(flake_id, self.build_waits)
+        return lock
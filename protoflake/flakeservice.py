@@ -2,6 +2,10 @@
 The flake service is responsible for instantiating and retrieving flakes, it relies on some
 discovery service to have been injected in order to get the flake definitions.
 """
+from time import perf_counter
+from typing import Iterable
+
+from protoflake.buildreport import BuildReport
 from protoflake.discoveryservice import DiscoveryService
 from protoflake.flakebuilder import FlakeBuilder
 
@@ -20,3 +24,30 @@ class FlakeService(object):
             return self.builder.get_ref(flake_id)
         else:
             return self.builder.get_new(self.discovery.get_definition(flake_id))
+
+    def build_all(self, flake_ids: Iterable[str] = None) -> BuildReport:
+        """Builds the given flakes (every discovered flake by default) and the flakes they reference,
+        each one after its dependencies so that no reference has to be resolved recursively.
+        Flakes which were already built are skipped and left out of the report, and so are prototype scoped
+        flakes, and context scoped ones unless the builder belongs to a FlakeContext.
+        :raises DependencyCycle: if the flakes to build reference each other in a cycle
+        :raises UndefinedFlake: if a given id, or a reference of the flakes to build, is not defined
+        :return: how long each flake took to build
+        """
+        report = BuildReport()
+        started = perf_counter()
+        for flake_id in self.discovery.get_dependency_graph().build_order(flake_ids):
+            if self.builder.has(flake_id):
+                continue
+            descriptor = self.discovery.get_definition(flake_id)
+            if not self.builder.can_register(descriptor.scope):
+                continue
+            with self.builder.lock_for(flake_id, descriptor.scope):
+                # some other thread may have built it in the meantime
+                if self.builder.has(flake_id):
+                    continue
+                flake_started = perf_counter()
+                self.builder.construct(descriptor)
+                report.add(flake_id, descriptor.proto_name, perf_counter() - flake_started)
+        report.total = perf_counter() - started
+        return report
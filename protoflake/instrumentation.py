@@ -0,0 +1,162 @@
+"""
+Instrumentation lets the outer world follow a container through its lifecycle: files being parsed,
+proto modules being imported, flakes being built by the factory and stored in the registry.
+Components hold an Instrumentation, None by default, and only time or report anything when one is set,
+so that an uninstrumented container only pays for a None check at each of these points.
+Listeners subclass InstrumentationListener and override the events they care about.
+PhaseCollector is a listener aggregating the time spent per phase, per proto and per file.
+"""
+from collections import defaultdict
+from threading import Lock
+from typing import Dict
+from typing import List
+
+PHASE_PARSE = 'parse'
+PHASE_IMPORT = 'import'
+PHASE_BUILD = 'build'
+PHASE_REGISTER = 'register'
+
+
+class InstrumentationListener(object):
+    """Does nothing on every event. Events may be reported from several threads at once."""
+
+    def parse_started(self, file_path: str):
+        pass
+
+    def parse_finished(self, file_path: str, descriptor_count: int, duration: float, cached: bool):
+        """:param cached: whether the descriptors were loaded from the descriptor cache instead of parsed"""
+        pass
+
+    def proto_imported(self, module_name: str, duration: float):
+        pass
+
+    def flake_built(self, flake_id: str, proto_name: str, duration: float):
+        """Reported once the factory built the flake, duration only covers the factory call"""
+        pass
+
+    def flake_registered(self, flake_id: str, duration: float):
+        pass
+
+
+class Instrumentation(InstrumentationListener):
+    """Event bus forwarding every event to its listeners, in the order they were added"""
+
+    def __init__(self, *listeners: InstrumentationListener):
+        self.listeners: List[InstrumentationListener] = list(listeners)
+
+    def add_listener(self, listener: InstrumentationListener) -> InstrumentationListener:
+        self.listeners.append(listener)
+        return listener
+
+    def remove_listener(self, listener: InstrumentationListener):
+        self.listeners.remove(listener)
+
+    def parse_started(self, file_path):
+        for listener in self.listeners:
+            listener.parse_started(file_path)
+
+    def parse_finished(self, file_path, descriptor_count, duration, cached):
+        for listener in self.listeners:
+            listener.parse_finished(file_path, descriptor_count, duration, cached)
+
+    def proto_imported(self, module_name, duration):
+        for listener in self.listeners:
+            listener.proto_imported(module_name, duration)
+
+    def flake_built(self, flake_id, proto_name, duration):
+        for listener in self.listeners:
+            listener.flake_built(flake_id, proto_name, duration)
+
+    def flake_registered(self, flake_id, duration):
+        for listener in self.listeners:
+            listener.flake_registered(flake_id, duration)
+
+
+class PhaseCollector(InstrumentationListener):
+    """Sums the durations reported, per phase, per proto (factory time) and per file (parse time)"""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.phase_times: Dict[str, float] = defaultdict(float)
+        self.phase_counts: Dict[str, int] = defaultdict(int)
+        self.proto_times: Dict[str, float] = defaultdict(float)
+        self.proto_counts: Dict[str, int] = defaultdict(int)
+        self.file_times: Dict[str, float] = {}
+        self.file_descriptor_counts: Dict[str, int] = {}
+        self.import_times: Dict[str, float] = {}
+        self.cached_files = 0
+
+    def add_phase(self, phase: str, duration: float):
+        self.phase_times[phase] += duration
+        self.phase_counts[phase] += 1
+
+    def parse_finished(self, file_path, descriptor_count, duration, cached):
+        with self.lock:
+            self.add_phase(PHASE_PARSE, duration)
+            # a file discovered again (on reload for instance) adds up
+            self.file_times[file_path] = self.file_times.get(file_path, 0.0) + duration
+            self.file_descriptor_counts[file_path] = descriptor_count
+            if cached:
+                self.cached_files += 1
+
+    def proto_imported(self, module_name, duration):
+        with self.lock:
+            self.add_phase(PHASE_IMPORT, duration)
+            self.import_times[module_name] = duration
+
+    def flake_built(self, flake_id, proto_name, duration):
+        with self.lock:
+            self.add_phase(PHASE_BUILD, duration)
+            self.proto_times[proto_name] += duration
+            self.proto_counts[proto_name] += 1
+
+    def flake_registered(self, flake_id, duration):
+        with self.lock:
+            self.add_phase(PHASE_REGISTER, duration)
+
+    @property
+    def descriptor_count(self) -> int:
+        return sum(self.file_descriptor_counts.values())
+
+    def by_phase(self) -> Dict[str, float]:
+        return dict(self.phase_times)
+
+    def by_proto(self) -> Dict[str, float]:
+        """Total factory time per proto, slowest proto first"""
+        return dict(sorted(self.proto_times.items(), key=lambda item: item[1], reverse=True))
+
+    def by_file(self) -> Dict[str, float]:
+        """Total parse time per file, slowest file first"""
+        return dict(sorted(self.file_times.items(), key=lambda item: item[1], reverse=True))
+
+    def as_dict(self) -> dict:
+        """Everything collected so far as plain dicts and numbers, ready to be exported"""
+        with self.lock:
+            return {
+                'phases': {
+                    phase: {'seconds': self.phase_times[phase], 'count': self.phase_counts[phase]}
+                    for phase in self.phase_times
+                },
+                'protos': {
+                    proto_name: {'seconds': self.proto_times[proto_name], 'count': self.proto_counts[proto_name]}
+                    for proto_name in self.by_proto()
+                },
+                'files': {
+                    file_path: {'seconds': seconds, 'descriptors': self.file_descriptor_counts[file_path]}
+                    for file_path, seconds in self.by_file().items()
+                },
+                'imports': dict(self.import_times),
+                'descriptor_count': self.descriptor_count,
+                'cached_files': self.cached_files,
+            }
+
+    def reset(self):
+        with self.lock:
+            self.phase_times.clear()
+            self.phase_counts.clear()
+            self.proto_times.clear()
+            self.proto_counts.clear()
+            self.file_times.clear()
+            self.file_descriptor_counts.clear()
+            self.import_times.clear()
+            self.cached_files = 0
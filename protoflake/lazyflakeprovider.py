@@ -0,0 +1,29 @@
+"""
+Flake provider used by the builder in lazy mode.
+Instead of building referenced and nested flakes right away, it hands out proxies which build them
+the first time they are used. Flakes which were already built are returned directly.
+This lets flakes reference each other in a cycle, and defers the cost of parts of the graph nobody uses.
+"""
+from functools import partial
+
+from protoflake.flakeprovider import FlakeProvider
+from protoflake.flakeproxy import FlakeProxy
+
+
+class LazyFlakeProvider(FlakeProvider):
+
+    def __init__(self, builder: FlakeProvider):
+        self.builder = builder
+
+    def get_ref(self, flake_id):
+        # scopes are checked now, proxies are resolved once the flake holding them is built
+        self.builder.check_ref_scope(flake_id)
+        if self.builder.has(flake_id):
+            return self.builder.get_ref(flake_id)
+        return FlakeProxy(partial(self.builder.get_ref, flake_id))
+
+    def get_new(self, flake_descriptor):
+        self.builder.check_scope(flake_descriptor)
+        if self.builder.has(flake_descriptor.id):
+            return self.builder.get_ref(flake_descriptor.id)
+        return FlakeProxy(partial(self.builder.get_new, flake_descriptor))
@@ -0,0 +1,73 @@
+"""
+Backends decoding the text of yaml and json flake files into python primitives.
+The fastest implementation decoding exactly like the reference one is picked by default: libyaml's
+CSafeLoader when PyYAML was built against it, PyYAML's pure python loader otherwise, and the stdlib json
+module. orjson and ujson are faster but lossy, integers beyond 64 bits become floats or fail and NaN is
+refused, so installing them does not change parse results: they must be picked with use_backend.
+"""
+import json
+from dataclasses import dataclass
+from functools import partial
+from typing import Any
+from typing import Callable
+from typing import List
+
+import yaml
+
+
+class UnknownParserBackend(ValueError):
+    def __init__(self, name, backends, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.msg = 'Unknown parser backend %s, available ones are %s' % (
+            name, ', '.join(backend.name for backend in backends))
+
+
+@dataclass(frozen=True)
+class ParserBackend(object):
+    name: str
+    load: Callable[[str], Any]
+    # whether it decodes every document like the pure python backend, only exact ones are picked by default
+    exact: bool = True
+
+
+def find_yaml_backends() -> List[ParserBackend]:
+    """Available yaml backends, fastest first"""
+    backends = []
+    try:
+        from yaml import CSafeLoader
+        backends.append(ParserBackend('libyaml', partial(yaml.load, Loader=CSafeLoader)))
+    except ImportError:
+        pass
+    backends.append(ParserBackend('pyyaml', yaml.safe_load))
+    return backends
+
+
+def find_json_backends() -> List[ParserBackend]:
+    """Available json backends, fastest first"""
+    backends = []
+    try:
+        import orjson
+        backends.append(ParserBackend('orjson', orjson.loads, exact=False))
+    except ImportError:
+        pass
+    try:
+        import ujson
+        backends.append(ParserBackend('ujson', ujson.loads, exact=False))
+    except ImportError:
+        pass
+    backends.append(ParserBackend('json', json.loads))
+    return backends
+
+
+def select_backend(backends: List[ParserBackend], name: str = None) -> ParserBackend:
+    """Returns the backend with the given name, or the fastest exact one when no name is given"""
+    if name is None:
+        return next(backend for backend in backends if backend.exact)
+    for backend in backends:
+        if backend.name == name:
+            return backend
+    raise UnknownParserBackend(name, backends)
+
+
+yaml_backends = find_yaml_backends()
+json_backends = find_json_backends()
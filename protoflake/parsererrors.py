@@ -0,0 +1,27 @@
+"""
+Errors raised by parsers and by the descriptor builder they share, when a definition cannot be turned into
+a descriptor. Each one tells which source the definition came from.
+"""
+from protoflake.sourcedescriptor import SourceDescriptor
+
+
+class ParserException(Exception):
+    def __init__(self, msg: str, source: SourceDescriptor):
+        super().__init__(msg)
+        self.source = source
+
+
+class MissingFlakeId(ParserException):
+    def __init__(self, proto_name, source):
+        super().__init__('Flake of proto %s has no id' % proto_name, source)
+
+
+class MissingFlakeProto(ParserException):
+    def __init__(self, flake_id, source):
+        super().__init__('Flake %s has no proto' % flake_id, source)
+
+
+class InvalidPrimitive(ParserException):
+    def __init__(self, attr_name, primitive_type, text, source):
+        super().__init__('Attribute %s is declared %s but its value %r is not one' % (
+            attr_name, primitive_type, text), source)
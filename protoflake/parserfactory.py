@@ -1,8 +1,13 @@
 """
 Parser factory, which returns the right parser depending on the source
 """
+from typing import Dict
+from typing import Type
+
 from protoflake.descriptors import FileSourceDescriptor
+from protoflake.parsers import FlakeParser
 from protoflake.parsers import JsonFlakeParser
+from protoflake.parsers import StreamingXmlFlakeParser
 from protoflake.parsers import XmlFlakeParser
 from protoflake.parsers import YamlFlakeParser
 
@@ -14,15 +19,55 @@ class NoSuitableParserFound(Exception):
 
 
 class ParserFactory(object):
+    """Maps file extensions to parser classes.
+    Parsers are stateless, so each class is only instantiated once and that instance is handed out for every file.
+    Subclasses may declare their own parsers table, extensions missing from it are looked up in the parent tables.
+    """
+
+    parsers: Dict[str, Type[FlakeParser]] = {
+        'xml': XmlFlakeParser,
+        'yaml': YamlFlakeParser,
+        'yml': YamlFlakeParser,
+        'json': JsonFlakeParser,
+    }
+    # parser class -> shared instance
+    instances: Dict[Type[FlakeParser], FlakeParser] = {}
+
+    @classmethod
+    def get_parser_class(cls, extension: str) -> Type[FlakeParser]:
+        for klass in cls.__mro__:
+            parser_class = klass.__dict__.get('parsers', {}).get(extension)
+            if parser_class is not None:
+                return parser_class
+        raise NoSuitableParserFound(extension)
+
+    @classmethod
+    def get_parser(cls, source_descriptor: FileSourceDescriptor) -> FlakeParser:
+        parser_class = cls.get_parser_class(source_descriptor.file_extension)
+        parser = ParserFactory.instances.get(parser_class)
+        if parser is None:
+            parser = ParserFactory.instances.setdefault(parser_class, parser_class())
+        return parser
+
+    @classmethod
+    def register(cls, extension: str, parser_class: Type[FlakeParser]):
+        """Parses files with the given extension using parser_class, from this factory and its subclasses"""
+        if 'parsers' not in cls.__dict__:
+            cls.parsers = {}
+        cls.parsers[extension] = parser_class
 
     @staticmethod
-    def get_parser(source_descriptor: FileSourceDescriptor):
-        extension = source_descriptor.file_extension
-        if extension == 'xml':
-            return XmlFlakeParser()
-        elif extension == 'yaml' or extension == 'yml':
-            return YamlFlakeParser()
-        elif extension == 'json':
-            return JsonFlakeParser()
-        else:
-            raise NoSuitableParserFound(extension)
+    def get_backends() -> Dict[str, str]:
+        """Name of the backend used for each kind of file which is decoded by a pluggable backend"""
+        return {
+            'json': JsonFlakeParser.backend.name,
+            'yaml': YamlFlakeParser.backend.name,
+        }
+
+
+class StreamingParserFactory(ParserFactory):
+    """Returns the same parsers as the ParserFactory, except xml files are parsed incrementally"""
+
+    parsers: Dict[str, Type[FlakeParser]] = {
+        'xml': StreamingXmlFlakeParser,
+    }
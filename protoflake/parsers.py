@@ -1,14 +1,12 @@
 import xml.etree.ElementTree as ElementTree
 from abc import ABC
 from abc import abstractmethod
-from json import loads as json_load
 from typing import Any
 from typing import Dict
+from typing import Iterator
 from typing import List
 from typing import Tuple
 
-from yaml import safe_load as yaml_load
-
 from protoflake.constants import XML_BOOL
 from protoflake.constants import XML_FLOAT
 from protoflake.constants import XML_INT
@@ -21,39 +19,39 @@ from protoflake.attributedescriptor import AttributeDescriptor
 from protoflake.descriptors import CodeSourceDescriptor
 from protoflake.descriptors import FileSourceDescriptor
 from protoflake.flakedescriptor import FlakeDescriptor
+from protoflake.parserbackends import ParserBackend
+from protoflake.parserbackends import json_backends
+from protoflake.parserbackends import select_backend
+from protoflake.parserbackends import yaml_backends
+from protoflake.parsererrors import InvalidPrimitive
+from protoflake.parsererrors import MissingFlakeId
+from protoflake.parsererrors import ParserException
 from protoflake.descriptors import ListAttributeDescriptor
 from protoflake.descriptors import NestedFlakeDescriptor
-from protoflake.descriptors import PrimitiveAttributeDescriptor
 from protoflake.descriptors import ReferenceAttributeDescriptor
+from protoflake.descriptorinterner import DescriptorInterner
+from protoflake.descriptorinterner import default_interner
 from protoflake.sourcedescriptor import SourceDescriptor
 from protoflake.descriptorbuilder import DescriptorBuilder
 
 
-class ParserException(Exception):
-    def __init__(self, msg: str, source: SourceDescriptor):
-        super().__init__(msg)
-        self.source = source
-
-
 class FlakeParser(ABC):
-    source: SourceDescriptor
+    """Parsers hold no state between calls, the source being parsed is passed along explicitly.
+    A single instance can therefore be reused for any number of files, from any number of threads.
+    """
+    interner: DescriptorInterner = default_interner
 
     def from_file(self, full_path: str) -> List[FlakeDescriptor]:
-        self.source = FileSourceDescriptor(full_path)
         with open(full_path, 'r') as file:
-            return self.parse(file.read())
+            return self.parse(file.read(), FileSourceDescriptor(full_path))
 
     def from_string(self, text: str, source_hint: str) -> List[FlakeDescriptor]:
-        self.source = CodeSourceDescriptor(source_hint)
-        return self.parse(text)
-
-    def get_source(self) -> SourceDescriptor:
-        return self.source
+        return self.parse(text, CodeSourceDescriptor(source_hint))
 
     @abstractmethod
-    def parse(self, text: str) -> List[FlakeDescriptor]:
+    def parse(self, text: str, source: SourceDescriptor) -> List[FlakeDescriptor]:
         """Given some string (text), process it and return a list of flake descriptor that were encountered
-        while parsing.
+        while parsing. source is where the text comes from, it is set on every descriptor.
         """
 
 
@@ -68,6 +66,7 @@ class XmlFlakeParser(FlakeParser):
         - Every file should have one root node, which tag should match the XML_ROOT constant
         - Under that root node only root flakes are allowed
         - Root flakes' tag should be their proto path
+        - flakes may have a __scope__ attribute set to singleton (the default), prototype or context
         - attributes should be prefixed with their types + '-' (int-, float-, bool-), or nothing for strings
         - children are either: list, flake-* or ref-* or primitives
         - primitives' tag are to be defined like their attribute names (same result)
@@ -82,58 +81,96 @@ class XmlFlakeParser(FlakeParser):
     See the tests for some example.
     """
 
-    def parse(self, text: str) -> List[FlakeDescriptor]:
+    def parse(self, text: str, source: SourceDescriptor) -> List[FlakeDescriptor]:
         root = ElementTree.fromstring(text)
         if root.tag != XML_ROOT:
-            raise InvalidXmlRootException(self.source)
-        return list(map(self.process_flake, root))
+            raise InvalidXmlRootException(source)
+        return [self.process_flake(node, source) for node in root]
 
-    def process_flake(self, node) -> FlakeDescriptor:
+    def iter_file(self, full_path: str) -> Iterator[FlakeDescriptor]:
+        """Incrementally parses the file, yielding every root flake as soon as its closing tag is read.
+        Root flakes are dropped from the tree once processed, so only one of them is held in memory at a time.
+        """
+        source = FileSourceDescriptor(full_path)
+        root = None
+        depth = 0
+        with open(full_path, 'rb') as file:
+            for event, node in ElementTree.iterparse(file, events=('start', 'end')):
+                if event == 'start':
+                    if root is None:
+                        if node.tag != XML_ROOT:
+                            raise InvalidXmlRootException(source)
+                        root = node
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth == 1:
+                    yield self.process_flake(node, source)
+                    root.clear()
+
+    def process_flake(self, node, source: SourceDescriptor) -> FlakeDescriptor:
         proto = node.tag
-        attrs = {**self.process_attrib(node), **self.process_sub_nodes(node)}
-        flake_id = attrs.get('id').value
-        source = self.source
-        return FlakeDescriptor(proto, flake_id, attrs, source)
+        attrs = {**self.process_attrib(node, source), **self.process_sub_nodes(node, source)}
+        flake_id = attrs.get('id')
+        if flake_id is None:
+            raise MissingFlakeId(proto, source)
+        return FlakeDescriptor(proto, flake_id.value, attrs, source)
 
-    def process_attrib(self, node) -> Dict[str, AttributeDescriptor]:
-        return dict(list(map(self.process_single_attr, node.attrib.items())))
+    def process_attrib(self, node, source: SourceDescriptor) -> Dict[str, AttributeDescriptor]:
+        return dict(self.process_single_attr(key_value, source) for key_value in node.attrib.items())
 
-    def process_sub_nodes(self, node) -> Dict[str, AttributeDescriptor]:
-        return dict(map(self.process_single_attr, [(child.tag, child) for child in node]))
+    def process_sub_nodes(self, node, source: SourceDescriptor) -> Dict[str, AttributeDescriptor]:
+        return dict(self.process_single_attr((child.tag, child), source) for child in node)
 
-    def process_nested_flake(self, key: str, node) -> Tuple[str, NestedFlakeDescriptor]:
-        return key, NestedFlakeDescriptor(self.process_flake(node[0]))
+    def process_nested_flake(self, key: str, node, source: SourceDescriptor) -> Tuple[str, NestedFlakeDescriptor]:
+        return key, NestedFlakeDescriptor(self.process_flake(node[0], source))
 
-    @staticmethod
-    def process_ref(key: str, node) -> Tuple[str, ReferenceAttributeDescriptor]:
+    def process_ref(self, key: str, node) -> Tuple[str, ReferenceAttributeDescriptor]:
         flake_id = node.attrib['id']
-        attr = ReferenceAttributeDescriptor(flake_id)
+        attr = self.interner.reference(flake_id)
         return key, attr
 
-    def process_list(self, key: str, node) -> Tuple[str, ListAttributeDescriptor]:
-        attrs = list(self.process_sub_nodes(node).values())
+    def process_list(self, key: str, node, source: SourceDescriptor) -> Tuple[str, ListAttributeDescriptor]:
+        attrs = list(self.process_sub_nodes(node, source).values())
         return key, ListAttributeDescriptor(attrs)
 
-    def process_single_attr(self, key_value: Tuple[str, Any]) -> Tuple[str, AttributeDescriptor]:
+    def process_single_attr(self, key_value: Tuple[str, Any], source: SourceDescriptor) \
+            -> Tuple[str, AttributeDescriptor]:
         key, value = key_value
         if key.startswith(XML_LIST):
-            return self.process_list(key[5:], value)
+            return self.process_list(key[5:], value, source)
         elif key.startswith(XML_REF):
             return self.process_ref(key[4:], value)
         elif key.startswith(XML_NESTED_FLAKE):
-            return self.process_nested_flake(key[6:], value)
+            return self.process_nested_flake(key[6:], value, source)
 
         if not isinstance(value, str):
             value = value.text
 
         if key.startswith(XML_INT):
-            return key[4:], PrimitiveAttributeDescriptor('int', int(value))
+            return self.interner.primitive_attr(key[4:], 'int', self.convert(key[4:], int, value, source))
         elif key.startswith(XML_BOOL):
-            return key[5:], PrimitiveAttributeDescriptor('bool', value == 'True')
+            return self.interner.primitive_attr(key[5:], 'bool', value == 'True')
         elif key.startswith(XML_FLOAT):
-            return key[6:], PrimitiveAttributeDescriptor('float', float(value))
+            return self.interner.primitive_attr(key[6:], 'float', self.convert(key[6:], float, value, source))
         else:
-            return key, PrimitiveAttributeDescriptor('str', value)
+            return self.interner.primitive_attr(key, 'str', value)
+
+    @staticmethod
+    def convert(key: str, primitive_type, text, source: SourceDescriptor):
+        try:
+            return primitive_type(text)
+        except (TypeError, ValueError):
+            raise InvalidPrimitive(key, primitive_type.__name__, text, source)
+
+
+class StreamingXmlFlakeParser(XmlFlakeParser):
+    """Same rules as the XmlFlakeParser, but files are parsed incrementally instead of being loaded whole.
+    Meant for very large files, where holding both their text and their complete element tree is too costly.
+    """
+
+    def from_file(self, full_path: str) -> List[FlakeDescriptor]:
+        return list(self.iter_file(full_path))
 
 
 class InvalidRootJson(Exception):
@@ -149,19 +186,27 @@ class JsonFlakeParser(FlakeParser):
         - List and primitives are natively supported by json, so these will work as expected.
         - ref members should have a is_flake_ref property which is truth-y (not null, not missing, not 0, not empty)
         - flakes members must have a proto property set to a string, and an id set to a string as well.
+        - flakes may have a __scope__ property set to singleton (the default), prototype or context.
 
+    The text is decoded by the stdlib json module unless another backend is picked, see parserbackends.
     """
+    backends = json_backends
+    backend: ParserBackend = select_backend(json_backends)
 
     def __init__(self):
         super().__init__()
         self.builder = DescriptorBuilder()
 
-    def parse(self, text: str) -> List[FlakeDescriptor]:
-        self.builder.set_source(self.source)
-        tree = json_load(text)
+    def parse(self, text: str, source: SourceDescriptor) -> List[FlakeDescriptor]:
+        tree = self.backend.load(text)
         if not isinstance(tree, list):
-            raise InvalidRootJson(self.source)
-        return list(map(lambda n: self.builder.process_node(n, True), tree))
+            raise InvalidRootJson(source)
+        return [self.builder.process_node(node, True, source) for node in tree]
+
+    @classmethod
+    def use_backend(cls, name: str = None):
+        """Switches every parser of this class to the named backend, or back to the fastest exact one"""
+        cls.backend = select_backend(cls.backends, name)
 
 
 class InvalidRootYaml(ParserException):
@@ -177,13 +222,14 @@ class YamlFlakeParser(JsonFlakeParser):
         - The root node must be a mapping with the YAML_ROOT key
         - The root node's value must be a list (and probably cannot be empty)
     """
+    backends = yaml_backends
+    backend: ParserBackend = select_backend(yaml_backends)
 
-    def parse(self, text: str) -> List[FlakeDescriptor]:
-        self.builder.set_source(self.source)
-        as_root = yaml_load(text)
+    def parse(self, text: str, source: SourceDescriptor) -> List[FlakeDescriptor]:
+        as_root = self.backend.load(text)
         if not isinstance(as_root, dict) or not as_root.get(YAML_ROOT):
-            raise InvalidRootYaml(self.source)
+            raise InvalidRootYaml(source)
         as_list = as_root.get(YAML_ROOT)
         if not isinstance(as_list, list):
-            raise InvalidRootYaml(self.source)
-        return list(map(lambda n: self.builder.process_node(n, True), as_list))
+            raise InvalidRootYaml(source)
+        return [self.builder.process_node(node, True, source) for node in as_list]
@@ -1,9 +1,21 @@
 """
 The proto registry allows us to only load proto classes once.
 It'll then store them and make them available through the get method
+Modules can also be preloaded, all at once and optionally from a background thread, so that
+the first flakes built do not pay for their imports. How long each module took to import is recorded,
+and reported to the instrumentation when there is one.
 """
 import importlib
 import inspect
+from threading import Thread
+from time import perf_counter
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from protoflake.instrumentation import Instrumentation
 
 
 class ProtoModuleNotFound(ImportError):
@@ -28,23 +40,40 @@ class ProtoRegistry(object):
 
     def __init__(self):
         self.module_registry = {}
+        # module name -> class name -> class
         self.class_registry = {}
+        # module name -> seconds spent importing it
+        self.import_times: Dict[str, float] = {}
+        # module name -> error raised while preloading it
+        self.import_errors: Dict[str, Exception] = {}
+        self.instrumentation: Optional[Instrumentation] = None
 
     def get(self, module: str, klass: str) -> object:
-        full_name = module + klass
-        if full_name not in self.class_registry:
-            self.class_registry[full_name] = self.load_proto(module, klass)
-        return self.class_registry[full_name]
+        module_classes = self.class_registry.get(module)
+        if module_classes is None:
+            module_classes = self.class_registry.setdefault(module, {})
+        proto = module_classes.get(klass)
+        if proto is None:
+            proto = module_classes[klass] = self.load_proto(module, klass)
+        return proto
 
-    def load_proto(self, module_name: str, klass_name: str) -> object:
-        if module_name in self.module_registry:
-            module = self.module_registry[module_name]
-        else:
-            try:
-                module = importlib.import_module(module_name)
-            except ImportError:
-                raise ProtoModuleNotFound(module_name, klass_name)
+    def load_module(self, module_name: str):
+        module = self.module_registry.get(module_name)
+        if module is None:
+            started = perf_counter()
+            module = importlib.import_module(module_name)
+            duration = self.import_times[module_name] = perf_counter() - started
             self.module_registry[module_name] = module
+            if self.instrumentation is not None:
+                self.instrumentation.proto_imported(module_name, duration)
+        return module
+
+    def load_proto(self, module_name: str, klass_name: str) -> object:
+        try:
+            module = self.load_module(module_name)
+        except (ImportError, ValueError):
+            # import_module raises a ValueError for empty or otherwise invalid module names
+            raise ProtoModuleNotFound(module_name, klass_name)
         try:
             klass = getattr(module, klass_name)
             if not inspect.isclass(klass):
@@ -52,3 +81,29 @@ class ProtoRegistry(object):
             return klass
         except AttributeError:
             raise ProtoClassNotFound(module_name, klass_name)
+
+    def preload(self, module_names: Iterable[str], background: bool = False) -> Optional[Thread]:
+        """Imports every given module which was not loaded yet.
+        Modules failing to import, whatever they raise, are skipped and their error recorded in import_errors,
+        it is raised again when a flake of that module is built.
+        :param background: import from a daemon thread, which is returned, instead of the calling one
+        """
+        module_names = list(module_names)
+        if not background:
+            self.import_modules(module_names)
+            return None
+        thread = Thread(target=self.import_modules, args=(module_names,), name='protoflake-preload', daemon=True)
+        thread.start()
+        return thread
+
+    def import_modules(self, module_names: List[str]):
+        for module_name in module_names:
+            try:
+                self.load_module(module_name)
+            except Exception as error:
+                # a module failing at import time must not stop the others, nor kill the background thread
+                self.import_errors[module_name] = error
+
+    def slowest_imports(self, count: int = 10) -> List[Tuple[str, float]]:
+        """(module name, seconds) of the slowest modules to import, slowest first"""
+        return sorted(self.import_times.items(), key=lambda item: item[1], reverse=True)[:count]
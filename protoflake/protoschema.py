@@ -0,0 +1,259 @@
+"""
+Optional validation of the discovered definitions against their protos, so that a bad definition fails when
+the definitions are loaded rather than when its flake is first built.
+A schema is compiled once per proto, from the class's annotations, __slots__ and __init__ parameters, then
+every definition of that proto is checked against it: unknown attributes, missing __init__ arguments,
+values of the wrong type and references to undefined flakes. Protos declaring neither annotations nor
+__slots__ accept any attribute name.
+The validator goes through the definitions once, nested flakes included, and reports every error found,
+grouped by the file they come from. Nothing is checked unless validate is called.
+"""
+import inspect
+import typing
+from dataclasses import dataclass
+from typing import Any
+from typing import Dict
+from typing import FrozenSet
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Tuple
+
+from protoflake.attributedescriptor import AttributeDescriptor
+from protoflake.constants import SCOPE_ATTRIBUTE
+from protoflake.descriptors import ListAttributeDescriptor
+from protoflake.descriptors import NestedFlakeDescriptor
+from protoflake.descriptors import PrimitiveAttributeDescriptor
+from protoflake.descriptors import ReferenceAttributeDescriptor
+from protoflake.flakedescriptor import FlakeDescriptor
+from protoflake.protoregistry import ProtoRegistry
+from protoflake.sourcedescriptor import SourceDescriptor
+
+# attributes every definition may have, whatever its proto declares
+RESERVED_ATTRIBUTES = ('id', 'proto', SCOPE_ATTRIBUTE)
+
+
+@dataclass
+class DefinitionError(object):
+    flake_id: str
+    # None when the error is about the whole definition
+    attr_name: Optional[str]
+    message: str
+    source: SourceDescriptor
+
+    def __str__(self):
+        if self.attr_name is None:
+            return 'flake %s: %s' % (self.flake_id, self.message)
+        return 'flake %s, attribute %s: %s' % (self.flake_id, self.attr_name, self.message)
+
+
+def get_source_name(source: SourceDescriptor) -> str:
+    return getattr(source, 'full_path', None) or getattr(source, 'hint', None) or '<unknown source>'
+
+
+class InvalidDefinitions(Exception):
+    def __init__(self, errors: List[DefinitionError], *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # source name -> errors of the definitions it holds, in discovery order
+        self.errors_by_source: Dict[str, List[DefinitionError]] = {}
+        for error in errors:
+            self.errors_by_source.setdefault(get_source_name(error.source), []).append(error)
+        self.errors = errors
+        lines = ['%d invalid definitions in %d sources' % (len(errors), len(self.errors_by_source))]
+        for source_name, source_errors in self.errors_by_source.items():
+            lines.append('  %s:' % source_name)
+            lines.extend('    %s' % error for error in source_errors)
+        self.msg = '\n'.join(lines)
+
+    def __str__(self):
+        return self.msg
+
+
+def get_annotations(proto) -> Dict[str, Any]:
+    """Annotations of the proto and its bases, the ones which cannot be evaluated are left as strings"""
+    try:
+        return typing.get_type_hints(proto)
+    except Exception:
+        annotations = {}
+        for klass in reversed(proto.__mro__):
+            annotations.update(klass.__dict__.get('__annotations__', {}))
+        return annotations
+
+
+def get_expected_type(annotation) -> Optional[type]:
+    """The class values of an attribute must be instances of, None when the annotation is not checked"""
+    origin = typing.get_origin(annotation) or annotation
+    if origin is Any or not isinstance(origin, type):
+        return None
+    try:
+        # protocols which are not runtime checkable refuse isinstance
+        isinstance(None, origin)
+    except TypeError:
+        return None
+    return origin
+
+
+def get_class_attributes(proto) -> List[str]:
+    """Names of the attributes the proto and its bases define, other than methods and dunders"""
+    return [
+        name for klass in proto.__mro__ for name, value in vars(klass).items()
+        if not name.startswith('__') and not callable(value) and not isinstance(value, (classmethod, staticmethod))
+    ]
+
+
+def get_slots(proto) -> Tuple[Tuple[str, ...], bool]:
+    """Slot names of the proto and its bases, and whether instances have nothing but slots"""
+    names = []
+    only_slots = True
+    for klass in proto.__mro__:
+        if klass is object:
+            continue
+        slots = klass.__dict__.get('__slots__')
+        if slots is None:
+            only_slots = False
+            continue
+        slots = (slots,) if isinstance(slots, str) else tuple(slots)
+        names.extend(slot for slot in slots if slot not in ('__dict__', '__weakref__'))
+        if '__dict__' in slots:
+            only_slots = False
+    return tuple(names), only_slots and bool(names)
+
+
+def get_init_parameters(proto) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Names of the keyword parameters of the proto's __init__, and of the required ones among them"""
+    try:
+        parameters = inspect.signature(proto).parameters.values()
+    except (TypeError, ValueError):
+        return (), ()
+    keyword_kinds = (inspect.Parameter.POSITIONAL_OR_KEYWORD, inspect.Parameter.KEYWORD_ONLY)
+    keywords = [parameter for parameter in parameters if parameter.kind in keyword_kinds]
+    required = tuple(parameter.name for parameter in keywords if parameter.default is inspect.Parameter.empty)
+    return tuple(parameter.name for parameter in keywords), required
+
+
+class ProtoSchema(object):
+    """What definitions of a proto may hold. Validators compile one per proto, see DefinitionValidator.get_schema"""
+
+    def __init__(self, names: Optional[FrozenSet[str]], types: Dict[str, type], required: Tuple[str, ...]):
+        # every attribute name allowed, None when any name is
+        self.names = names
+        # attribute name -> class its values must be instances of
+        self.types = types
+        # attributes which must be given, to be passed to __init__
+        self.required = required
+
+    @classmethod
+    def compile(cls, proto) -> 'ProtoSchema':
+        annotations = get_annotations(proto)
+        slot_names, only_slots = get_slots(proto)
+        init_names, required = get_init_parameters(proto)
+        names = None
+        if annotations or only_slots:
+            names = frozenset((
+                *RESERVED_ATTRIBUTES, *annotations, *slot_names, *init_names, *get_class_attributes(proto)))
+        types = {}
+        for attr_name, annotation in annotations.items():
+            expected = get_expected_type(annotation)
+            if expected is not None:
+                types[attr_name] = expected
+        return cls(names, types, required)
+
+
+class DefinitionValidator(object):
+    """Checks definitions against the schemas of their protos, importing the protos through the registry"""
+
+    def __init__(self, proto_registry: ProtoRegistry):
+        self.proto_registry = proto_registry
+        # proto -> its schema
+        self.schemas: Dict[Any, ProtoSchema] = {}
+
+    def get_schema(self, proto) -> ProtoSchema:
+        schema = self.schemas.get(proto)
+        if schema is None:
+            schema = self.schemas.setdefault(proto, ProtoSchema.compile(proto))
+        return schema
+
+    def validate(self, definitions: Mapping[str, FlakeDescriptor]):
+        """:raises InvalidDefinitions: listing every error found, grouped by source"""
+        errors = self.collect_errors(definitions)
+        if errors:
+            raise InvalidDefinitions(errors)
+
+    def collect_errors(self, definitions: Mapping[str, FlakeDescriptor]) -> List[DefinitionError]:
+        errors = []
+        # references are checked once every nested flake is known, since they can target those as well
+        references = []
+        nested_descriptors = {}
+        for descriptor in definitions.values():
+            self.check_flake(descriptor, errors, references, nested_descriptors)
+        for descriptor, attr_name, reference_id, expected in references:
+            target = definitions.get(reference_id) or nested_descriptors.get(reference_id)
+            if target is None:
+                errors.append(DefinitionError(
+                    descriptor.id, attr_name, 'references undefined flake %s' % reference_id, descriptor.source))
+            elif expected is not None:
+                self.check_flake_type(descriptor, attr_name, target, expected, errors)
+        return errors
+
+    def get_proto(self, descriptor: FlakeDescriptor):
+        """The proto of the descriptor, None when it cannot be imported"""
+        try:
+            return self.proto_registry.get(descriptor.proto_module, descriptor.proto_class)
+        except ImportError:
+            return None
+
+    def check_flake(self, descriptor: FlakeDescriptor, errors: List[DefinitionError], references: list,
+                    nested_descriptors: Dict[str, FlakeDescriptor]):
+        proto = self.get_proto(descriptor)
+        if proto is None:
+            errors.append(DefinitionError(
+                descriptor.id, None, 'proto %s cannot be imported' % descriptor.proto_name, descriptor.source))
+            schema = ProtoSchema(None, {}, ())
+        else:
+            schema = self.get_schema(proto)
+        for attr_name in schema.required:
+            if attr_name not in descriptor.attrs:
+                errors.append(DefinitionError(
+                    descriptor.id, attr_name, 'is required by %s' % descriptor.proto_name, descriptor.source))
+        names = schema.names
+        types = schema.types
+        for attr_name, attr_descriptor in descriptor.attrs.items():
+            if names is not None and attr_name not in names:
+                errors.append(DefinitionError(
+                    descriptor.id, attr_name, 'is not an attribute of %s' % descriptor.proto_name, descriptor.source))
+                continue
+            self.check_attr(descriptor, attr_name, attr_descriptor, types.get(attr_name), errors, references,
+                            nested_descriptors)
+
+    def check_attr(self, descriptor: FlakeDescriptor, attr_name: str, attr_descriptor: AttributeDescriptor,
+                   expected: Optional[type], errors: List[DefinitionError], references: list,
+                   nested_descriptors: Dict[str, FlakeDescriptor]):
+        attr_type = type(attr_descriptor)
+        if attr_type is PrimitiveAttributeDescriptor:
+            value = attr_descriptor.value
+            if expected is not None and not isinstance(value, expected) and \
+                    not (expected is float and type(value) is int):
+                errors.append(DefinitionError(descriptor.id, attr_name, '%r is not a %s' % (
+                    value, expected.__name__), descriptor.source))
+        elif attr_type is ReferenceAttributeDescriptor:
+            references.append((descriptor, attr_name, attr_descriptor.reference_flake_id, expected))
+        elif attr_type is NestedFlakeDescriptor:
+            nested = attr_descriptor.nested_descriptor
+            nested_descriptors[nested.id] = nested
+            self.check_flake(nested, errors, references, nested_descriptors)
+            if expected is not None:
+                self.check_flake_type(descriptor, attr_name, nested, expected, errors)
+        elif attr_type is ListAttributeDescriptor:
+            if expected is not None and not issubclass(list, expected):
+                errors.append(DefinitionError(descriptor.id, attr_name, 'a list is not a %s' % (
+                    expected.__name__,), descriptor.source))
+            for item in attr_descriptor.value:
+                self.check_attr(descriptor, attr_name, item, None, errors, references, nested_descriptors)
+
+    def check_flake_type(self, descriptor: FlakeDescriptor, attr_name: str, target: FlakeDescriptor,
+                         expected: type, errors: List[DefinitionError]):
+        proto = self.get_proto(target)
+        # protos which cannot be imported are reported on their own definition
+        if proto is not None and not issubclass(proto, expected):
+            errors.append(DefinitionError(descriptor.id, attr_name, 'flake %s of proto %s is not a %s' % (
+                target.id, target.proto_name, expected.__name__), descriptor.source))
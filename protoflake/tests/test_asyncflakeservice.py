@@ -0,0 +1,118 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import Mock
+
+from protoflake import FlakeContainer
+from protoflake.asyncflakeservice import AsyncFlakeService
+from protoflake.discoveryservice import DiscoveryService
+from protoflake.flakebuilder import FlakeBuilder
+from protoflake.flakefactory import FlakeFactory
+from protoflake.flakeregistry import FlakeRegistry
+from protoflake.flakeservice import FlakeService
+from protoflake.listdiscoverer import ListDiscoverer
+
+
+class TestAsyncFlakeService(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        built = self.built = []
+        initialized = self.initialized = []
+
+        class Proto:
+            def __init__(self):
+                built.append(threading.get_ident())
+
+            async def __flake_async_init__(self):
+                await asyncio.sleep(0)
+                initialized.append(self.id)
+
+        self.proto_registry = Mock()
+        self.proto_registry.get.return_value = Proto
+        self.discovery_service = DiscoveryService(Mock(), ListDiscoverer)
+        self.discovery_service.from_list([
+            {'id': 'ui', 'proto': 'test.Proto', 'service': {'id': 'service', 'is_flake_ref': True}},
+            {'id': 'service', 'proto': 'test.Proto', 'nested': {'id': 'nested', 'proto': 'test.Proto'}},
+        ])
+        self.make_service()
+
+    def make_service(self, lazy=False):
+        builder = FlakeBuilder(FlakeFactory(), FlakeRegistry(), self.proto_registry, self.discovery_service, lazy)
+        self.flake_service = FlakeService(self.discovery_service, builder)
+        self.service = AsyncFlakeService(self.flake_service, self.discovery_service)
+
+    async def test_it_builds_off_the_event_loop(self):
+        flake = await self.service.get('ui')
+        self.assertEqual('service', flake.service.id)
+        self.assertNotIn(threading.get_ident(), self.built)
+
+    async def test_concurrent_gets_share_one_build(self):
+        flakes = await asyncio.gather(*[self.service.get('ui') for _ in range(20)])
+        self.assertTrue(all(flake is flakes[0] for flake in flakes))
+        self.assertEqual(3, len(self.built))
+        self.assertEqual({}, self.service.pending)
+
+    async def test_hooks_run_once_dependencies_first(self):
+        await asyncio.gather(self.service.get('ui'), self.service.get('service'))
+        await self.service.get('ui')
+        self.assertEqual(['nested', 'service', 'ui'], self.initialized)
+
+    async def test_flakes_without_hook_are_fine(self):
+        self.proto_registry.get.return_value = type('Plain', (object,), {})
+        flake = await self.service.get('service')
+        self.assertEqual('nested', flake.nested.id)
+
+    async def test_failed_hook_is_retried(self):
+        calls = []
+
+        class Failing:
+            async def __flake_async_init__(self):
+                calls.append(self)
+                if len(calls) == 1:
+                    raise RuntimeError('not yet')
+
+        self.proto_registry.get.return_value = Failing
+        with self.assertRaises(RuntimeError):
+            await self.service.get('ui')
+        await self.service.get('ui')
+        # the first hook failed, then all three flakes got initialized
+        self.assertEqual(4, len(calls))
+
+    async def test_each_prototype_is_built_off_the_loop_and_initialized(self):
+        self.discovery_service.from_list([
+            {'id': 'handler', 'proto': 'test.Proto', '__scope__': 'prototype',
+             'service': {'id': 'service', 'is_flake_ref': True}},
+        ])
+        first = await self.service.get('handler')
+        second = await self.service.get('handler')
+        self.assertIsNot(first, second)
+        self.assertEqual(['nested', 'service', 'handler', 'handler'], self.initialized)
+        self.assertNotIn(threading.get_ident(), self.built)
+        self.assertNotIn('handler', self.service.ready)
+
+    async def test_built_flakes_are_found_without_the_whole_graph(self):
+        await self.service.get('ui')
+        self.assertIsNone(self.discovery_service.dependency_graph)
+        self.assertEqual(['nested', 'service', 'ui'], self.initialized)
+
+    async def test_lazy_mode_allows_cycles(self):
+        self.discovery_service.from_list([
+            {'id': 'a', 'proto': 'test.Proto', 'to': {'id': 'b', 'is_flake_ref': True}},
+            {'id': 'b', 'proto': 'test.Proto', 'to': {'id': 'a', 'is_flake_ref': True}},
+        ])
+        self.make_service(lazy=True)
+        flake = await self.service.get('a')
+        self.assertEqual('a', flake.to.to.id)
+        self.assertEqual(['a'], self.initialized)
+
+
+class TestAsyncContainer(unittest.IsolatedAsyncioTestCase):
+
+    async def test_it_loads_files_and_gets_flakes(self):
+        container = FlakeContainer()
+        container.proto_registry = Mock()
+        container.builder.proto_registry = container.proto_registry
+        container.proto_registry.get.return_value = type('Body', (object,), {})
+        await container.afrom_files(['./protoflake/tests/test_data/simple_file.xml'])
+        flake = await container.aget('first flake')
+        self.assertIs(container.get('first flake'), flake)
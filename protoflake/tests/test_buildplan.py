@@ -0,0 +1,82 @@
+import unittest
+from unittest.mock import Mock
+
+from protoflake.buildplan import BuildPlan
+from protoflake.buildplan import OP_BEGIN
+from protoflake.buildplan import OP_COPY
+from protoflake.buildplan import OP_LIST
+from protoflake.buildplan import OP_MAKE
+from protoflake.buildplan import OP_NEW
+from protoflake.buildplan import OP_REF
+from protoflake.descriptorbuilder import DescriptorBuilder
+from protoflake.discoveryservice import DiscoveryService
+from protoflake.flakebuilder import FlakeBuilder
+from protoflake.flakefactory import FlakeFactory
+from protoflake.flakeregistry import FlakeRegistry
+from protoflake.listdiscoverer import ListDiscoverer
+
+
+class TestBuildPlan(unittest.TestCase):
+
+    def setUp(self) -> None:
+        class FakeProto:
+            pass
+
+        self.proto_registry = Mock()
+        self.proto_registry.get.return_value = FakeProto
+        self.discovery_service = DiscoveryService(Mock(), ListDiscoverer)
+        self.discovery_service.from_list([{'id': 'service', 'proto': 'test.Service'}])
+        self.builder = FlakeBuilder(FlakeFactory(), FlakeRegistry(), self.proto_registry, self.discovery_service)
+        self.descriptor = DescriptorBuilder().build_flake_descriptor({
+            'id': 'handler',
+            'proto': 'test.Handler',
+            'name': 'handler',
+            'sizes': [1, 2],
+            'empty': [],
+            'services': [{'id': 'service', 'is_flake_ref': True}, [3]],
+            'child': {'id': 'child', 'proto': 'test.Child', 'service': {'id': 'service', 'is_flake_ref': True}},
+        })
+
+    def test_primitives_go_in_the_template(self):
+        plan = BuildPlan.compile(self.descriptor, self.proto_registry)
+        self.assertEqual('handler', plan.template['name'])
+        self.assertEqual(list(self.descriptor.attrs), list(plan.template))
+        self.assertEqual([OP_COPY, OP_COPY, OP_REF, OP_COPY, OP_LIST, OP_NEW],
+                         [opcode for opcode, _, _ in plan.instructions])
+
+    def test_nested_flakes_can_be_built_in_place(self):
+        plan = BuildPlan.compile(self.descriptor, self.proto_registry, fresh_nested=True)
+        self.assertEqual([OP_BEGIN, OP_REF, OP_MAKE], [opcode for opcode, _, _ in plan.instructions][-3:])
+
+    def test_it_computes_the_same_data_as_the_descriptor(self):
+        plan = BuildPlan.compile(self.descriptor, self.proto_registry)
+        data = plan.run(self.builder)
+        expected = FlakeBuilder(FlakeFactory(), FlakeRegistry(), self.proto_registry, self.discovery_service) \
+            .collect_data_from_descriptor(self.descriptor)
+        self.assertEqual(list(expected), list(data))
+        self.assertEqual([1, 2], data['sizes'])
+        self.assertEqual([], data['empty'])
+        self.assertIs(self.builder.get_ref('service'), data['services'][0])
+        self.assertEqual([3], data['services'][1])
+        self.assertIs(self.builder.get_ref('child'), data['child'])
+
+    def test_each_run_gets_new_lists_and_nested_flakes(self):
+        plan = BuildPlan.compile(self.descriptor, self.proto_registry, fresh_nested=True)
+        first = self.builder.build_from_plan(plan)
+        second = self.builder.build_from_plan(plan)
+        self.assertIsNot(first, second)
+        self.assertIsNot(first.sizes, second.sizes)
+        self.assertIsNot(first.child, second.child)
+        self.assertIs(first.child.service, second.child.service)
+        self.assertFalse(self.builder.has('child'))
+        self.assertFalse(self.builder.has('handler'))
+
+    def test_failing_runs_leave_nothing_on_the_building_stack(self):
+        descriptor = DescriptorBuilder().build_flake_descriptor({
+            'id': 'broken', 'proto': 'test.Broken',
+            'child': {'id': 'child', 'proto': 'test.Child', 'missing': {'id': 'missing', 'is_flake_ref': True}},
+        })
+        plan = BuildPlan.compile(descriptor, self.proto_registry, fresh_nested=True)
+        with self.assertRaises(KeyError):
+            self.builder.build_from_plan(plan)
+        self.assertEqual([], self.builder.building)
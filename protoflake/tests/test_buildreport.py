@@ -0,0 +1,23 @@
+import unittest
+
+from protoflake.buildreport import BuildReport
+
+
+class TestBuildReport(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.report = BuildReport()
+        self.report.add('fast', 'a.Fast', 0.1)
+        self.report.add('slow', 'a.Slow', 0.5)
+        self.report.add('other fast', 'a.Fast', 0.3)
+
+    def test_it_counts_built_flakes(self):
+        self.assertEqual(3, self.report.built_count)
+
+    def test_it_returns_the_slowest_flakes_first(self):
+        self.assertEqual(['slow', 'other fast'], [timing.flake_id for timing in self.report.slowest(2)])
+
+    def test_it_sums_durations_per_proto(self):
+        by_proto = self.report.by_proto()
+        self.assertEqual(['a.Slow', 'a.Fast'], list(by_proto))
+        self.assertAlmostEqual(0.4, by_proto['a.Fast'])
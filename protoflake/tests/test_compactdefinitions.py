@@ -0,0 +1,78 @@
+import unittest
+
+from protoflake.compactdefinitions import CompactDefinitions
+from protoflake.compactdefinitions import PackedFlake
+from protoflake.descriptorbuilder import DescriptorBuilder
+from protoflake.descriptorinterner import DescriptorInterner
+from protoflake.descriptors import CodeSourceDescriptor
+from protoflake.descriptors import FileSourceDescriptor
+from protoflake.descriptors import PrimitiveAttributeDescriptor
+from protoflake.flakedescriptor import FlakeDescriptor
+
+
+class TestCompactDefinitions(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.interner = DescriptorInterner()
+        self.descriptor_builder = DescriptorBuilder(self.interner)
+        self.definitions = CompactDefinitions(self.interner)
+        self.source = CodeSourceDescriptor('test')
+
+    def build(self, node):
+        return self.descriptor_builder.build_flake_descriptor({'proto': 'test.Class', **node}, self.source)
+
+    def test_definitions_read_back_equal(self):
+        descriptor = self.build({
+            'id': 'first',
+            'count': 3,
+            'ratio': 0.5,
+            'on': True,
+            'values': [1, 'two', [3.0]],
+            'ref': {'id': 'other', 'is_flake_ref': True},
+            'child': {'proto': 'test.Child', 'id': 'child', 'name': 'nested'},
+        })
+        self.definitions['first'] = descriptor
+        self.assertEqual(descriptor, self.definitions['first'])
+        self.assertEqual('Child', self.definitions['first'].attrs['child'].nested_descriptor.proto_class)
+
+    def test_protos_keys_and_sources_are_shared(self):
+        self.definitions['first'] = self.build({'id': 'first', 'size': 1})
+        self.definitions['second'] = self.build({'id': 'second', 'size': 2})
+        first = self.definitions.get_packed('first')
+        second = self.definitions.get_packed('second')
+        self.assertIs(first.proto_name, second.proto_name)
+        self.assertIs(first.keys, second.keys)
+        self.assertIs(self.source, second.source)
+
+    def test_sources_are_shared_by_location(self):
+        for _ in range(3):
+            descriptor = self.descriptor_builder.build_flake_descriptor(
+                {'proto': 'test.Class', 'id': 'first'}, FileSourceDescriptor('flakes.xml'))
+            self.definitions['first'] = descriptor
+        self.definitions['second'] = self.build({'id': 'second'})
+        self.assertEqual(2, len(self.definitions.sources))
+        self.assertEqual('flakes.xml', self.definitions['first'].source.full_path)
+
+    def test_unique_primitives_are_stored_raw(self):
+        self.definitions['first'] = self.build({'id': 'first', 'size': 1})
+        packed = self.definitions.get_packed('first')
+        self.assertEqual('first', packed.values[packed.keys.index('id')])
+        self.assertIs(self.interner.primitive('int', 1), packed.values[packed.keys.index('size')])
+
+    def test_primitives_of_unexpected_type_are_kept(self):
+        odd = PrimitiveAttributeDescriptor('int', '3')
+        self.definitions['first'] = FlakeDescriptor('test.Class', 'first', {'odd': odd}, None)
+        self.assertIs(odd, self.definitions['first'].attrs['odd'])
+
+    def test_it_behaves_like_a_dict(self):
+        self.definitions['first'] = self.build({'id': 'first'})
+        packed = self.definitions.pack(self.build({'id': 'second'}))
+        self.definitions['second'] = packed
+        self.assertIs(packed, self.definitions.get_packed('second'))
+        self.assertIsInstance(packed, PackedFlake)
+        self.assertEqual(['first', 'second'], list(self.definitions))
+        self.assertEqual(2, len(self.definitions))
+        del self.definitions['first']
+        self.assertNotIn('first', self.definitions)
+        self.assertIsNone(self.definitions.get('first'))
+        self.assertEqual(['second'], [descriptor.id for descriptor in self.definitions.values()])
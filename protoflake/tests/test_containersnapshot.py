@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from protoflake import FlakeContainer
+from protoflake.containersnapshot import ContainerSnapshot
+from protoflake.containersnapshot import SnapshotError
+from protoflake.constants import XML_ROOT
+
+
+class Service(object):
+    pass
+
+
+class Client(object):
+    pass
+
+
+class TestContainerSnapshot(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.snapshot_path = os.path.join(self.temp_dir, 'container.snapshot')
+        self.file_path = os.path.join(self.temp_dir, 'flakes.xml')
+        self.write_flakes('<%s.Service id="service" />' % __name__)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def write_flakes(self, extra=''):
+        with open(self.file_path, 'w') as file:
+            file.write('''
+            <%s>
+                <%s.Client id="first"><ref-service id="service" /></%s.Client>
+                <%s.Client id="second"><ref-service id="service" /></%s.Client>
+                %s
+            </%s>''' % (XML_ROOT, __name__, __name__, __name__, __name__, extra, XML_ROOT))
+
+    def built_container(self):
+        container = FlakeContainer()
+        container.from_files([self.file_path])
+        container.build_all()
+        return container
+
+    def test_restoring_keeps_shared_references(self):
+        self.built_container().snapshot(self.snapshot_path)
+        container = FlakeContainer()
+        self.assertTrue(container.restore(self.snapshot_path, [self.file_path]))
+        self.assertTrue(container.builder.has('first'))
+        self.assertIs(container.get('first').service, container.get('second').service)
+        self.assertIs(container.get('service'), container.get('first').service)
+
+    def test_lazy_containers_keep_shared_references(self):
+        container = FlakeContainer(lazy=True)
+        container.from_files([self.file_path])
+        container.get('first')
+        container.snapshot(self.snapshot_path)
+        restored = FlakeContainer(lazy=True)
+        self.assertTrue(restored.restore(self.snapshot_path))
+        self.assertTrue(restored.builder.has('service'))
+        self.assertIs(restored.get('service'), restored.get('first').service)
+
+    def test_restoring_also_restores_definitions(self):
+        container = FlakeContainer()
+        container.from_files([self.file_path])
+        container.snapshot(self.snapshot_path)
+        restored = FlakeContainer()
+        self.assertTrue(restored.restore(self.snapshot_path))
+        self.assertIsInstance(restored.get('first').service, Service)
+
+    def test_it_refuses_outdated_snapshots(self):
+        self.built_container().snapshot(self.snapshot_path)
+        self.write_flakes('<%s.Service id="service" /><%s.Service id="other" />' % (__name__, __name__))
+        self.assertFalse(FlakeContainer().restore(self.snapshot_path))
+
+    def test_files_edited_after_discovery_do_not_match_the_snapshot(self):
+        container = self.built_container()
+        self.write_flakes('<%s.Service id="service" /><%s.Service id="other" />' % (__name__, __name__))
+        container.snapshot(self.snapshot_path)
+        self.assertFalse(FlakeContainer().restore(self.snapshot_path))
+
+    def test_restored_files_are_reloaded_once_edited(self):
+        self.built_container().snapshot(self.snapshot_path)
+        container = FlakeContainer()
+        self.assertTrue(container.restore(self.snapshot_path))
+        self.write_flakes('<%s.Service id="service" /><%s.Service id="other" />' % (__name__, __name__))
+        self.assertIn('service', container.reload())
+        self.assertIsInstance(container.get('other'), Service)
+
+    def test_it_refuses_snapshots_of_other_files(self):
+        self.built_container().snapshot(self.snapshot_path)
+        self.assertFalse(FlakeContainer().restore(self.snapshot_path, [self.file_path, self.file_path]))
+
+    def test_it_refuses_missing_or_corrupted_snapshots(self):
+        self.assertFalse(FlakeContainer().restore(self.snapshot_path))
+        with open(self.snapshot_path, 'wb') as file:
+            file.write(b'garbage')
+        self.assertIsNone(ContainerSnapshot.load(self.snapshot_path))
+
+    def test_from_snapshot_builds_then_restores(self):
+        self.assertFalse(FlakeContainer().from_snapshot(self.snapshot_path, [self.file_path]))
+        container = FlakeContainer()
+        self.assertTrue(container.from_snapshot(self.snapshot_path, [self.file_path]))
+        self.assertIsInstance(container.get('second'), Client)
+
+    def test_unpicklable_flakes_raise_snapshot_error(self):
+        class Local(object):
+            pass
+
+        container = FlakeContainer()
+        container.flake_registry.set('local', Local())
+        with self.assertRaises(SnapshotError):
+            container.snapshot(self.snapshot_path)
+        self.assertEqual(['flakes.xml'], os.listdir(self.temp_dir))
@@ -0,0 +1,97 @@
+import json
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from protoflake.bundlediscoverer import BundleDiscoverer
+from protoflake.definitionbundle import BUNDLE_HEADER
+from protoflake.definitionbundle import DefinitionBundle
+from protoflake.definitionbundle import InvalidBundle
+from protoflake.definitionbundle import compile_bundle
+from protoflake.definitionbundle import encode_attr
+from protoflake.descriptors import PrimitiveAttributeDescriptor
+from protoflake.filediscoverer import FileDiscoverer
+from protoflake.parserfactory import ParserFactory
+
+
+class TestDefinitionBundle(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_paths = [
+            self.write('first.json', [
+                {'proto': 'test.Service', 'id': 'service', 'name': 'first', 'ratio': 0.5, 'on': True},
+                {'proto': 'test.Service', 'id': 'overridden', 'name': 'first'},
+            ]),
+            self.write('second.json', [
+                {'proto': 'test.Handler', 'id': 'handler', 'sizes': [1, [2]],
+                 'service': {'id': 'service', 'is_flake_ref': True},
+                 'child': {'proto': 'test.Child', 'id': 'child', 'grand_child': {'proto': 'test.Child', 'id': 'leaf'}}},
+                {'proto': 'test.Service', 'id': 'overridden', 'name': 'second'},
+            ]),
+        ]
+        self.bundle_path = os.path.join(self.temp_dir, 'definitions.pfb')
+        self.count = compile_bundle(self.file_paths, self.bundle_path)
+        self.bundle = DefinitionBundle.open(self.bundle_path)
+
+    def tearDown(self) -> None:
+        self.bundle.close()
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, name, definitions):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w') as file:
+            json.dump(definitions, file)
+        return path
+
+    def test_it_holds_the_parsed_definitions(self):
+        parsed = {descriptor.id: descriptor for descriptor in FileDiscoverer(ParserFactory, self.file_paths).discover()}
+        self.assertEqual(3, self.count)
+        self.assertEqual(3, len(self.bundle))
+        self.assertEqual(list(parsed), list(self.bundle))
+        for flake_id, descriptor in parsed.items():
+            self.assertEqual(descriptor, self.bundle[flake_id])
+
+    def test_the_last_definition_wins(self):
+        self.assertEqual('second', self.bundle['overridden'].attrs['name'].value)
+
+    def test_definitions_are_decoded_on_demand(self):
+        self.assertEqual({}, self.bundle.decoded)
+        self.assertIn('handler', self.bundle)
+        self.assertEqual(['handler'], list(self.bundle.decoded))
+        self.assertIs(self.bundle['handler'], self.bundle['handler'])
+
+    def test_sources_are_shared(self):
+        self.assertIs(self.bundle['handler'].source, self.bundle['overridden'].source)
+        self.assertEqual(self.file_paths[1], self.bundle['handler'].source.full_path)
+
+    def test_nested_flakes_are_not_root_definitions(self):
+        self.assertNotIn('leaf', self.bundle)
+        self.assertNotIn('unknown', self.bundle)
+        with self.assertRaises(KeyError):
+            self.bundle['leaf']
+
+    def test_nested_flakes_know_their_owner(self):
+        self.assertEqual('handler', self.bundle.get_owner_id('child'))
+        self.assertEqual('handler', self.bundle.get_owner_id('leaf'))
+        self.assertIsNone(self.bundle.get_owner_id('handler'))
+
+    def test_primitives_not_named_after_their_type_are_kept(self):
+        self.assertEqual(PrimitiveAttributeDescriptor('float', 3),
+                         self.bundle.decode_attr(encode_attr(PrimitiveAttributeDescriptor('float', 3)), None))
+
+    def test_the_discoverer_decodes_everything(self):
+        self.assertEqual(['service', 'overridden', 'handler'],
+                         [descriptor.id for descriptor in BundleDiscoverer(self.bundle_path).discover()])
+
+    def test_invalid_bundles_are_rejected(self):
+        with open(self.bundle_path, 'r+b') as bundle:
+            bundle.write(struct.pack('<4s', b'NOPE'))
+        with self.assertRaises(InvalidBundle):
+            DefinitionBundle.open(self.bundle_path)
+        with open(self.bundle_path, 'wb') as bundle:
+            bundle.write(b'\0' * (BUNDLE_HEADER.size - 1))
+        with self.assertRaises(InvalidBundle):
+            DefinitionBundle.open(self.bundle_path)
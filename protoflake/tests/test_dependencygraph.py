@@ -0,0 +1,154 @@
+import unittest
+
+from protoflake.dependencygraph import DependencyCycle
+from protoflake.dependencygraph import DependencyGraph
+from protoflake.dependencygraph import UndefinedFlake
+from protoflake.descriptorbuilder import DescriptorBuilder
+
+
+def ref(flake_id):
+    return {'id': flake_id, 'is_flake_ref': True}
+
+
+class TestDependencyGraph(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.descriptor_builder = DescriptorBuilder()
+
+    def graph(self, *nodes):
+        definitions = {}
+        for node in nodes:
+            descriptor = self.descriptor_builder.build_flake_descriptor({'proto': 'test.class', **node})
+            definitions[descriptor.id] = descriptor
+        return DependencyGraph(definitions)
+
+    def test_it_orders_dependencies_first(self):
+        graph = self.graph(
+            {'id': 'ui', 'service': ref('service')},
+            {'id': 'service', 'db': ref('db')},
+            {'id': 'db'},
+        )
+        self.assertEqual(['db', 'service', 'ui'], graph.build_order())
+
+    def test_it_finds_references_in_lists_and_nested_flakes(self):
+        graph = self.graph(
+            {'id': 'parent', 'children': [ref('first'), {'proto': 'test.class', 'id': 'child', 'to': ref('second')}]},
+            {'id': 'first'},
+            {'id': 'second'},
+        )
+        self.assertEqual(['first', 'second'], graph.get_dependencies('parent'))
+
+    def test_references_to_nested_flakes_depend_on_their_owner(self):
+        graph = self.graph(
+            {'id': 'user', 'child': ref('child')},
+            {'id': 'owner', 'nested': {'proto': 'test.class', 'id': 'child'}},
+        )
+        self.assertEqual(['owner'], graph.get_dependencies('user'))
+        self.assertEqual(['owner'], graph.build_order(['child']))
+
+    def test_it_only_orders_the_requested_flakes_and_their_dependencies(self):
+        graph = self.graph(
+            {'id': 'ui', 'service': ref('service')},
+            {'id': 'service'},
+            {'id': 'unrelated'},
+        )
+        self.assertEqual(['service', 'ui'], graph.build_order(['ui']))
+
+    def test_references_between_nested_flakes_of_one_root_are_not_dependencies(self):
+        graph = self.graph(
+            {'id': 'a', 'b': {'proto': 'test.class', 'id': 'b'},
+             'c': {'proto': 'test.class', 'id': 'c', 'to': ref('b')}},
+        )
+        self.assertEqual([], graph.get_dependencies('a'))
+        self.assertEqual(['a'], graph.build_order())
+
+    def test_a_root_referencing_itself_is_a_cycle(self):
+        graph = self.graph({'id': 'a', 'child': {'proto': 'test.class', 'id': 'b', 'to': ref('a')}})
+        with self.assertRaises(DependencyCycle):
+            graph.build_order()
+
+    def test_unknown_references_name_their_referrer(self):
+        graph = self.graph({'id': 'ui', 'service': ref('nowhere')})
+        with self.assertRaises(UndefinedFlake) as raised:
+            graph.build_order()
+        self.assertEqual(('nowhere', 'ui'), (raised.exception.flake_id, raised.exception.referrer_id))
+
+    def test_unknown_references_can_be_allowed(self):
+        graph = self.graph({'id': 'ui', 'service': ref('nowhere')})
+        self.assertEqual(['ui'], graph.build_order(allow_undefined=True))
+
+    def test_unknown_ids_are_not_ordered(self):
+        graph = self.graph({'id': 'ui'})
+        with self.assertRaises(UndefinedFlake) as raised:
+            graph.build_order(['nope'])
+        self.assertEqual('No flake is defined with id nope', raised.exception.msg)
+
+    def test_it_detects_cycles(self):
+        graph = self.graph(
+            {'id': 'a', 'to': ref('b')},
+            {'id': 'b', 'to': ref('c')},
+            {'id': 'c', 'to': ref('a')},
+        )
+        with self.assertRaises(DependencyCycle) as context:
+            graph.build_order(['a'])
+        self.assertEqual(['a', 'b', 'c', 'a'], context.exception.cycle)
+
+    def test_cycles_can_be_allowed(self):
+        graph = self.graph(
+            {'id': 'a', 'to': ref('b')},
+            {'id': 'b', 'to': ref('a')},
+        )
+        self.assertEqual(['b', 'a'], graph.build_order(['a'], allow_cycles=True))
+
+    def test_it_handles_long_chains(self):
+        nodes = [{'id': 'flake-%d' % index, 'next': ref('flake-%d' % (index + 1))} for index in range(5000)]
+        order = self.graph(*nodes).build_order(['flake-0'], allow_undefined=True)
+        self.assertEqual('flake-4999', order[0])
+        self.assertEqual('flake-0', order[-1])
+
+
+class TestIncrementalDependencyGraph(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.descriptor_builder = DescriptorBuilder()
+        self.graph = DependencyGraph()
+
+    def add(self, node):
+        self.graph.add(self.descriptor_builder.build_flake_descriptor({'proto': 'test.class', **node}))
+
+    def test_references_resolve_once_their_target_is_added(self):
+        self.add({'id': 'ui', 'service': ref('service')})
+        self.assertEqual([], self.graph.get_dependencies('ui'))
+        self.add({'id': 'service'})
+        self.assertEqual(['service'], self.graph.get_dependencies('ui'))
+        self.assertEqual({'ui'}, self.graph.get_dependents('service'))
+
+    def test_dependents_include_references_to_nested_flakes(self):
+        self.add({'id': 'owner', 'child': {'proto': 'test.class', 'id': 'child'}})
+        self.add({'id': 'user', 'to': ref('child')})
+        self.assertEqual({'user'}, self.graph.get_dependents('owner'))
+
+    def test_replacing_a_definition_updates_both_directions(self):
+        self.add({'id': 'ui', 'to': ref('first')})
+        self.add({'id': 'first'})
+        self.add({'id': 'second'})
+        self.add({'id': 'ui', 'to': ref('second')})
+        self.assertEqual(['second'], self.graph.get_dependencies('ui'))
+        self.assertEqual(set(), self.graph.get_dependents('first'))
+        self.assertEqual({'ui'}, self.graph.get_dependents('second'))
+
+    def test_removing_a_definition(self):
+        self.add({'id': 'owner', 'child': {'proto': 'test.class', 'id': 'child', 'to': ref('db')}})
+        self.add({'id': 'db'})
+        self.graph.remove('owner')
+        self.assertNotIn('owner', self.graph)
+        self.assertEqual({}, self.graph.owners)
+        self.assertEqual(set(), self.graph.get_dependents('db'))
+
+    def test_transitive_closures(self):
+        self.add({'id': 'ui', 'to': ref('service')})
+        self.add({'id': 'service', 'to': ref('db')})
+        self.add({'id': 'db'})
+        self.add({'id': 'other'})
+        self.assertEqual({'ui', 'service', 'db'}, self.graph.get_dependencies_closure(['ui']))
+        self.assertEqual({'ui', 'service', 'db'}, self.graph.get_dependents_closure(['db']))
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from protoflake.descriptorcache import DescriptorCache
+from protoflake.parsers import XmlFlakeParser
+
+
+SIMPLE_FILE = './protoflake/tests/test_data/simple_file.xml'
+
+
+class TestDescriptorCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = DescriptorCache(os.path.join(self.temp_dir, 'cache'))
+        self.file_path = os.path.join(self.temp_dir, 'flakes.xml')
+        shutil.copy(SIMPLE_FILE, self.file_path)
+        self.descriptors = XmlFlakeParser().from_file(self.file_path)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def test_it_misses_when_nothing_was_cached(self):
+        self.assertIsNone(self.cache.get(self.file_path))
+        self.assertEqual(self.cache.stats.misses, 1)
+        self.assertEqual(self.cache.stats.hits, 0)
+
+    def test_it_hits_once_cached(self):
+        self.cache.set(self.file_path, self.descriptors)
+        cached = self.cache.get(self.file_path)
+        self.assertEqual(cached, self.descriptors)
+        self.assertEqual(self.cache.stats.hits, 1)
+        self.assertEqual(self.cache.stats.writes, 1)
+        self.assertEqual(self.cache.stats.hit_ratio, 1.0)
+
+    def test_it_misses_when_the_file_changed(self):
+        self.cache.set(self.file_path, self.descriptors)
+        with open(self.file_path, 'a') as file:
+            file.write('\n')
+        self.assertIsNone(self.cache.get(self.file_path))
+
+    def test_it_still_hits_when_the_file_was_only_touched(self):
+        self.cache.set(self.file_path, self.descriptors)
+        stat = os.stat(self.file_path)
+        os.utime(self.file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(self.cache.get(self.file_path), self.descriptors)
+
+    def test_it_misses_on_a_corrupted_entry(self):
+        self.cache.set(self.file_path, self.descriptors)
+        with open(self.cache.get_entry_path(self.file_path), 'wb') as entry:
+            entry.write(b'garbage')
+        self.assertIsNone(self.cache.get(self.file_path))
+
+    def test_clear_removes_every_entry(self):
+        self.cache.set(self.file_path, self.descriptors)
+        self.cache.clear()
+        self.assertIsNone(self.cache.get(self.file_path))
@@ -0,0 +1,61 @@
+import unittest
+
+from protoflake.descriptorbuilder import DescriptorBuilder
+from protoflake.descriptorinterner import DescriptorInterner
+from protoflake.descriptors import PrimitiveAttributeDescriptor
+from protoflake.parsers import XmlFlakeParser
+from protoflake.constants import XML_ROOT
+
+
+class TestDescriptorInterner(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.interner = DescriptorInterner()
+
+    def test_equal_primitives_are_shared(self):
+        self.assertIs(self.interner.primitive('bool', True), self.interner.primitive('bool', True))
+        self.assertIs(self.interner.primitive('str', 'red'), self.interner.primitive('str', ''.join(['r', 'ed'])))
+
+    def test_types_are_part_of_the_identity(self):
+        self.assertIsNot(self.interner.primitive('int', 1), self.interner.primitive('float', 1.0))
+
+    def test_signed_zeros_are_not_merged(self):
+        self.assertEqual('-0.0', str(self.interner.primitive('float', -0.0).value))
+        self.assertEqual('0.0', str(self.interner.primitive('float', 0.0).value))
+
+    def test_equal_references_are_shared(self):
+        self.assertIs(self.interner.reference('service'), self.interner.reference('service'))
+
+    def test_ids_are_not_interned(self):
+        key, descriptor = self.interner.primitive_attr('id', 'str', 'some id')
+        self.assertEqual(PrimitiveAttributeDescriptor('str', 'some id'), descriptor)
+        self.assertEqual(0, len(self.interner))
+
+    def test_clear(self):
+        self.interner.reference('service')
+        self.interner.clear()
+        self.assertEqual(0, len(self.interner))
+
+
+class TestParsersIntern(unittest.TestCase):
+
+    def test_descriptor_builder_shares_descriptors_across_flakes(self):
+        builder = DescriptorBuilder(DescriptorInterner())
+        first = builder.build_flake_descriptor({'proto': 'a.b', 'id': 'first', 'on': True, 'to': {
+            'id': 'x', 'is_flake_ref': True}})
+        second = builder.build_flake_descriptor({'proto': 'a.b', 'id': 'second', 'on': True, 'to': {
+            'id': 'x', 'is_flake_ref': True}})
+        self.assertIs(first.attrs['on'], second.attrs['on'])
+        self.assertIs(first.attrs['to'], second.attrs['to'])
+        self.assertIs(first.attrs['proto'], second.attrs['proto'])
+
+    def test_xml_parser_shares_descriptors_across_flakes(self):
+        xml = '''
+        <%s>
+            <resource.body id='first' bool-heavy="True"><ref-color id="red" /></resource.body>
+            <resource.body id='second' bool-heavy="True"><ref-color id="red" /></resource.body>
+        </%s>
+        ''' % (XML_ROOT, XML_ROOT)
+        first, second = XmlFlakeParser().from_string(xml, 'test')
+        self.assertIs(first.attrs['heavy'], second.attrs['heavy'])
+        self.assertIs(first.attrs['color'], second.attrs['color'])
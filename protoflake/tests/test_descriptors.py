@@ -1,10 +1,16 @@
+import pickle
 import unittest
+from dataclasses import FrozenInstanceError
 
 from protoflake.descriptors import FileSourceDescriptor
 from protoflake.descriptors import CodeSourceDescriptor
 from protoflake.descriptors import PrimitiveAttributeDescriptor
 from protoflake.descriptors import ReferenceAttributeDescriptor
+from protoflake.constants import SCOPE_ATTRIBUTE
+from protoflake.constants import SCOPE_PROTOTYPE
+from protoflake.constants import SCOPE_SINGLETON
 from protoflake.flakedescriptor import FlakeDescriptor
+from protoflake.flakedescriptor import UnknownFlakeScope
 
 
 class TestDescriptors(unittest.TestCase):
@@ -31,6 +37,17 @@ class TestDescriptors(unittest.TestCase):
         descriptor = ReferenceAttributeDescriptor(flake_id)
         self.assertEqual(descriptor.reference_flake_id, flake_id)
 
+    def test_primitive_and_reference_descriptors_are_frozen_and_slotted(self):
+        for descriptor in (PrimitiveAttributeDescriptor('int', 3), ReferenceAttributeDescriptor('where-12345')):
+            self.assertFalse(hasattr(descriptor, '__dict__'))
+            with self.assertRaises(FrozenInstanceError):
+                descriptor.type = 'str'
+
+    def test_frozen_descriptors_can_be_pickled(self):
+        primitive = PrimitiveAttributeDescriptor('int', 3)
+        reference = ReferenceAttributeDescriptor('where-12345')
+        self.assertEqual((primitive, reference), pickle.loads(pickle.dumps((primitive, reference))))
+
     def test_building_a_flake_descriptor(self):
         proto = 'my.module.class'
         flake_id = 'where-12345'
@@ -43,3 +60,36 @@ class TestDescriptors(unittest.TestCase):
         self.assertEqual(descriptor.proto_name, proto)
         self.assertEqual(descriptor.attrs, attrs)
         self.assertEqual(descriptor.source, source)
+        self.assertEqual(descriptor.proto_module, 'my.module')
+        self.assertEqual(descriptor.proto_class, 'class')
+
+    def test_proto_name_without_module(self):
+        descriptor = FlakeDescriptor('Class', 'id', {}, None)
+        self.assertEqual(descriptor.proto_module, '')
+        self.assertEqual(descriptor.proto_class, 'Class')
+
+    def test_flake_descriptors_share_their_proto_parts(self):
+        first = FlakeDescriptor(''.join(['my.module.', 'Class']), 'first', {}, None)
+        second = FlakeDescriptor(''.join(['my.module.', 'Class']), 'second', {}, None)
+        self.assertIs(first.proto_module, second.proto_module)
+        self.assertIs(first.proto_class, second.proto_class)
+
+    def test_flake_descriptors_keep_their_proto_parts_when_pickled(self):
+        descriptor = pickle.loads(pickle.dumps(FlakeDescriptor('my.module.Class', 'id', {}, None)))
+        self.assertEqual(('my.module', 'Class'), (descriptor.proto_module, descriptor.proto_class))
+
+    def test_flake_descriptors_are_slotted(self):
+        self.assertFalse(hasattr(FlakeDescriptor('my.module.Class', 'id', {}, None), '__dict__'))
+
+    def test_flake_descriptors_are_singletons_by_default(self):
+        self.assertEqual(SCOPE_SINGLETON, FlakeDescriptor('my.module.Class', 'id', {}, None).scope)
+
+    def test_flake_descriptors_read_their_scope_attribute(self):
+        scope = PrimitiveAttributeDescriptor('str', 'prototype')
+        descriptor = FlakeDescriptor('my.module.Class', 'id', {SCOPE_ATTRIBUTE: scope}, None)
+        self.assertEqual(SCOPE_PROTOTYPE, descriptor.scope)
+
+    def test_unknown_scopes_are_rejected(self):
+        with self.assertRaises(UnknownFlakeScope):
+            FlakeDescriptor(
+                'my.module.Class', 'id', {SCOPE_ATTRIBUTE: PrimitiveAttributeDescriptor('str', 'request')}, None)
@@ -1,8 +1,18 @@
+import json
+import os
+import shutil
+import tempfile
 import unittest
 from unittest.mock import Mock
+from unittest.mock import patch
 
+from protoflake.definitionbundle import compile_bundle
 from protoflake.discoveryservice import DiscoveryService
 from protoflake.descriptorbuilder import DescriptorBuilder
+from protoflake.descriptorinterner import default_interner
+from protoflake.filediscoverer import FileDiscoverer
+from protoflake.filediscoverer import parse_file
+from protoflake.listdiscoverer import ListDiscoverer
 
 
 class TestDiscoveryService(unittest.TestCase):
@@ -21,10 +31,10 @@ class TestDiscoveryService(unittest.TestCase):
         self.descriptor_builder = DescriptorBuilder()
 
     def test_it_is_possible_to_discover_flakes_from_files(self):
-        self.file_discoverer.discover.return_value = [
+        self.file_discoverer.discover_files.return_value = [('/some/file.json', [
             self.descriptor_builder.build_flake_descriptor({'proto': 'test.class', 'id': 'first'}),
             self.descriptor_builder.build_flake_descriptor({'proto': 'test.class', 'id': 'second'}),
-        ]
+        ])]
         self.service.from_files(['/some/file.json'])
         self.assertEqual(2, len(self.service.definitions.values()))
         self.assertEqual('first', self.service.get_definition('first').id)
@@ -42,3 +52,201 @@ class TestDiscoveryService(unittest.TestCase):
         self.assertEqual(2, len(self.service.definitions.values()))
         self.assertEqual('first', self.service.get_definition('first').id)
         self.assertEqual('second', self.service.get_definition('second').id)
+
+    def test_dependency_graph_is_kept_up_to_date(self):
+        self.list_discoverer.discover.side_effect = [
+            [self.descriptor_builder.build_flake_descriptor(
+                {'proto': 'test.class', 'id': 'ui', 'to': {'id': 'db', 'is_flake_ref': True}})],
+            [self.descriptor_builder.build_flake_descriptor({'proto': 'test.class', 'id': 'db'})],
+        ]
+        self.service.from_list([])
+        graph = self.service.get_dependency_graph()
+        self.service.from_list([])
+        self.assertIs(graph, self.service.get_dependency_graph())
+        self.assertEqual({'ui'}, graph.get_dependents('db'))
+
+    def test_proto_modules_include_nested_flakes(self):
+        self.list_discoverer.discover.return_value = [
+            self.descriptor_builder.build_flake_descriptor(
+                {'proto': 'first.module.Class', 'id': 'first', 'child': {'proto': 'nested.Class', 'id': 'child'}}),
+            self.descriptor_builder.build_flake_descriptor({'proto': 'first.module.Other', 'id': 'second'}),
+        ]
+        self.service.from_list([])
+        self.assertEqual(['first.module', 'nested'], self.service.get_proto_modules())
+
+
+    def test_interned_descriptors_are_released_after_discovery(self):
+        service = DiscoveryService(FileDiscoverer, ListDiscoverer)
+        service.from_list([
+            {'proto': 'test.class', 'id': 'first', 'color': 'red'},
+            {'proto': 'test.class', 'id': 'second', 'color': 'red'},
+        ])
+        self.assertEqual(0, len(default_interner))
+        self.assertIs(service.get_definition('first').attrs['color'], service.get_definition('second').attrs['color'])
+
+
+class TestReload(unittest.TestCase):
+    compact = False
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.service = DiscoveryService(FileDiscoverer, ListDiscoverer, compact=self.compact)
+        self.first = self.write('first.json', [
+            {'proto': 'test.class', 'id': 'ui', 'service': {'id': 'service', 'is_flake_ref': True}},
+            {'proto': 'test.class', 'id': 'service', 'db': {'id': 'db', 'is_flake_ref': True}},
+            {'proto': 'test.class', 'id': 'other'},
+        ])
+        self.second = self.write('second.json', [
+            {'proto': 'test.class', 'id': 'db', 'pool': {'proto': 'test.class', 'id': 'pool'}},
+        ])
+        self.service.from_files([self.first, self.second])
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, name, flakes):
+        file_path = os.path.join(self.temp_dir, name)
+        existed = os.path.exists(file_path)
+        with open(file_path, 'w') as file:
+            json.dump(flakes, file)
+        if existed:
+            # make sure the change is visible even on filesystems with coarse mtimes
+            stat = os.stat(file_path)
+            os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        return file_path
+
+    def test_nothing_changed(self):
+        self.assertEqual([], self.service.get_changed_files())
+        self.assertEqual(set(), self.service.reload())
+
+    def test_changed_file_invalidates_dependents(self):
+        self.write('second.json', [{'proto': 'test.class', 'id': 'db', 'port': 5432}])
+        self.assertEqual({'db', 'pool', 'service', 'ui'}, self.service.reload())
+        self.assertEqual(5432, self.service.get_definition('db').attrs['port'].value)
+
+    def test_only_changed_files_are_parsed(self):
+        self.write('second.json', [{'proto': 'test.class', 'id': 'db'}])
+        with patch('protoflake.filediscoverer.parse_file', wraps=parse_file) as parse:
+            self.service.reload()
+        self.assertEqual([self.second], [parse_call.args[1] for parse_call in parse.call_args_list])
+
+    def test_deleted_file_loses_its_definitions(self):
+        os.remove(self.second)
+        self.assertIn('db', self.service.reload())
+        self.assertNotIn('db', self.service.definitions)
+        self.assertEqual([self.first], self.service.source_files)
+
+    def test_last_file_still_wins(self):
+        self.write('second.json', [
+            {'proto': 'test.class', 'id': 'db'},
+            {'proto': 'test.class', 'id': 'other', 'from_second': True},
+        ])
+        self.service.reload()
+        self.write('first.json', [{'proto': 'test.class', 'id': 'other', 'from_first': True}])
+        self.service.reload()
+        self.assertIn('from_second', self.service.get_definition('other').attrs)
+        self.assertNotIn('ui', self.service.definitions)
+
+    def test_later_listed_definitions_still_win(self):
+        self.service.from_list([{'proto': 'test.class', 'id': 'db', 'listed': True}])
+        self.write('second.json', [
+            {'proto': 'test.class', 'id': 'db', 'port': 5432},
+            {'proto': 'test.class', 'id': 'added'},
+        ])
+        self.service.reload()
+        self.assertIn('listed', self.service.get_definition('db').attrs)
+        self.assertIn('added', self.service.definitions)
+        os.remove(self.second)
+        self.service.reload()
+        self.assertIn('listed', self.service.get_definition('db').attrs)
+
+    def test_files_discovered_again_win_over_listed_definitions(self):
+        self.service.from_list([{'proto': 'test.class', 'id': 'db', 'listed': True}])
+        self.service.from_files([self.second])
+        self.write('second.json', [{'proto': 'test.class', 'id': 'db', 'port': 5432}])
+        self.service.reload()
+        self.assertEqual(5432, self.service.get_definition('db').attrs['port'].value)
+
+    def test_invalid_file_leaves_definitions_untouched(self):
+        with open(self.second, 'w') as file:
+            file.write('[{')
+        os.utime(self.second, ns=(0, 0))
+        with self.assertRaises(ValueError):
+            self.service.reload()
+        self.assertIn('pool', self.service.get_definition('db').attrs)
+
+
+class TestCompactReload(TestReload):
+    compact = True
+
+
+class TestBundles(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.bundled_path = self.write('bundled.json', [
+            {'proto': 'test.Service', 'id': 'service', 'name': 'bundled'},
+            {'proto': 'test.Handler', 'id': 'handler', 'child': {'proto': 'test.Child', 'id': 'child'}},
+        ])
+        self.bundle_path = os.path.join(self.temp_dir, 'definitions.pfb')
+        compile_bundle([self.bundled_path], self.bundle_path)
+        self.service = DiscoveryService(FileDiscoverer, ListDiscoverer)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, name, definitions):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w') as file:
+            json.dump(definitions, file)
+        return path
+
+    def test_bundled_definitions_are_decoded_on_demand(self):
+        self.service.from_bundle(self.bundle_path)
+        self.assertEqual('bundled', self.service.get_definition('service').attrs['name'].value)
+        self.assertEqual(['service'], list(self.service.bundles[0].decoded))
+        self.assertEqual('handler', self.service.get_owner_id('child'))
+        self.assertEqual({'service', 'handler'}, set(self.service.definitions))
+
+    def test_bundles_win_over_previous_definitions(self):
+        self.service.from_list([{'proto': 'test.Service', 'id': 'service', 'name': 'listed'}])
+        self.service.get_dependency_graph()
+        self.service.from_bundle(self.bundle_path)
+        self.assertEqual('bundled', self.service.get_definition('service').attrs['name'].value)
+        self.assertIn('service', self.service.get_dependency_graph())
+
+    def test_later_definitions_win_over_bundles(self):
+        self.service.from_bundle(self.bundle_path)
+        self.service.from_files([
+            self.write('later.json', [{'proto': 'test.Service', 'id': 'service', 'name': 'later'}])])
+        self.assertEqual('later', self.service.get_definition('service').attrs['name'].value)
+
+    def test_bundles_intern_into_their_own_interner(self):
+        self.service.from_bundle(self.bundle_path)
+        self.service.get_definition('service')
+        self.assertEqual(0, len(default_interner))
+        self.assertIsNot(default_interner, self.service.bundles[0].interner)
+
+    def test_owners_are_found_without_decoding_bundles(self):
+        self.service.from_bundle(self.bundle_path)
+        self.service.from_list([
+            {'proto': 'test.Handler', 'id': 'listed', 'child': {'proto': 'test.Child', 'id': 'listed_child'}}])
+        self.assertIsNone(self.service.get_owner_id('dangling'))
+        self.assertEqual('listed', self.service.get_owner_id('listed_child'))
+        self.service.from_list([{'proto': 'test.Handler', 'id': 'listed'}])
+        self.assertIsNone(self.service.get_owner_id('listed_child'))
+        self.assertEqual({}, self.service.bundles[0].decoded)
+        self.assertIsNone(self.service.dependency_graph)
+
+    def test_freezing_moves_every_definition_to_memory(self):
+        self.service.from_bundle(self.bundle_path)
+        self.service.from_files([self.write('later.json', [{'proto': 'test.Service', 'id': 'later'}])])
+        bundle = self.service.bundles[0]
+        self.service.freeze()
+        self.assertEqual(['<memory>'], [frozen.path for frozen in self.service.bundles])
+        self.assertTrue(bundle.buffer.closed)
+        self.assertEqual({}, self.service.flake_definitions)
+        self.assertEqual([], self.service.source_files)
+        self.assertEqual({'service', 'handler', 'later'}, set(self.service.definitions))
+        self.assertEqual('handler', self.service.get_owner_id('child'))
+        self.assertEqual(set(), self.service.reload())
@@ -1,7 +1,21 @@
+import os
+import shutil
+import tempfile
 import unittest
 from unittest.mock import Mock
 
+from protoflake.constants import PARALLEL_PROCESSES
+from protoflake.constants import PARALLEL_THREADS
+from protoflake.descriptorcache import DescriptorCache
 from protoflake.filediscoverer import FileDiscoverer
+from protoflake.filediscoverer import UnknownParallelMode
+from protoflake.fingerprint import FileFingerprint
+from protoflake.instrumentation import Instrumentation
+from protoflake.instrumentation import PhaseCollector
+from protoflake.parserfactory import ParserFactory
+from protoflake.parsers import XmlFlakeParser
+
+SIMPLE_FILE = './protoflake/tests/test_data/simple_file.xml'
 
 
 class TestFileDiscoverer(unittest.TestCase):
@@ -23,3 +37,116 @@ class TestFileDiscoverer(unittest.TestCase):
         flakes = discoverer.discover()
         self.assertEqual(4, len(flakes))
         self.assertEqual([fake_flake, fake_flake, fake_flake, fake_flake], flakes)
+
+    def test_it_skips_the_parser_on_cache_hits(self):
+        cached_flake = Mock()
+        cache = Mock()
+        cache.get.return_value = [cached_flake]
+        discoverer = FileDiscoverer(self.parser_factory, ['some_file.json'], cache)
+        self.assertEqual([cached_flake], discoverer.discover())
+        self.parser_factory.get_parser.assert_not_called()
+
+    def test_it_fills_the_cache_on_misses(self):
+        fake_flake = Mock()
+        parser = Mock()
+        parser.from_file.return_value = [fake_flake]
+        self.parser_factory.get_parser.return_value = parser
+        cache = Mock()
+        cache.get.return_value = None
+        discoverer = FileDiscoverer(self.parser_factory, [SIMPLE_FILE], cache)
+        self.assertEqual([fake_flake], discoverer.discover())
+        cache.set.assert_called_with(SIMPLE_FILE, [fake_flake], FileFingerprint.of(SIMPLE_FILE))
+
+    def test_it_does_not_cache_files_edited_while_parsed(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        file_path = os.path.join(temp_dir, 'flakes.xml')
+        shutil.copy(SIMPLE_FILE, file_path)
+        cache = DescriptorCache(os.path.join(temp_dir, 'cache'))
+
+        def parse_then_edit(parsed_path):
+            descriptors = XmlFlakeParser().from_file(parsed_path)
+            with open(parsed_path, 'a') as file:
+                file.write('\n')
+            return descriptors
+
+        parser = Mock()
+        parser.from_file.side_effect = parse_then_edit
+        self.parser_factory.get_parser.return_value = parser
+        FileDiscoverer(self.parser_factory, [file_path], cache).discover()
+        self.assertEqual(1, cache.stats.writes)
+        self.assertIsNone(cache.get(file_path))
+
+    def test_it_reports_each_file(self):
+        parser = Mock()
+        parser.from_file.return_value = [Mock(), Mock()]
+        self.parser_factory.get_parser.return_value = parser
+        listener = Mock()
+        discoverer = FileDiscoverer(self.parser_factory, ['some_file.json'], instrumentation=Instrumentation(listener))
+        discoverer.discover()
+        listener.parse_started.assert_called_once_with('some_file.json')
+        file_path, descriptor_count, _, cached = listener.parse_finished.call_args[0]
+        self.assertEqual(('some_file.json', 2, False), (file_path, descriptor_count, cached))
+
+
+class TestParallelFileDiscoverer(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_paths = []
+        for index in range(6):
+            file_path = os.path.join(self.temp_dir, 'flakes_%d.json' % index)
+            with open(file_path, 'w') as file:
+                # every file redefines "shared", the last one must win
+                file.write('[{"proto": "a.b", "id": "own_%d"}, {"proto": "a.b", "id": "shared", "index": %d}]'
+                           % (index, index))
+            self.file_paths.append(file_path)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.temp_dir)
+
+    def assert_discovered_in_file_order(self, flakes):
+        expected_ids = []
+        for index in range(6):
+            expected_ids.extend(['own_%d' % index, 'shared'])
+        self.assertEqual(expected_ids, [flake.id for flake in flakes])
+        self.assertEqual(5, flakes[-1].attrs['index'].value)
+
+    def test_threads_keep_the_file_order(self):
+        discoverer = FileDiscoverer(ParserFactory, self.file_paths, parallel=PARALLEL_THREADS, max_workers=3)
+        self.assert_discovered_in_file_order(discoverer.discover())
+
+    def test_processes_keep_the_file_order(self):
+        discoverer = FileDiscoverer(ParserFactory, self.file_paths, parallel=PARALLEL_PROCESSES, max_workers=2)
+        self.assert_discovered_in_file_order(discoverer.discover())
+
+    def test_it_only_parses_cache_misses_on_the_pool(self):
+        cache = Mock()
+        cache.get.side_effect = lambda file_path: None if file_path.endswith('_3.json') else []
+        discoverer = FileDiscoverer(ParserFactory, self.file_paths, cache, parallel=PARALLEL_THREADS)
+        flakes = discoverer.discover()
+        self.assertEqual(['own_3', 'shared'], [flake.id for flake in flakes])
+        cache.set.assert_called_once()
+
+    def test_it_reports_every_file_in_order(self):
+        cache = Mock()
+        cache.get.side_effect = lambda file_path: None if file_path.endswith('_3.json') else []
+        collector = PhaseCollector()
+        discoverer = FileDiscoverer(ParserFactory, self.file_paths, cache, parallel=PARALLEL_THREADS,
+                                    instrumentation=Instrumentation(collector))
+        self.assertEqual(['own_3', 'shared'], [flake.id for flake in discoverer.discover()])
+        self.assertEqual(self.file_paths, list(collector.file_descriptor_counts))
+        self.assertEqual(2, collector.descriptor_count)
+        self.assertEqual(5, collector.cached_files)
+
+    def test_processes_report_their_own_durations(self):
+        collector = PhaseCollector()
+        discoverer = FileDiscoverer(ParserFactory, self.file_paths, parallel=PARALLEL_PROCESSES, max_workers=2,
+                                    instrumentation=Instrumentation(collector))
+        self.assert_discovered_in_file_order(discoverer.discover())
+        self.assertEqual(12, collector.descriptor_count)
+        self.assertTrue(all(duration > 0 for duration in collector.file_times.values()))
+
+    def test_it_rejects_unknown_modes(self):
+        with self.assertRaises(UnknownParallelMode):
+            FileDiscoverer(ParserFactory, self.file_paths, parallel='gpu')
@@ -0,0 +1,36 @@
+import unittest
+from threading import Event
+from unittest.mock import Mock
+
+from protoflake.filewatcher import FileWatcher
+
+
+class TestFileWatcher(unittest.TestCase):
+
+    def test_poll_reports_invalidated_flakes(self):
+        on_reload = Mock()
+        watcher = FileWatcher(Mock(return_value={'a'}), on_reload=on_reload)
+        self.assertEqual({'a'}, watcher.poll())
+        on_reload.assert_called_with({'a'})
+
+    def test_poll_stays_quiet_when_nothing_changed(self):
+        on_reload = Mock()
+        FileWatcher(Mock(return_value=set()), on_reload=on_reload).poll()
+        on_reload.assert_not_called()
+
+    def test_failed_reload_does_not_stop_polling(self):
+        watcher = FileWatcher(Mock(side_effect=ValueError('half written file')))
+        with self.assertLogs('protoflake.filewatcher'):
+            self.assertEqual(set(), watcher.poll())
+
+    def test_it_polls_until_stopped(self):
+        polled = Event()
+        reload = Mock(side_effect=lambda: polled.set() or set())
+        watcher = FileWatcher(reload, interval=0.01).start()
+        self.assertTrue(polled.wait(5))
+        watcher.stop()
+        self.assertIsNone(watcher.thread)
+        calls = reload.call_count
+        polled.clear()
+        self.assertFalse(polled.wait(0.05))
+        self.assertEqual(calls, reload.call_count)
@@ -1,10 +1,17 @@
 import unittest
+from unittest.mock import MagicMock
 from unittest.mock import Mock
 from unittest.mock import call
 
+from protoflake.dependencygraph import DependencyCycle
+from protoflake.dependencygraph import UndefinedFlake
+from protoflake.discoveryservice import DiscoveryService
 from protoflake.flakefactory import FlakeFactory
 from protoflake.descriptorbuilder import DescriptorBuilder
 from protoflake.flakebuilder import FlakeBuilder
+from protoflake.flakeproxy import resolve_proxy
+from protoflake.flakeregistry import FlakeRegistry
+from protoflake.listdiscoverer import ListDiscoverer
 
 
 class TestFlakeBuilder(unittest.TestCase):
@@ -13,7 +20,7 @@ class TestFlakeBuilder(unittest.TestCase):
         super().setUp()
         self.flake_factory = FlakeFactory()
         self.proto_registry = Mock()
-        self.flake_registry = Mock()
+        self.flake_registry = MagicMock()
         self.builder = FlakeBuilder(
             self.flake_factory,
             self.flake_registry,
@@ -26,6 +33,8 @@ class TestFlakeBuilder(unittest.TestCase):
 
         self.proto_registry.get.return_value = FakeProto
         self.flake_registry.has.return_value = False
+        # every flake built here is a singleton, held by the builder's own registry
+        self.flake_registry.get_owner.return_value = self.flake_registry
 
 
 class TestSimpleFlakeBuilder(TestFlakeBuilder):
@@ -244,3 +253,116 @@ class TestFlakeBuilderHas(TestFlakeBuilder):
     def test_it_tells_us_if_flake_has_already_been_built(self):
         self.flake_registry.has.return_value = True
         self.assertTrue(self.builder.has('something'))
+
+
+class TestInstrumentedFlakeBuilder(TestFlakeBuilder):
+
+    def test_factory_and_registry_are_reported(self):
+        self.builder.instrumentation = Mock()
+        descriptor = self.descriptor_builder.build_flake_descriptor({'id': 'first flake', 'proto': 'fake.class'})
+        flake = self.builder.get_new(descriptor)
+        self.flake_registry.set.assert_called_once_with('first flake', flake)
+        flake_id, proto_name, _ = self.builder.instrumentation.flake_built.call_args[0]
+        self.assertEqual(('first flake', 'fake.class'), (flake_id, proto_name))
+        self.assertEqual('first flake', self.builder.instrumentation.flake_registered.call_args[0][0])
+
+
+class TestOnDemandReferences(unittest.TestCase):
+
+    def setUp(self) -> None:
+        class FakeProto:
+            pass
+
+        self.proto_registry = Mock()
+        self.proto_registry.get.return_value = FakeProto
+        self.discovery_service = DiscoveryService(Mock(), ListDiscoverer)
+        self.builder = FlakeBuilder(FlakeFactory(), FlakeRegistry(), self.proto_registry, self.discovery_service)
+
+    def test_it_builds_references_which_were_not_built_yet(self):
+        self.discovery_service.from_list([
+            {'id': 'ui', 'proto': 'test.first', 'service': {'id': 'service', 'is_flake_ref': True}},
+            {'id': 'service', 'proto': 'test.first'},
+        ])
+        flake = self.builder.get_new(self.discovery_service.get_definition('ui'))
+        self.assertEqual('service', flake.service.id)
+        self.assertTrue(self.builder.has('service'))
+
+    def test_it_builds_the_owner_of_referenced_nested_flakes(self):
+        self.discovery_service.from_list([
+            {'id': 'user', 'proto': 'test.first', 'child': {'id': 'child', 'is_flake_ref': True}},
+            {'id': 'owner', 'proto': 'test.first', 'nested': {'id': 'child', 'proto': 'test.first'}},
+        ])
+        flake = self.builder.get_new(self.discovery_service.get_definition('user'))
+        self.assertEqual('child', flake.child.id)
+        self.assertTrue(self.builder.has('owner'))
+
+    def test_it_detects_reference_cycles(self):
+        self.discovery_service.from_list([
+            {'id': 'a', 'proto': 'test.first', 'to': {'id': 'b', 'is_flake_ref': True}},
+            {'id': 'b', 'proto': 'test.first', 'to': {'id': 'a', 'is_flake_ref': True}},
+        ])
+        with self.assertRaises(DependencyCycle) as context:
+            self.builder.get_new(self.discovery_service.get_definition('a'))
+        self.assertEqual(['a', 'b', 'a'], context.exception.cycle)
+
+    def test_undefined_references_name_their_referrer(self):
+        self.discovery_service.from_list([
+            {'id': 'a', 'proto': 'test.first', 'to': {'id': 'gone', 'is_flake_ref': True}},
+        ])
+        with self.assertRaises(UndefinedFlake) as context:
+            self.builder.get_new(self.discovery_service.get_definition('a'))
+        self.assertEqual(('gone', 'a'), (context.exception.flake_id, context.exception.referrer_id))
+
+
+class TestLazyFlakeBuilder(unittest.TestCase):
+
+    def setUp(self) -> None:
+        class FakeProto:
+            pass
+
+        self.fake_proto = FakeProto
+        self.proto_registry = Mock()
+        self.proto_registry.get.return_value = FakeProto
+        self.discovery_service = DiscoveryService(Mock(), ListDiscoverer)
+        self.builder = FlakeBuilder(
+            FlakeFactory(), FlakeRegistry(), self.proto_registry, self.discovery_service, lazy=True)
+
+    def test_references_are_only_built_when_used(self):
+        self.discovery_service.from_list([
+            {'id': 'ui', 'proto': 'test.first', 'service': {'id': 'service', 'is_flake_ref': True}},
+            {'id': 'service', 'proto': 'test.first', 'nested': {'id': 'nested', 'proto': 'test.first'}},
+        ])
+        flake = self.builder.get_new(self.discovery_service.get_definition('ui'))
+        self.assertFalse(self.builder.has('service'))
+        self.assertEqual('nested', flake.service.nested.id)
+        self.assertTrue(self.builder.has('service'))
+        self.assertTrue(self.builder.has('nested'))
+
+    def test_references_to_flakes_nested_in_lazy_owners(self):
+        self.discovery_service.from_list([
+            {'id': 'a', 'proto': 'test.first', 'b': {'id': 'b', 'proto': 'test.first'}},
+            {'id': 'c', 'proto': 'test.first', 'r': {'id': 'b', 'is_flake_ref': True}},
+        ])
+        c = self.builder.get_new(self.discovery_service.get_definition('c'))
+        self.assertEqual('b', c.r.id)
+        a = self.builder.get_ref('a')
+        self.assertIs(resolve_proxy(a.b), resolve_proxy(c.r))
+
+    def test_already_built_flakes_are_injected_directly(self):
+        self.discovery_service.from_list([
+            {'id': 'ui', 'proto': 'test.first', 'service': {'id': 'service', 'is_flake_ref': True}},
+            {'id': 'service', 'proto': 'test.first'},
+        ])
+        service = self.builder.get_new(self.discovery_service.get_definition('service'))
+        flake = self.builder.get_new(self.discovery_service.get_definition('ui'))
+        self.assertIs(service, flake.service)
+
+    def test_flakes_can_reference_each_other(self):
+        self.discovery_service.from_list([
+            {'id': 'a', 'proto': 'test.first', 'to': {'id': 'b', 'is_flake_ref': True}},
+            {'id': 'b', 'proto': 'test.first', 'to': {'id': 'a', 'is_flake_ref': True}},
+        ])
+        a = self.builder.get_new(self.discovery_service.get_definition('a'))
+        self.assertIsInstance(a.to, self.fake_proto)
+        self.assertEqual('b', a.to.id)
+        self.assertIs(a, a.to.to)
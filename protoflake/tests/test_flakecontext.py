@@ -0,0 +1,152 @@
+import unittest
+
+from protoflake import FlakeContainer
+from protoflake import FlakeNotPoolable
+from protoflake.flakeregistry import NestedFlakeNotShared
+from protoflake.flakeregistry import ScopeLeak
+from protoflake.flakeregistry import ScopeNotAvailable
+
+MODULE = 'protoflake.tests.test_flakecontext'
+
+
+class Database(object):
+    pass
+
+
+class Session(object):
+    pass
+
+
+class Handler(object):
+    pass
+
+
+class Scoped(object):
+    scope = 'own field'
+
+
+class TestScopes(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.container = FlakeContainer()
+        self.container.from_list([
+            {'id': 'db', 'proto': MODULE + '.Database'},
+            {'id': 'session', 'proto': MODULE + '.Session', '__scope__': 'context',
+             'db': {'id': 'db', 'is_flake_ref': True}, 'cart': {'id': 'cart', 'proto': MODULE + '.Session'}},
+            {'id': 'handler', 'proto': MODULE + '.Handler', '__scope__': 'prototype',
+             'db': {'id': 'db', 'is_flake_ref': True}, 'tags': ['a', 'b']},
+            {'id': 'request_handler', 'proto': MODULE + '.Handler', '__scope__': 'prototype',
+             'session': {'id': 'session', 'is_flake_ref': True}},
+        ])
+
+    def test_prototypes_are_built_on_each_get(self):
+        first = self.container.get('handler')
+        second = self.container.get('handler')
+        self.assertIsNot(first, second)
+        self.assertIsNot(first.tags, second.tags)
+        self.assertIs(first.db, second.db)
+        self.assertIs(self.container.get('db'), first.db)
+        self.assertFalse(self.container.flake_registry.has('handler'))
+
+    def test_flakes_nested_in_prototypes_cannot_be_referenced(self):
+        self.container.from_list([
+            {'id': 'computer', 'proto': MODULE + '.Handler', '__scope__': 'prototype',
+             'pc': {'id': 'pc', 'proto': MODULE + '.Database'}},
+            {'id': 'user', 'proto': MODULE + '.Handler', 'pc': {'id': 'pc', 'is_flake_ref': True}},
+        ])
+        with self.assertRaises(NestedFlakeNotShared) as raised:
+            self.container.get('user')
+        self.assertIn('computer which is prototype scoped', raised.exception.msg)
+        with self.assertRaises(NestedFlakeNotShared):
+            self.container.build_all(['user'])
+
+    def test_prototypes_are_built_from_a_cached_plan(self):
+        self.container.get('handler')
+        plan = self.container.builder.plans['handler']
+        self.container.get('handler')
+        self.assertIs(plan, self.container.builder.plans['handler'])
+
+    def test_context_flakes_need_a_context(self):
+        with self.assertRaises(ScopeNotAvailable):
+            self.container.get('session')
+
+    def test_context_flakes_are_built_once_per_context(self):
+        with self.container.context() as first_context:
+            session = first_context.get('session')
+            self.assertIs(session, first_context.get('session'))
+            self.assertIs(session, first_context.get('request_handler').session)
+            with self.container.context() as second_context:
+                self.assertIsNot(session, second_context.get('session'))
+                self.assertIsNot(session.cart, second_context.get('session').cart)
+        self.assertFalse(first_context.flake_registry.has('session'))
+
+    def test_singletons_built_from_a_context_belong_to_the_container(self):
+        with self.container.context() as context:
+            session = context.get('session')
+        self.assertIs(self.container.get('db'), session.db)
+
+    def test_the_scope_is_not_given_to_flakes(self):
+        self.container.from_list([
+            {'id': 'scoped', 'proto': MODULE + '.Scoped', '__scope__': 'prototype'},
+            {'id': 'explicit', 'proto': MODULE + '.Handler', '__scope__': 'singleton',
+             'nested': {'id': 'nested', 'proto': MODULE + '.Scoped', '__scope__': 'singleton'}},
+        ])
+        self.assertEqual('own field', self.container.get('scoped').scope)
+        self.assertFalse(hasattr(self.container.get('handler'), '__scope__'))
+        self.assertFalse(hasattr(self.container.get('explicit'), '__scope__'))
+        self.assertEqual('own field', self.container.get('explicit').nested.scope)
+        with self.container.context() as context:
+            self.assertFalse(hasattr(context.get('session'), '__scope__'))
+
+    def test_fields_named_scope_are_plain_attributes(self):
+        self.container.from_list([
+            {'id': 'admin', 'proto': MODULE + '.Handler', 'scope': 'admin'},
+            {'id': 'shared', 'proto': MODULE + '.Handler', 'scope': 'prototype'},
+        ])
+        self.assertEqual('admin', self.container.get('admin').scope)
+        self.assertEqual('prototype', self.container.get('shared').scope)
+        self.assertIs(self.container.get('shared'), self.container.get('shared'))
+
+    def test_singletons_cannot_hold_context_flakes(self):
+        self.container.from_list([
+            {'id': 'service', 'proto': MODULE + '.Handler', 'session': {'id': 'session', 'is_flake_ref': True}},
+            {'id': 'indirect', 'proto': MODULE + '.Handler',
+             'handler': {'id': 'request_handler', 'is_flake_ref': True}},
+        ])
+        with self.container.context() as context:
+            context.get('session')
+            with self.assertRaises(ScopeLeak):
+                context.get('service')
+            with self.assertRaises(ScopeLeak):
+                context.get('indirect')
+            self.assertIsNot(None, context.get('request_handler').session)
+        self.assertFalse(self.container.flake_registry.has('service'))
+        self.assertFalse(self.container.flake_registry.has('indirect'))
+
+    def test_lazy_singletons_cannot_hold_context_flakes(self):
+        container = FlakeContainer(lazy=True)
+        container.from_list([
+            {'id': 'session', 'proto': MODULE + '.Session', '__scope__': 'context'},
+            {'id': 'service', 'proto': MODULE + '.Handler', 'session': {'id': 'session', 'is_flake_ref': True}},
+        ])
+        with container.context() as context:
+            with self.assertRaises(ScopeLeak):
+                context.get('service')
+
+    def test_build_all_only_builds_what_the_registries_hold(self):
+        report = self.container.build_all()
+        self.assertEqual(['db'], [timing.flake_id for timing in report.timings])
+        with self.container.context() as context:
+            report = context.build_all()
+        self.assertEqual(['session'], [timing.flake_id for timing in report.timings])
+
+    def test_prototypes_can_be_pooled(self):
+        pool = self.container.pool('handler')
+        self.assertIs(pool, self.container.pool('handler'))
+        with pool.lease() as handler:
+            pass
+        self.assertIs(handler, pool.acquire())
+
+    def test_only_prototypes_can_be_pooled(self):
+        with self.assertRaises(FlakeNotPoolable):
+            self.container.pool('db')
@@ -7,6 +7,8 @@ from protoflake.flakefactory import FlakeAttributeOverwriting
 class TestFlakeFactory(unittest.TestCase):
 
     def setUp(self) -> None:
+        self.factory = FlakeFactory()
+
         class TestClass(object):
             pass
 
@@ -19,19 +21,110 @@ class TestFlakeFactory(unittest.TestCase):
         self.with_attrs = WithAttr
 
     def test_with_empty_data(self):
-        flake = FlakeFactory.build_flake(self.test_class, {})
+        flake = self.factory.build_flake(self.test_class, {})
         self.assertIsInstance(flake, self.test_class)
 
     def test_with_some_data(self):
-        flake = FlakeFactory.build_flake(self.test_class, {'prop': 5})
+        flake = self.factory.build_flake(self.test_class, {'prop': 5})
         self.assertEqual(flake.prop, 5)
 
     def test_mixin_with_usual_attributes(self):
-        flake = FlakeFactory.build_flake(self.with_attrs, {'from_flake': 3})
+        flake = self.factory.build_flake(self.with_attrs, {'from_flake': 3})
         self.assertEqual(flake.from_constructor, 1)
         self.assertEqual(flake.from_class, 2)
         self.assertEqual(flake.from_flake, 3)
 
     def test_it_wont_override_data(self):
         with self.assertRaises(FlakeAttributeOverwriting):
-            FlakeFactory.build_flake(self.with_attrs, {'from_class': 5})
+            self.factory.build_flake(self.with_attrs, {'from_class': 5})
+
+
+class TestCompiledFlakeFactory(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.factory = FlakeFactory()
+
+    def test_it_builds_slotted_protos(self):
+        class Slotted(object):
+            __slots__ = ('first', 'second')
+
+        for value in range(3):
+            flake = self.factory.build_flake(Slotted, {'first': value, 'second': 'b'})
+            self.assertEqual(value, flake.first)
+            self.assertEqual('b', flake.second)
+
+    def test_slotted_protos_keep_going_through_their_setattr(self):
+        class Doubling(object):
+            __slots__ = ('a',)
+
+            def __setattr__(self, name, value):
+                object.__setattr__(self, name, value * 2)
+
+        for _ in range(3):
+            self.assertEqual(2, self.factory.build_flake(Doubling, {'a': 1}).a)
+
+    def test_it_gives_attributes_to_init_when_it_requires_them(self):
+        class WithKeywords(object):
+            def __init__(self, name, size=1):
+                self.name = name
+                self.size = size
+
+        for value in range(3):
+            flake = self.factory.build_flake(WithKeywords, {'name': value, 'size': 4, 'other': True})
+            self.assertEqual(value, flake.name)
+            self.assertEqual(4, flake.size)
+            self.assertTrue(flake.other)
+
+    def test_it_goes_through_properties(self):
+        class WithProperty(object):
+            def __init__(self):
+                self.stored = None
+
+            @property
+            def value(self):
+                return self.stored
+
+            @value.setter
+            def value(self, value):
+                self.stored = value * 2
+
+        for value in range(1, 3):
+            flake = self.factory.build_flake(WithProperty, {'value': value})
+            self.assertEqual(value * 2, flake.value)
+
+    def test_later_flakes_of_the_same_shape_reuse_the_compiled_constructor(self):
+        class TestClass(object):
+            pass
+
+        self.factory.build_flake(TestClass, {'a': 1, 'b': 2})
+        self.assertEqual([('a', 'b')], list(self.factory.constructors[TestClass]))
+        flake = self.factory.build_flake(TestClass, {'a': 3, 'b': 4})
+        self.assertEqual((3, 4), (flake.a, flake.b))
+        self.factory.build_flake(TestClass, {'c': 5})
+        self.assertEqual(2, len(self.factory.constructors[TestClass]))
+
+    def test_it_keeps_refusing_to_override_data(self):
+        class WithAttr(object):
+            from_class = 2
+
+        for _ in range(2):
+            with self.assertRaises(FlakeAttributeOverwriting):
+                self.factory.build_flake(WithAttr, {'from_class': 5})
+
+    def test_it_keeps_refusing_to_override_data_set_by_init(self):
+        class FromEnvironment(object):
+            ports = iter([0, 8080])
+
+            def __init__(self):
+                self.port = next(self.ports)
+
+        self.assertEqual(1, self.factory.build_flake(FromEnvironment, {'port': 1}).port)
+        with self.assertRaises(FlakeAttributeOverwriting):
+            self.factory.build_flake(FromEnvironment, {'port': 2})
+
+    def test_each_factory_compiles_its_own_constructors(self):
+        class TestClass(object):
+            pass
+
+        self.factory.build_flake(TestClass, {'a': 1})
+        self.assertNotIn(TestClass, FlakeFactory().constructors)
@@ -0,0 +1,45 @@
+import unittest
+from unittest.mock import Mock
+
+from protoflake.flakepool import FlakePool
+
+
+class Connection(object):
+    def __init__(self):
+        self.resets = 0
+
+    def __flake_reset__(self):
+        self.resets += 1
+
+
+class TestFlakePool(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.build = Mock(side_effect=Connection)
+        self.pool = FlakePool('connection', self.build, max_size=1)
+
+    def test_released_flakes_are_reused(self):
+        flake = self.pool.acquire()
+        self.pool.release(flake)
+        self.assertIs(flake, self.pool.acquire())
+        self.assertEqual(1, self.build.call_count)
+
+    def test_flakes_are_reset_when_released(self):
+        with self.pool.lease() as flake:
+            self.assertEqual(0, flake.resets)
+        self.assertEqual(1, flake.resets)
+
+    def test_it_builds_new_flakes_when_empty(self):
+        first = self.pool.acquire()
+        second = self.pool.acquire()
+        self.assertIsNot(first, second)
+        self.assertEqual(2, self.build.call_count)
+
+    def test_it_keeps_at_most_max_size_idle_flakes(self):
+        first = self.pool.acquire()
+        second = self.pool.acquire()
+        self.pool.release(first)
+        self.pool.release(second)
+        self.assertEqual(1, len(self.pool))
+        self.pool.clear()
+        self.assertEqual(0, len(self.pool))
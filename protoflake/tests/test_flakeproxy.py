@@ -0,0 +1,56 @@
+import pickle
+import unittest
+from unittest.mock import Mock
+
+from protoflake.flakeproxy import FlakeProxy
+from protoflake.flakeproxy import is_resolved
+from protoflake.flakeproxy import resolve_proxy
+
+
+class Target(object):
+    def __init__(self):
+        self.value = 1
+        self.items = [1, 2, 3]
+
+    def double(self):
+        return self.value * 2
+
+
+class TestFlakeProxy(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.target = Target()
+        self.factory = Mock(return_value=self.target)
+        self.proxy = FlakeProxy(self.factory)
+
+    def test_it_does_not_build_until_used(self):
+        self.factory.assert_not_called()
+        self.assertFalse(is_resolved(self.proxy))
+
+    def test_it_builds_once_on_first_use(self):
+        self.assertEqual(1, self.proxy.value)
+        self.assertEqual(2, self.proxy.double())
+        self.factory.assert_called_once()
+        self.assertTrue(is_resolved(self.proxy))
+
+    def test_it_forwards_attribute_writes(self):
+        self.proxy.value = 5
+        self.assertEqual(5, self.target.value)
+
+    def test_it_passes_isinstance_checks(self):
+        self.assertIsInstance(self.proxy, Target)
+        self.assertIsInstance(self.proxy, FlakeProxy)
+
+    def test_it_compares_equal_to_its_flake(self):
+        self.assertEqual(self.proxy, self.target)
+        self.assertEqual(self.target, self.proxy)
+        self.assertEqual(hash(self.target), hash(self.proxy))
+
+    def test_resolve_proxy(self):
+        self.assertIs(self.target, resolve_proxy(self.proxy))
+        self.assertIs(self.target, resolve_proxy(self.target))
+
+    def test_pickling_a_proxy_pickles_its_flake(self):
+        restored_proxy, restored_target = pickle.loads(pickle.dumps((self.proxy, self.target)))
+        self.assertIsInstance(restored_target, Target)
+        self.assertIs(restored_proxy, restored_target)
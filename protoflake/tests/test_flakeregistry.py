@@ -1,8 +1,16 @@
+import time
 import unittest
+from threading import Event
+from threading import Thread
 from unittest.mock import Mock
 
+from protoflake.dependencygraph import DependencyCycle
+
 from protoflake.flakeregistry import FlakeRegistry
+from protoflake.constants import SCOPE_CONTEXT
+from protoflake.constants import SCOPE_SINGLETON
 from protoflake.flakeregistry import FlakeAlreadyExist
+from protoflake.flakeregistry import ScopeNotAvailable
 
 
 class TestFlakeRegistry(unittest.TestCase):
@@ -27,3 +35,99 @@ class TestFlakeRegistry(unittest.TestCase):
     def test_overwriting_raise_flake_already_exist(self):
         with self.assertRaises(FlakeAlreadyExist):
             self.registry.set(self.fake_flake_id, Mock())
+
+    def test_remove_tells_whether_the_flake_was_built(self):
+        self.registry.set('none', None)
+        self.assertTrue(self.registry.remove('none'))
+        self.assertFalse(self.registry.has('none'))
+        self.assertFalse(self.registry.remove('none'))
+
+    def test_remove_waits_for_the_build_in_progress(self):
+        removed = []
+
+        def remove():
+            removed.append(self.registry.remove('other'))
+
+        with self.registry.lock_for('other'):
+            thread = Thread(target=remove)
+            thread.start()
+            while not self.registry.build_waits.waiting:
+                time.sleep(0.001)
+            self.assertEqual([], removed)
+            self.registry.set('other', Mock())
+        thread.join(5)
+        self.assertEqual([True], removed)
+        self.assertFalse(self.registry.has('other'))
+
+    def test_lock_for_returns_one_lock_per_id(self):
+        self.assertIs(self.registry.lock_for('other'), self.registry.lock_for('other'))
+        self.assertIsNot(self.registry.lock_for('other'), self.registry.lock_for('yet another'))
+
+    def test_lock_is_dropped_once_flake_is_registered(self):
+        with self.registry.lock_for('other'):
+            self.registry.set('other', Mock())
+        self.assertNotIn('other', self.registry.build_locks)
+
+    def test_lock_is_reentrant(self):
+        with self.registry.lock_for('other'):
+            with self.registry.lock_for('other'):
+                pass
+            self.assertIsNotNone(self.registry.lock_for('other').holder)
+        self.assertIsNone(self.registry.lock_for('other').holder)
+
+    def test_waiting_for_a_thread_waiting_for_this_one_raises(self):
+        holding = Event()
+        acquired = []
+
+        def build_first():
+            with self.registry.lock_for('first'):
+                holding.set()
+                with self.registry.lock_for('second'):
+                    acquired.append('second')
+
+        with self.registry.lock_for('second'):
+            thread = Thread(target=build_first)
+            thread.start()
+            holding.wait(5)
+            while not self.registry.build_waits.waiting:
+                time.sleep(0.001)
+            with self.assertRaises(DependencyCycle) as raised:
+                self.registry.lock_for('first').acquire()
+            self.assertEqual(['first', 'second', 'first'], raised.exception.cycle)
+        thread.join(5)
+        self.assertEqual(['second'], acquired)
+        self.assertEqual({}, self.registry.build_waits.waiting)
+
+
+class TestFlakeRegistryHierarchy(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.root = FlakeRegistry()
+        self.child = self.root.create_child(SCOPE_CONTEXT)
+        self.root.set('singleton', Mock())
+        self.child.set('scoped', Mock())
+
+    def test_children_see_their_parents_flakes(self):
+        self.assertTrue(self.child.has('singleton'))
+        self.assertIs(self.root.get('singleton'), self.child.get('singleton'))
+
+    def test_parents_do_not_see_their_children_flakes(self):
+        self.assertFalse(self.root.has('scoped'))
+        with self.assertRaises(KeyError):
+            self.root.get('scoped')
+
+    def test_each_scope_is_owned_by_the_closest_registry(self):
+        grand_child = self.child.create_child(SCOPE_CONTEXT)
+        self.assertIs(grand_child, grand_child.get_owner(SCOPE_CONTEXT))
+        self.assertIs(self.root, grand_child.get_owner(SCOPE_SINGLETON))
+        self.assertTrue(grand_child.owns(SCOPE_SINGLETON))
+
+    def test_scopes_nobody_owns_are_not_available(self):
+        self.assertFalse(self.root.owns(SCOPE_CONTEXT))
+        with self.assertRaises(ScopeNotAvailable):
+            self.root.get_owner(SCOPE_CONTEXT)
+
+    def test_clearing_a_child_leaves_its_parents_alone(self):
+        self.child.clear()
+        self.assertFalse(self.child.has('scoped'))
+        self.assertTrue(self.child.has('singleton'))
@@ -1,7 +1,20 @@
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+from threading import Lock
+from unittest.mock import MagicMock
 from unittest.mock import Mock
+from unittest.mock import call
 
+from protoflake.dependencygraph import DependencyCycle
+from protoflake.discoveryservice import DiscoveryService
+from protoflake.flakebuilder import FlakeBuilder
+from protoflake.flakefactory import FlakeFactory
+from protoflake.flakeproxy import resolve_proxy
+from protoflake.flakeregistry import FlakeRegistry
 from protoflake.flakeservice import FlakeService
+from protoflake.listdiscoverer import ListDiscoverer
 
 
 class TestFlakeService(unittest.TestCase):
@@ -9,7 +22,7 @@ class TestFlakeService(unittest.TestCase):
     def setUp(self) -> None:
         self.discovery_service = Mock()
         self.discovery_service.get_definition.return_value = 'new'
-        self.builder = Mock()
+        self.builder = MagicMock()
         self.service = FlakeService(self.discovery_service, self.builder)
 
     def test_it_is_possible_to_create_a_simple_flake(self):
@@ -32,3 +45,115 @@ class TestFlakeService(unittest.TestCase):
         self.builder.get_ref.return_value = flake
         from_service = self.service.get('some id')
         self.assertEqual(flake, from_service)
+
+    def test_build_all_builds_in_dependency_order(self):
+        self.discovery_service.get_dependency_graph.return_value.build_order.return_value = ['db', 'service']
+        self.discovery_service.get_definition.return_value = Mock(proto_name='test.Service')
+        self.builder.has.return_value = False
+        self.service.build_all(['service'])
+        self.discovery_service.get_dependency_graph.return_value.build_order.assert_called_with(['service'])
+        self.discovery_service.get_definition.assert_has_calls([call('db'), call('service')])
+        self.builder.get_new.assert_not_called()
+        self.assertEqual(2, self.builder.construct.call_count)
+
+    def test_build_all_reports_timings_of_built_flakes_only(self):
+        self.discovery_service.get_dependency_graph.return_value.build_order.return_value = ['db', 'service']
+        self.builder.has.side_effect = lambda flake_id: flake_id == 'db'
+        self.discovery_service.get_definition.return_value = Mock(proto_name='test.Service')
+        report = self.service.build_all()
+        self.assertEqual(1, report.built_count)
+        self.assertEqual('service', report.timings[0].flake_id)
+        self.assertEqual(['test.Service'], list(report.by_proto()))
+        self.assertGreaterEqual(report.total, report.timings[0].duration)
+
+
+class TestConcurrentGet(unittest.TestCase):
+    THREADS = 16
+    ROUNDS = 20
+    FLAKE_IDS = ['ui', 'service', 'db', 'cache']
+
+    def setUp(self) -> None:
+        built = self.built = []
+        built_lock = Lock()
+
+        class SlowProto:
+            def __init__(self):
+                # widens the window in which concurrent builds of the same flake would overlap
+                time.sleep(0.001)
+                with built_lock:
+                    built.append(self)
+
+        self.proto_registry = Mock()
+        self.proto_registry.get.return_value = SlowProto
+        self.discovery_service = DiscoveryService(Mock(), ListDiscoverer)
+        self.discovery_service.from_list([
+            {'id': 'ui', 'proto': 'test.Slow', 'service': {'id': 'service', 'is_flake_ref': True}},
+            {'id': 'service', 'proto': 'test.Slow', 'db': {'id': 'db', 'is_flake_ref': True}},
+            {'id': 'db', 'proto': 'test.Slow', 'pool': {'id': 'pool', 'proto': 'test.Slow'}},
+            {'id': 'cache', 'proto': 'test.Slow', 'pool': {'id': 'pool', 'is_flake_ref': True}},
+        ])
+        self.registry = FlakeRegistry()
+
+    def hammer(self, lazy=False):
+        builder = FlakeBuilder(FlakeFactory(), self.registry, self.proto_registry, self.discovery_service, lazy)
+        service = FlakeService(self.discovery_service, builder)
+        flake_ids = self.FLAKE_IDS * self.ROUNDS
+        barrier = Barrier(self.THREADS)
+
+        def get_all(offset):
+            barrier.wait()
+            return [(flake_id, service.get(flake_id)) for flake_id in flake_ids[offset:] + flake_ids[:offset]]
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            return [pair for pairs in executor.map(get_all, range(self.THREADS)) for pair in pairs]
+
+    def assert_built_once(self, results):
+        for flake_id, flake in results:
+            self.assertIs(self.registry.get(flake_id), flake)
+        self.assertIs(resolve_proxy(self.registry.get('db').pool), resolve_proxy(self.registry.get('cache').pool))
+        self.assertEqual(len(self.FLAKE_IDS) + 1, len(self.built))
+        self.assertEqual({}, self.registry.build_locks)
+
+    def test_each_flake_is_built_once(self):
+        self.assert_built_once(self.hammer())
+
+    def test_each_flake_is_built_once_in_lazy_mode(self):
+        results = self.hammer(lazy=True)
+        for flake_id in self.FLAKE_IDS:
+            # resolve every proxy
+            getattr(self.registry.get(flake_id), 'pool', None)
+            getattr(self.registry.get(flake_id), 'db', None)
+        self.assert_built_once(results)
+
+
+class TestConcurrentCycle(unittest.TestCase):
+
+    def test_cycles_built_from_two_threads_raise(self):
+        barrier = Barrier(2)
+
+        class Rendezvous:
+            def __init__(self):
+                # both threads hold the build lock of their root flake once past this point
+                barrier.wait(5)
+
+        proto_registry = Mock()
+        proto_registry.get.return_value = Rendezvous
+        discovery_service = DiscoveryService(Mock(), ListDiscoverer)
+        discovery_service.from_list([
+            {'id': 'a', 'proto': 'test.R', 'first': {'id': 'na', 'proto': 'test.R'},
+             'b': {'id': 'b', 'is_flake_ref': True}},
+            {'id': 'b', 'proto': 'test.R', 'first': {'id': 'nb', 'proto': 'test.R'},
+             'a': {'id': 'a', 'is_flake_ref': True}},
+        ])
+        builder = FlakeBuilder(FlakeFactory(), FlakeRegistry(), proto_registry, discovery_service)
+        service = FlakeService(discovery_service, builder)
+
+        def get(flake_id):
+            try:
+                service.get(flake_id)
+            except DependencyCycle as cycle:
+                return cycle
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(get, ['a', 'b'], timeout=10))
+        self.assertTrue(all(isinstance(result, DependencyCycle) for result in results))
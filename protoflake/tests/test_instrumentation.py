@@ -0,0 +1,79 @@
+import unittest
+from unittest.mock import Mock
+
+from protoflake.instrumentation import Instrumentation
+from protoflake.instrumentation import InstrumentationListener
+from protoflake.instrumentation import PHASE_BUILD
+from protoflake.instrumentation import PHASE_IMPORT
+from protoflake.instrumentation import PHASE_PARSE
+from protoflake.instrumentation import PHASE_REGISTER
+from protoflake.instrumentation import PhaseCollector
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def test_it_forwards_events_to_every_listener(self):
+        first = Mock()
+        second = Mock()
+        instrumentation = Instrumentation(first)
+        instrumentation.add_listener(second)
+        instrumentation.parse_started('a.json')
+        instrumentation.parse_finished('a.json', 2, 0.1, False)
+        instrumentation.proto_imported('a', 0.2)
+        instrumentation.flake_built('flake', 'a.B', 0.3)
+        instrumentation.flake_registered('flake', 0.4)
+        for listener in (first, second):
+            listener.parse_started.assert_called_once_with('a.json')
+            listener.parse_finished.assert_called_once_with('a.json', 2, 0.1, False)
+            listener.proto_imported.assert_called_once_with('a', 0.2)
+            listener.flake_built.assert_called_once_with('flake', 'a.B', 0.3)
+            listener.flake_registered.assert_called_once_with('flake', 0.4)
+
+    def test_removed_listeners_are_not_called(self):
+        listener = Mock()
+        instrumentation = Instrumentation(listener)
+        instrumentation.remove_listener(listener)
+        instrumentation.flake_registered('flake', 0.4)
+        listener.flake_registered.assert_not_called()
+
+    def test_listeners_only_override_what_they_need(self):
+        InstrumentationListener().parse_finished('a.json', 2, 0.1, True)
+
+
+class TestPhaseCollector(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.collector = PhaseCollector()
+        self.collector.parse_finished('a.json', 2, 0.5, False)
+        self.collector.parse_finished('b.json', 3, 0.25, True)
+        self.collector.proto_imported('a', 0.125)
+        self.collector.flake_built('first', 'a.Fast', 0.125)
+        self.collector.flake_built('second', 'a.Slow', 0.5)
+        self.collector.flake_built('third', 'a.Fast', 0.25)
+        self.collector.flake_registered('first', 0.5)
+
+    def test_it_sums_durations_per_phase(self):
+        self.assertEqual({PHASE_PARSE: 0.75, PHASE_IMPORT: 0.125, PHASE_BUILD: 0.875, PHASE_REGISTER: 0.5},
+                         self.collector.by_phase())
+
+    def test_it_sums_durations_per_proto_and_file(self):
+        self.assertEqual({'a.Slow': 0.5, 'a.Fast': 0.375}, self.collector.by_proto())
+        self.assertEqual(['a.Slow', 'a.Fast'], list(self.collector.by_proto()))
+        self.assertEqual(['a.json', 'b.json'], list(self.collector.by_file()))
+
+    def test_it_counts_descriptors_and_cached_files(self):
+        self.assertEqual(5, self.collector.descriptor_count)
+        self.assertEqual(1, self.collector.cached_files)
+
+    def test_it_exports_plain_data(self):
+        exported = self.collector.as_dict()
+        self.assertEqual({'seconds': 0.875, 'count': 3}, exported['phases'][PHASE_BUILD])
+        self.assertEqual({'seconds': 0.375, 'count': 2}, exported['protos']['a.Fast'])
+        self.assertEqual({'seconds': 0.25, 'descriptors': 3}, exported['files']['b.json'])
+        self.assertEqual({'a': 0.125}, exported['imports'])
+        self.assertEqual(5, exported['descriptor_count'])
+
+    def test_it_can_be_reset(self):
+        self.collector.reset()
+        self.assertEqual({}, self.collector.by_phase())
+        self.assertEqual(0, self.collector.descriptor_count)
@@ -3,6 +3,7 @@ from unittest.mock import patch
 from unittest.mock import Mock
 
 from protoflake.listdiscoverer import ListDiscoverer
+from protoflake.parsererrors import MissingFlakeProto
 
 
 class TestListDiscoverer(unittest.TestCase):
@@ -14,3 +15,7 @@ class TestListDiscoverer(unittest.TestCase):
         instance_mock.build_flake_descriptor.side_effect = [1, 2, 3]
         discoverer = ListDiscoverer(['a', 'b', 'c'])
         self.assertEqual(discoverer.discover(), [1, 2, 3])
+
+    def test_definitions_need_a_proto(self):
+        with self.assertRaises(MissingFlakeProto):
+            ListDiscoverer([{'id': 'x'}]).discover()
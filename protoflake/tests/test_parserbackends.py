@@ -0,0 +1,93 @@
+import builtins
+import unittest
+from unittest.mock import patch
+
+from protoflake.parserbackends import ParserBackend
+from protoflake.parserbackends import UnknownParserBackend
+from protoflake.parserbackends import find_json_backends
+from protoflake.parserbackends import find_yaml_backends
+from protoflake.parserbackends import select_backend
+from protoflake.parsers import JsonFlakeParser
+from protoflake.parsers import YamlFlakeParser
+from protoflake.parserfactory import ParserFactory
+
+
+real_import = builtins.__import__
+
+
+def without_modules(*names):
+    """Makes importing the given modules, or names from them, fail as if they were not installed"""
+    def fake_import(name, globals=None, locals=None, fromlist=(), level=0):
+        if name in names or any(name + '.' + item in names for item in fromlist or ()):
+            raise ImportError(name)
+        return real_import(name, globals, locals, fromlist, level)
+    return patch('builtins.__import__', side_effect=fake_import)
+
+
+class TestParserBackends(unittest.TestCase):
+
+    def test_pure_python_backends_are_always_last(self):
+        self.assertEqual('pyyaml', find_yaml_backends()[-1].name)
+        self.assertEqual('json', find_json_backends()[-1].name)
+
+    def test_yaml_falls_back_without_libyaml(self):
+        with without_modules('yaml.CSafeLoader'):
+            backends = find_yaml_backends()
+        self.assertEqual(['pyyaml'], [backend.name for backend in backends])
+
+    def test_json_falls_back_without_accelerated_decoders(self):
+        with without_modules('orjson', 'ujson'):
+            backends = find_json_backends()
+        self.assertEqual(['json'], [backend.name for backend in backends])
+
+    def test_select_defaults_to_the_fastest_exact_backend(self):
+        backends = find_yaml_backends()
+        self.assertIs(backends[0], select_backend(backends))
+        lossy = ParserBackend('lossy', float, exact=False)
+        self.assertEqual('json', select_backend([lossy] + find_json_backends()).name)
+
+    def test_json_defaults_to_the_stdlib_decoder(self):
+        self.assertEqual('json', select_backend(find_json_backends()).name)
+
+    def test_select_by_name(self):
+        self.assertEqual('pyyaml', select_backend(find_yaml_backends(), 'pyyaml').name)
+
+    def test_select_raises_for_unknown_name(self):
+        with self.assertRaises(UnknownParserBackend):
+            select_backend(find_json_backends(), 'whatever')
+
+    def test_every_backend_decodes_the_same(self):
+        text = '{"flakes": [{"id": "a", "proto": "m.C", "values": [1, 2.5, "x", true]}]}'
+        for backend in find_yaml_backends() + find_json_backends():
+            self.assertEqual(
+                {'flakes': [{'id': 'a', 'proto': 'm.C', 'values': [1, 2.5, 'x', True]}]},
+                backend.load(text), backend.name)
+
+
+class TestParserBackendSelection(unittest.TestCase):
+
+    def tearDown(self):
+        JsonFlakeParser.use_backend()
+        YamlFlakeParser.use_backend()
+
+    def test_factory_exposes_active_backends(self):
+        YamlFlakeParser.use_backend('pyyaml')
+        JsonFlakeParser.use_backend('json')
+        self.assertEqual({'json': 'json', 'yaml': 'pyyaml'}, ParserFactory.get_backends())
+
+    def test_switching_yaml_backend_does_not_change_json_one(self):
+        json_backend = JsonFlakeParser.backend
+        YamlFlakeParser.use_backend('pyyaml')
+        self.assertIs(json_backend, JsonFlakeParser.backend)
+
+    def test_default_json_parser_keeps_big_integers_and_nan(self):
+        flakes = JsonFlakeParser().from_string(
+            '[{"id": "a", "proto": "m.C", "big": 123456789012345678901234567890, "nan": NaN}]', 'test')
+        self.assertEqual(123456789012345678901234567890, flakes[0].attrs['big'].value)
+        self.assertNotEqual(flakes[0].attrs['nan'].value, flakes[0].attrs['nan'].value)
+
+    def test_parsers_work_with_every_backend(self):
+        for backend in find_yaml_backends():
+            YamlFlakeParser.use_backend(backend.name)
+            flakes = YamlFlakeParser().from_string('flakes:\n  - id: a\n    proto: m.C\n    value: 3\n', 'test')
+            self.assertEqual('a', flakes[0].id, backend.name)
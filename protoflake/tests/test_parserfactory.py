@@ -3,7 +3,9 @@ import unittest
 from protoflake.descriptors import FileSourceDescriptor
 from protoflake.parserfactory import NoSuitableParserFound
 from protoflake.parserfactory import ParserFactory
+from protoflake.parserfactory import StreamingParserFactory
 from protoflake.parsers import JsonFlakeParser
+from protoflake.parsers import StreamingXmlFlakeParser
 from protoflake.parsers import XmlFlakeParser
 from protoflake.parsers import YamlFlakeParser
 
@@ -37,3 +39,45 @@ class TestParserFactory(unittest.TestCase):
             ParserFactory.get_parser(FileSourceDescriptor('./some/file.xml')),
             XmlFlakeParser
         )
+
+    def test_it_reuses_parsers(self):
+        self.assertIs(
+            ParserFactory.get_parser(FileSourceDescriptor('./some/file.yml')),
+            ParserFactory.get_parser(FileSourceDescriptor('./other/file.yaml'))
+        )
+
+
+class TestParserRegistration(unittest.TestCase):
+
+    def tearDown(self):
+        ParserFactory.parsers.pop('txt', None)
+        StreamingParserFactory.parsers.pop('txt', None)
+
+    def test_registered_extension_gets_parser(self):
+        ParserFactory.register('txt', YamlFlakeParser)
+        self.assertIsInstance(ParserFactory.get_parser(FileSourceDescriptor('./some/file.txt')), YamlFlakeParser)
+
+    def test_subclasses_inherit_registered_extensions(self):
+        ParserFactory.register('txt', JsonFlakeParser)
+        self.assertIsInstance(
+            StreamingParserFactory.get_parser(FileSourceDescriptor('./some/file.txt')), JsonFlakeParser)
+
+    def test_subclass_registration_does_not_leak_to_parent(self):
+        StreamingParserFactory.register('txt', JsonFlakeParser)
+        with self.assertRaises(NoSuitableParserFound):
+            ParserFactory.get_parser(FileSourceDescriptor('./some/file.txt'))
+
+
+class TestStreamingParserFactory(unittest.TestCase):
+
+    def test_it_streams_xml(self):
+        self.assertIsInstance(
+            StreamingParserFactory.get_parser(FileSourceDescriptor('./some/file.xml')),
+            StreamingXmlFlakeParser
+        )
+
+    def test_it_falls_back_for_other_extensions(self):
+        self.assertIsInstance(
+            StreamingParserFactory.get_parser(FileSourceDescriptor('./some/file.json')),
+            JsonFlakeParser
+        )
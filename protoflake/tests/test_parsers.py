@@ -1,4 +1,7 @@
+import os
+import tempfile
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 from typing import cast
 
@@ -11,6 +14,11 @@ from protoflake.parsers import XmlFlakeParser
 from protoflake.parsers import JsonFlakeParser
 from protoflake.parsers import InvalidXmlRootException
 from protoflake.parsers import InvalidRootJson
+from protoflake.parsers import ParserException
+from protoflake.parsererrors import InvalidPrimitive
+from protoflake.parsererrors import MissingFlakeId
+from protoflake.parsererrors import MissingFlakeProto
+from protoflake.parsers import StreamingXmlFlakeParser
 from protoflake.parsers import YamlFlakeParser
 
 
@@ -46,7 +54,7 @@ class TestXmlParser(unittest.TestCase):
         self.assertIsInstance(flakes[0], FlakeDescriptor)
         self.assertEqual(flakes[0].id, 'first flake')
         self.assertEqual(flakes[0].proto_name, 'resource.body')
-        self.assertEqual(cast(CodeSourceDescriptor, parser.get_source()).hint, func_name)
+        self.assertEqual(cast(CodeSourceDescriptor, flakes[0].source).hint, func_name)
 
     def test_parsing_a_simple_flake_from_file(self):
         TestXmlParser.test_parsing_a_simple_flake.__qualname__
@@ -189,6 +197,105 @@ class TestXmlParser(unittest.TestCase):
         self.assertEqual(flakes[0].attrs.get('color').nested_descriptor.id, 'some id')
         self.assertEqual(flakes[0].attrs.get('color').nested_descriptor.proto_name, 'resource.color')
 
+    def test_flakes_need_an_id(self):
+        xml = '''
+        <%s>
+            <resource.body int-weight="85" />
+        </%s>
+        ''' % (XML_ROOT, XML_ROOT)
+        parser = XmlFlakeParser()
+        with self.assertRaises(MissingFlakeId) as raised:
+            parser.from_string(xml, TestXmlParser.test_flakes_need_an_id.__qualname__)
+        self.assertEqual(TestXmlParser.test_flakes_need_an_id.__qualname__, raised.exception.source.hint)
+
+    def test_nested_flakes_need_an_id(self):
+        xml = '''
+        <%s>
+            <resource.body id='first flake'>
+                <flake-hand><resource.hand /></flake-hand>
+            </resource.body>
+        </%s>
+        ''' % (XML_ROOT, XML_ROOT)
+        with self.assertRaises(MissingFlakeId):
+            XmlFlakeParser().from_string(xml, TestXmlParser.test_nested_flakes_need_an_id.__qualname__)
+
+    def test_parsing_an_invalid_int(self):
+        xml = '''
+        <%s>
+            <resource.body id='first flake' int-weight="heavy" />
+        </%s>
+        ''' % (XML_ROOT, XML_ROOT)
+        parser = XmlFlakeParser()
+        with self.assertRaises(InvalidPrimitive) as raised:
+            parser.from_string(xml, TestXmlParser.test_parsing_an_invalid_int.__qualname__)
+        self.assertIsInstance(raised.exception, ParserException)
+        self.assertIn('weight', str(raised.exception))
+
+    def test_parsing_an_invalid_float(self):
+        xml = '''
+        <%s>
+            <resource.body id='first flake'><float-weight /></resource.body>
+        </%s>
+        ''' % (XML_ROOT, XML_ROOT)
+        parser = XmlFlakeParser()
+        with self.assertRaises(InvalidPrimitive):
+            parser.from_string(xml, TestXmlParser.test_parsing_an_invalid_float.__qualname__)
+
+
+class TestStreamingXmlParser(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.temp_dir.name, 'flakes.xml')
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def write(self, xml: str):
+        with open(self.file_path, 'w') as file:
+            file.write(xml)
+
+    def test_it_yields_the_same_flakes_as_the_xml_parser(self):
+        self.write('''
+        <%s>
+            <resource.body id='first flake' int-weight="85">
+                <list-parts>
+                    <int-0>3</int-0>
+                    <list-sub-parts>
+                        <int-0>2</int-0>
+                    </list-sub-parts>
+                </list-parts>
+                <flake-color>
+                    <resource.color id="some id" />
+                </flake-color>
+                <ref-other id="second flake" />
+            </resource.body>
+            <resource.body id='second flake' />
+        </%s>
+        ''' % (XML_ROOT, XML_ROOT))
+        streamed = StreamingXmlFlakeParser().from_file(self.file_path)
+        self.assertEqual(XmlFlakeParser().from_file(self.file_path), streamed)
+        self.assertEqual(['first flake', 'second flake'], [flake.id for flake in streamed])
+        self.assertEqual(streamed[0].attrs.get('color').nested_descriptor.id, 'some id')
+
+    def test_it_yields_flakes_one_at_a_time(self):
+        self.write('''
+        <%s>
+            <resource.body id='first flake' />
+            <resource.body id='second flake' />
+        </%s>
+        ''' % (XML_ROOT, XML_ROOT))
+        flakes = XmlFlakeParser().iter_file(self.file_path)
+        self.assertEqual(next(flakes).id, 'first flake')
+        self.assertEqual(next(flakes).id, 'second flake')
+        with self.assertRaises(StopIteration):
+            next(flakes)
+
+    def test_root_needs_to_be_whats_in_constants_fail(self):
+        self.write('<%s><resource.body id="first flake" /></%s>' % (XML_ROOT + 'a', XML_ROOT + 'a'))
+        with self.assertRaises(InvalidXmlRootException):
+            StreamingXmlFlakeParser().from_file(self.file_path)
+
 
 class TestJsonParser(unittest.TestCase):
 
@@ -323,13 +430,29 @@ class TestJsonParser(unittest.TestCase):
         self.assertEqual(flakes[0].attrs.get('color').nested_descriptor.id, 'some id')
         self.assertEqual(flakes[0].attrs.get('color').nested_descriptor.proto_name, 'resource.color')
 
+    def test_flakes_need_an_id(self):
+        json = '''
+        [
+            {"proto": "resource.body", "weight": 85}
+        ]
+        '''
+        parser = JsonFlakeParser()
+        with self.assertRaises(MissingFlakeId):
+            parser.from_string(json, TestJsonParser.test_flakes_need_an_id.__qualname__)
+
+    def test_flakes_need_a_proto(self):
+        with self.assertRaises(MissingFlakeProto) as raised:
+            JsonFlakeParser().from_string('[{"id": "x"}]', TestJsonParser.test_flakes_need_a_proto.__qualname__)
+        self.assertEqual('Flake x has no proto', str(raised.exception))
+
 
 class TestYamlParser(unittest.TestCase):
 
     def test_we_need_a_root_list_element_success(self):
         yaml = '''
         %s:
-            - something: someone
+            - proto: resource.body
+              id: someone
         ''' % YAML_ROOT
         parser = YamlFlakeParser()
         parser.from_string(yaml, TestYamlParser.test_we_need_a_root_list_element_success.__qualname__)
@@ -476,3 +599,20 @@ class TestYamlParser(unittest.TestCase):
         self.assertEqual(flakes[0].id, 'first flake')
         self.assertEqual(flakes[0].attrs.get('color').nested_descriptor.id, 'some id')
         self.assertEqual(flakes[0].attrs.get('color').nested_descriptor.proto_name, 'resource.color')
+
+
+class TestSharedParsers(unittest.TestCase):
+
+    def test_one_parser_keeps_sources_apart_across_threads(self):
+        parser = JsonFlakeParser()
+
+        def parse(index):
+            text = '[{"proto": "a.b", "id": "flake %d", "nested": {"proto": "a.c", "id": "nested %d"}}]' % (
+                index, index)
+            return parser.from_string(text, 'source %d' % index)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(parse, range(200)))
+        for index, flakes in enumerate(results):
+            self.assertEqual(flakes[0].source.hint, 'source %d' % index)
+            self.assertEqual(flakes[0].attrs['nested'].nested_descriptor.source.hint, 'source %d' % index)
@@ -72,3 +72,62 @@ class TestProtoRegistry(unittest.TestCase):
     def test_it_throws_proto_class_not_a_class_if_module_attribute_is_not_a_class(self):
         with self.assertRaises(ProtoClassNotAClass):
             self.registry.get('protoflake.tests.test_protoregistry', 'FAKE_ATTR')
+
+    def test_module_and_class_names_are_not_mixed_up(self):
+        self.registry.get('protoflake.protoregistry', 'ProtoRegistry')
+        with self.assertRaises(ProtoModuleNotFound):
+            self.registry.get('protoflake.protoregistr', 'yProtoRegistry')
+
+    def test_empty_module_name_is_not_found(self):
+        with self.assertRaises(ProtoModuleNotFound):
+            self.registry.get('', 'ProtoRegistry')
+
+
+class TestProtoRegistryPreload(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.registry = ProtoRegistry()
+
+    @patch('protoflake.protoregistry.importlib')
+    def test_preloaded_modules_are_not_imported_again(self, importlib_mock):
+        module_mock = Mock()
+        importlib_mock.import_module.return_value = module_mock
+        self.registry.preload(['fake.module'])
+        self.assertIs(module_mock, self.registry.module_registry['fake.module'])
+        with patch('protoflake.protoregistry.inspect.isclass', return_value=True):
+            self.registry.get('fake.module', 'MyClass')
+        importlib_mock.import_module.assert_called_once_with('fake.module')
+
+    def test_preload_skips_missing_modules(self):
+        self.registry.preload(['some.thing.that.will.never.exist', 'protoflake.flakeproxy'])
+        self.assertEqual(['protoflake.flakeproxy'], list(self.registry.module_registry))
+        with self.assertRaises(ProtoModuleNotFound):
+            self.registry.get('some.thing.that.will.never.exist', 'AClass')
+
+    @patch('protoflake.protoregistry.importlib')
+    def test_preload_records_any_error_and_keeps_going(self, importlib_mock):
+        failure = RuntimeError('broken at import time')
+        importlib_mock.import_module.side_effect = [failure, ImportError(), Mock()]
+        thread = self.registry.preload(['broken.module', 'missing.module', 'fine.module'], background=True)
+        thread.join()
+        self.assertEqual(['fine.module'], list(self.registry.module_registry))
+        self.assertIs(failure, self.registry.import_errors['broken.module'])
+        self.assertIsInstance(self.registry.import_errors['missing.module'], ImportError)
+
+    def test_preload_in_background(self):
+        thread = self.registry.preload(['protoflake.flakeproxy'], background=True)
+        thread.join()
+        self.assertIn('protoflake.flakeproxy', self.registry.module_registry)
+
+    def test_import_times_are_recorded(self):
+        self.registry.preload(['protoflake.flakeproxy', 'protoflake.buildreport'])
+        self.assertEqual({'protoflake.flakeproxy', 'protoflake.buildreport'}, set(self.registry.import_times))
+        slowest = self.registry.slowest_imports(1)
+        self.assertEqual(1, len(slowest))
+        self.assertEqual(max(self.registry.import_times.values()), slowest[0][1])
+
+    def test_imports_are_reported(self):
+        self.registry.instrumentation = Mock()
+        self.registry.preload(['protoflake.flakeproxy'])
+        self.registry.instrumentation.proto_imported.assert_called_once_with(
+            'protoflake.flakeproxy', self.registry.import_times['protoflake.flakeproxy'])
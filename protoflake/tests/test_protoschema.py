@@ -0,0 +1,147 @@
+import unittest
+from typing import List
+from typing import Optional
+
+from protoflake.descriptorbuilder import DescriptorBuilder
+from protoflake.descriptors import CodeSourceDescriptor
+from protoflake.descriptors import FileSourceDescriptor
+from protoflake.protoregistry import ProtoRegistry
+from protoflake.protoschema import DefinitionValidator
+from protoflake.protoschema import InvalidDefinitions
+from protoflake.protoschema import ProtoSchema
+
+MODULE = 'protoflake.tests.test_protoschema'
+
+
+class Engine(object):
+    power: int
+    weight: float
+    name: Optional[str] = None
+
+
+class Wheel(object):
+    __slots__ = ('size',)
+
+
+class Car(object):
+    engine: Engine
+    wheels: List[Wheel]
+    brand = 'any'
+
+    def drive(self):
+        pass
+
+
+class Trailer(object):
+    def __init__(self, capacity, axles=2):
+        self.capacity = capacity
+        self.axles = axles
+
+
+class Anything(object):
+    pass
+
+
+class TestProtoSchema(unittest.TestCase):
+
+    def test_annotations_declare_names_and_types(self):
+        schema = ProtoSchema.compile(Engine)
+        self.assertTrue({'power', 'weight', 'name', 'id', 'proto', '__scope__'} <= schema.names)
+        self.assertEqual({'power': int, 'weight': float}, schema.types)
+
+    def test_slots_declare_names(self):
+        schema = ProtoSchema.compile(Wheel)
+        self.assertIn('size', schema.names)
+        self.assertEqual({}, schema.types)
+
+    def test_class_attributes_are_names_but_methods_are_not(self):
+        schema = ProtoSchema.compile(Car)
+        self.assertIn('brand', schema.names)
+        self.assertNotIn('drive', schema.names)
+        self.assertEqual({'engine': Engine, 'wheels': list}, schema.types)
+
+    def test_undeclared_protos_accept_any_name(self):
+        self.assertIsNone(ProtoSchema.compile(Anything).names)
+        self.assertIsNone(ProtoSchema.compile(Trailer).names)
+
+    def test_init_parameters_without_default_are_required(self):
+        self.assertEqual(('capacity',), ProtoSchema.compile(Trailer).required)
+
+
+class TestDefinitionValidator(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.validator = DefinitionValidator(ProtoRegistry())
+        self.builder = DescriptorBuilder()
+
+    def definitions(self, *nodes, source=None):
+        source = source or CodeSourceDescriptor('test')
+        descriptors = [self.builder.build_flake_descriptor(node, source) for node in nodes]
+        return {descriptor.id: descriptor for descriptor in descriptors}
+
+    def errors(self, *nodes):
+        return [str(error) for error in self.validator.collect_errors(self.definitions(*nodes))]
+
+    def test_schemas_are_compiled_once_per_proto(self):
+        self.assertIs(self.validator.get_schema(Engine), self.validator.get_schema(Engine))
+        self.assertIsNot(self.validator.get_schema(Engine), DefinitionValidator(ProtoRegistry()).get_schema(Engine))
+
+    def test_valid_definitions(self):
+        definitions = self.definitions(
+            {'proto': MODULE + '.Engine', 'id': 'engine', 'power': 100, 'weight': 80},
+            {'proto': MODULE + '.Car', 'id': 'car', 'brand': 'fast', 'engine': {'is_flake_ref': True, 'id': 'engine'},
+             'wheels': [{'proto': MODULE + '.Wheel', 'id': 'wheel', 'size': 17}]},
+            {'proto': MODULE + '.Trailer', 'id': 'trailer', 'capacity': 3, '__scope__': 'prototype'},
+            {'proto': MODULE + '.Anything', 'id': 'anything', 'wheel': {'is_flake_ref': True, 'id': 'wheel'}},
+        )
+        self.validator.validate(definitions)
+
+    def test_unknown_attributes(self):
+        self.assertEqual(['flake engine, attribute torque: is not an attribute of %s.Engine' % MODULE], self.errors(
+            {'proto': MODULE + '.Engine', 'id': 'engine', 'torque': 3}))
+
+    def test_wrong_primitive_types(self):
+        self.assertEqual(["flake engine, attribute power: 'strong' is not a int"], self.errors(
+            {'proto': MODULE + '.Engine', 'id': 'engine', 'power': 'strong'}))
+
+    def test_missing_init_arguments(self):
+        self.assertEqual(['flake trailer, attribute capacity: is required by %s.Trailer' % MODULE], self.errors(
+            {'proto': MODULE + '.Trailer', 'id': 'trailer'}))
+
+    def test_undefined_references(self):
+        self.assertEqual(['flake anything, attribute engine: references undefined flake missing'], self.errors(
+            {'proto': MODULE + '.Anything', 'id': 'anything', 'engine': {'is_flake_ref': True, 'id': 'missing'}}))
+
+    def test_references_of_the_wrong_proto(self):
+        self.assertEqual(['flake car, attribute engine: flake wheel of proto %s.Wheel is not a Engine' % MODULE],
+                         self.errors(
+                             {'proto': MODULE + '.Wheel', 'id': 'wheel'},
+                             {'proto': MODULE + '.Car', 'id': 'car', 'engine': {'is_flake_ref': True, 'id': 'wheel'}}))
+
+    def test_nested_flakes_are_validated(self):
+        self.assertEqual(['flake wheel, attribute rim: is not an attribute of %s.Wheel' % MODULE], self.errors(
+            {'proto': MODULE + '.Car', 'id': 'car',
+             'wheels': [{'proto': MODULE + '.Wheel', 'id': 'wheel', 'rim': 'alloy'}]}))
+
+    def test_lists_given_to_other_types(self):
+        self.assertEqual(['flake engine, attribute power: a list is not a int'], self.errors(
+            {'proto': MODULE + '.Engine', 'id': 'engine', 'power': [1, 2]}))
+
+    def test_protos_which_cannot_be_imported(self):
+        self.assertEqual(['flake ghost: proto %s.Ghost cannot be imported' % MODULE], self.errors(
+            {'proto': MODULE + '.Ghost', 'id': 'ghost', 'anything': 1}))
+
+    def test_errors_are_grouped_by_file(self):
+        definitions = {
+            **self.definitions({'proto': MODULE + '.Engine', 'id': 'first', 'power': 'strong', 'torque': 1},
+                               source=FileSourceDescriptor('a.json')),
+            **self.definitions({'proto': MODULE + '.Engine', 'id': 'second', 'power': 'weak'},
+                               source=FileSourceDescriptor('b.json')),
+        }
+        with self.assertRaises(InvalidDefinitions) as raised:
+            self.validator.validate(definitions)
+        errors_by_source = raised.exception.errors_by_source
+        self.assertEqual(['a.json', 'b.json'], list(errors_by_source))
+        self.assertEqual(2, len(errors_by_source['a.json']))
+        self.assertEqual(['second'], [error.flake_id for error in errors_by_source['b.json']])
+        self.assertTrue(raised.exception.msg.startswith('3 invalid definitions in 2 sources'))